@@ -0,0 +1,82 @@
+"""
+Configuration for Clipboard History Manager
+Built-in defaults and config.json loading, shared by the GUI and headless modes
+"""
+
+import json
+import os
+from typing import Dict
+
+DEFAULT_CONFIG = {
+    'max_history': 50,
+    'poll_interval_min': 0.25,
+    'poll_interval_max': 10.0,
+    'poll_backoff': 1.5,
+    'clipboard_backend': 'auto',
+    'status_message_duration': 3000,
+    'fuzzy_search': False,
+    'fuzzy_limit': 200,
+    'search_debounce': 50,
+    'storage': {
+        'backend': 'journal',
+        'history_file': 'clipboard_history.json',
+        'database_file': 'clipboard_history.db',
+        'blob_dir': 'clipboard_blobs',
+        'blob_threshold': 65536,
+        'blob_cache_bytes': 33554432,
+        'blob_grace_seconds': 3600,
+        'compression': 'zlib',
+        'compression_dictionary': True,
+        # Seconds between checks for other instances' changes where
+        # inotify isn't available
+        'sync_interval': 1.0
+    },
+    # Limits on top of max_history; 0 turns one off. Pinned items are
+    # never evicted, and captures above max_item_bytes are not kept
+    'retention': {
+        'max_bytes': 268435456,
+        'max_age_days': 0,
+        'max_item_bytes': 67108864
+    },
+    # Replace older copies of nearly the same text with the new one.
+    # threshold is the share of SimHash bits that must agree; texts under
+    # min_tokens words only match if equal apart from whitespace
+    'near_duplicates': {
+        'enabled': False,
+        'threshold': 0.9,
+        'min_tokens': 8
+    },
+    # Seconds between writes of the runtime metrics to file; 0 only
+    # writes them when asked from the diagnostics window
+    'metrics': {
+        'file': 'clipboard_metrics.prom',
+        'format': 'prometheus',
+        'dump_interval': 0
+    },
+    'daemon': {
+        # Empty means $XDG_RUNTIME_DIR (or the temp dir) / clipboard-manager-<uid>.sock
+        'socket': ''
+    }
+}
+
+
+def load_config(path: str = 'config.json') -> Dict:
+    """Load config.json on top of the built-in defaults"""
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, value in data.items():
+                if isinstance(value, dict) and isinstance(config.get(key), dict):
+                    config[key].update(value)
+                else:
+                    config[key] = value
+            # Before polling backed off there was one fixed interval
+            if 'poll_interval' in data and 'poll_interval_min' not in data:
+                interval = config.pop('poll_interval')
+                config['poll_interval_min'] = interval
+                config['poll_interval_max'] = max(config['poll_interval_max'], interval)
+    except Exception as e:
+        print(f"Error loading config: {e}")
+    return config
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for compressed history snapshots
+Compares file size and load time of each snapshot format against the
+pretty-printed JSON file older versions wrote
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from common import timed
+
+from history_model import HistoryModel
+from history_storage import JournalStore, content_digest, item_digest, serialize_item
+
+FORMATS = [
+    ('json', None, False),
+    ('zlib', 'zlib', False),
+    ('zlib+dict', 'zlib', True),
+    ('lzma', 'lzma', False),
+]
+
+
+def synthetic_history(count: int, seed: int = 1) -> list:
+    """Clipboard-like items: URLs, code, log lines, short notes and numbers"""
+    rng = random.Random(seed)
+    words = ['config', 'release', 'request', 'value', 'deploy', 'cache', 'index',
+             'window', 'history', 'search', 'server', 'client', 'token', 'update']
+    makers = [
+        lambda: f"https://github.com/{rng.choice(words)}/{rng.choice(words)}/pull/"
+                f"{rng.randint(1, 9999)}",
+        lambda: f"def {rng.choice(words)}_{rng.choice(words)}(self, {rng.choice(words)}):\n"
+                f"    return self.{rng.choice(words)}.get({rng.choice(words)!r})\n",
+        lambda: f"2024-01-{rng.randint(10, 28)} 10:{rng.randint(10, 59)}:00 INFO "
+                f"{rng.choice(words)} {rng.choice(words)} finished in {rng.randint(1, 900)}ms",
+        lambda: ' '.join(rng.choice(words) for _ in range(rng.randint(2, 12))),
+        lambda: str(rng.randint(1000, 10 ** 9)),
+    ]
+    history = []
+    for i in range(count):
+        content = rng.choice(makers)()
+        history.append({'id': count - i, 'content': content, 'digest': content_digest(content),
+                        'type': 'Text',
+                        'timestamp': f"2024-01-15T10:{i // 60 % 60:02d}:{i % 60:02d}",
+                        'use_count': 1})
+    return history
+
+
+def load_model(path: str, compression) -> HistoryModel:
+    model = HistoryModel(JournalStore(path, compression=compression), max_history=10 ** 7)
+    model.load()
+    return model
+
+
+def run(history: list, repeat: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, 'legacy.json')
+        with open(legacy_path, 'w', encoding='utf-8') as f:
+            json.dump([serialize_item(item) for item in history], f,
+                      ensure_ascii=False, indent=2)
+        results['legacy json'] = {
+            'bytes': os.path.getsize(legacy_path),
+            'load_ms': timed(lambda: load_model(legacy_path, None), repeat),
+            'search_ms': timed(lambda: load_model(legacy_path, None).filter_keys('value'),
+                               repeat),
+        }
+
+        for name, compression, train in FORMATS:
+            path = os.path.join(directory, name + '.snapshot')
+            JournalStore(path, compression=compression,
+                         train_dictionary=train).compact(history)
+            results[name] = {
+                'bytes': os.path.getsize(path),
+                'load_ms': timed(lambda: load_model(path, compression), repeat),
+                # The first search has to decompress every item
+                'search_ms': timed(lambda: load_model(path, compression).filter_keys('value'),
+                                   repeat),
+            }
+
+    baseline = results['legacy json']
+    for result in results.values():
+        result['size_ratio'] = result['bytes'] / baseline['bytes']
+        result['load_ratio'] = result['load_ms'] / baseline['load_ms']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000,
+                        help='number of synthetic items (default: 10000)')
+    parser.add_argument('--history', help='use an existing clipboard_history.json instead')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    if args.history:
+        history = [serialize_item(item) for item in JournalStore(args.history).load()]
+        for item in history:
+            item_digest(item)
+    else:
+        history = synthetic_history(args.items)
+    results = run(history, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(history)} items")
+    print(f"{'format':<12} {'bytes':>10} {'size':>7} {'load ms':>9} {'load':>7} {'+search ms':>11}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['bytes']:>10} {result['size_ratio']:>7.2f} "
+              f"{result['load_ms']:>9.1f} {result['load_ratio']:>7.2f} {result['search_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
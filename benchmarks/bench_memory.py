@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the memory taken by history items
+Compares per-item overhead of HistoryItem records with the dicts older
+versions kept, loaded the same way from journal records
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from common import synthetic_contents, timed
+
+from history_item import HistoryItem
+from history_storage import content_digest
+
+
+def stored_records(contents: list) -> list:
+    """Journal lines for the contents, without the content itself"""
+    lines = []
+    start = time.time() - len(contents)
+    for i, content in enumerate(contents):
+        lines.append(json.dumps({
+            'id': i + 1, 'type': 'Code' if '\n' in content else 'Text',
+            'timestamp': datetime.fromtimestamp(start + i).isoformat(),
+            'use_count': 1, 'digest': content_digest(content),
+            'size': len(content.encode('utf-8')),
+        }))
+    return lines
+
+
+def dict_item(record: dict, content: str) -> dict:
+    """An item as older versions held it after loading"""
+    record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+    record['time_display'] = record['timestamp'].strftime('%H:%M:%S')
+    record['content'] = content
+    return record
+
+
+def slotted_item(record: dict, content: str) -> HistoryItem:
+    item = HistoryItem(record)
+    item['content'] = content
+    return item
+
+
+def measure(build, lines: list, contents: list) -> dict:
+    """Bytes kept per item, not counting the content strings, and build time"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    items = [build(json.loads(line), content) for line, content in zip(lines, contents)]
+    build_ms = (time.perf_counter() - start) * 1000
+    kept = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # What the list view and the journal read from every item
+    read_ms = timed(lambda: [(item['time_display'], item['type'], item['timestamp'])
+                             for item in items], 3)
+    return {'bytes_per_item': kept / len(items), 'build_ms': build_ms, 'read_ms': read_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100000,
+                        help='number of synthetic items (default: 100000)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    contents = synthetic_contents(args.items)
+    lines = stored_records(contents)
+    results = {'dict': measure(dict_item, lines, contents),
+               'HistoryItem': measure(slotted_item, lines, contents)}
+    baseline = results['dict']['bytes_per_item']
+    for result in results.values():
+        result['ratio'] = result['bytes_per_item'] / baseline
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.items} items, content not counted")
+    print(f"{'record':<12} {'bytes/item':>11} {'ratio':>7} {'build ms':>9} {'read ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['bytes_per_item']:>11.0f} {result['ratio']:>7.2f} "
+              f"{result['build_ms']:>9.1f} {result['read_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
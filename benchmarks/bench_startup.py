@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for Clipboard History Manager
+Measures import time of the app modules and, when a display is
+available, wall time from process start to the first window draw
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def import_times(module: str = 'clipboard_manager') -> dict:
+    """Run ``python -X importtime`` and return cumulative microseconds per module"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def draw_once():
+    """Open the app window, report once it is on screen, then quit
+
+    Run in a fresh process by ``first_draw_ms``, so importing the app is
+    part of the time.
+    """
+    import tkinter as tk
+    from clipboard_manager import ClipboardManager
+
+    root = tk.Tk()
+    ClipboardManager(root)
+
+    def report():
+        root.wait_visibility(root)
+        root.update_idletasks()
+        print("first-draw", flush=True)
+        root.destroy()
+
+    root.after(0, report)
+    root.mainloop()
+
+
+def first_draw_ms(workdir: str, timeout: float = 30.0) -> float:
+    """Start the app with an empty history and time it until the window is drawn"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--draw-once'],
+                               cwd=workdir, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True)
+    try:
+        for line in process.stdout:
+            if line.strip() == 'first-draw':
+                elapsed = time.perf_counter() - start
+                process.wait(timeout)
+                return elapsed * 1000
+        process.wait(timeout)
+        raise RuntimeError(process.stderr.read().strip() or 'window was never drawn')
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--max-import-ms', type=float,
+                        help='exit with status 1 if importing the app takes longer')
+    parser.add_argument('--max-draw-ms', type=float,
+                        help='exit with status 1 if the first draw takes longer')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--draw-once', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.draw_once:
+        draw_once()
+        return
+
+    runs = [import_times() for _ in range(args.repeat)]
+    best = {name: min(run.get(name, 0) for run in runs) for name in runs[0]}
+    results = {
+        'import_ms': best['clipboard_manager'] / 1000,
+        'slowest_imports_ms': {name: us / 1000 for name, us in
+                               sorted(best.items(), key=lambda entry: -entry[1])[1:args.top + 1]},
+    }
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            results['first_draw_ms'] = min(first_draw_ms(workdir) for _ in range(args.repeat))
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        results['first_draw_ms'] = None
+        results['first_draw_error'] = str(e).splitlines()[-1]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"import clipboard_manager: {results['import_ms']:.1f} ms")
+        for name, ms in results['slowest_imports_ms'].items():
+            print(f"  {name:<30} {ms:>7.1f} ms")
+        if results['first_draw_ms'] is None:
+            print(f"first draw: unavailable ({results['first_draw_error']})")
+        else:
+            print(f"process start to first draw: {results['first_draw_ms']:.1f} ms")
+
+    too_slow = (args.max_import_ms is not None and results['import_ms'] > args.max_import_ms) or \
+        (args.max_draw_ms is not None and results['first_draw_ms'] is not None
+         and results['first_draw_ms'] > args.max_draw_ms)
+    sys.exit(1 if too_slow else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Headless benchmark suite for Clipboard History Manager
+Times capture, duplicate detection, search, list refresh, save and load
+on synthetic histories and writes the results as JSON
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from common import ROOT, FakeClipboard, synthetic_contents
+
+from history_model import HistoryModel
+from history_storage import open_blob_store, open_store
+
+RESULTS_VERSION = 1
+QUERIES = ['a', 'co', 'deploy', 'finished in', 'github.com/cache', 'no such text']
+
+
+class Suite:
+    """Runs every benchmark for one history size in a scratch directory"""
+
+    def __init__(self, size: int, storage: Dict, workdir: str, ui: bool = False):
+        self.size = size
+        self.storage = dict(storage)
+        self.workdir = workdir
+        self.ui = ui
+        self.contents = synthetic_contents(size)
+        self.results: List[Dict] = []
+
+    def record(self, name: str, ops: int, seconds: float):
+        result = {'benchmark': name, 'size': self.size, 'ops': ops,
+                  'total_ms': seconds * 1000,
+                  'per_op_us': seconds * 1e6 / ops if ops else None}
+        self.results.append(result)
+        print(f"  {name:<34} {seconds * 1000:>10.1f} ms  "
+              f"{result['per_op_us'] or 0:>9.1f} us/op", file=sys.stderr)
+
+    def measure(self, name: str, ops: int, function: Callable):
+        start = time.perf_counter()
+        function()
+        self.record(name, ops, time.perf_counter() - start)
+
+    def new_model(self) -> HistoryModel:
+        return HistoryModel(open_store(self.storage), max_history=self.size,
+                            blobs=open_blob_store(self.storage))
+
+    def run(self) -> List[Dict]:
+        os.chdir(self.workdir)
+        self.storage['blob_dir'] = os.path.join(self.workdir, 'blobs')
+        self.storage['history_file'] = os.path.join(self.workdir, 'history.json')
+        self.storage['database_file'] = os.path.join(self.workdir, 'history.db')
+
+        model = self.new_model()
+        model.load()
+        self.capture(model)
+        self.dedupe(model)
+        self.search(model)
+        self.measure('save_history', 1, model.save)
+        model.store.close()
+        self.load()
+        if self.ui:
+            self.refresh()
+        return self.results
+
+    def capture(self, model: HistoryModel):
+        """Clipboard reads handed from a monitor to the owner, as in the app"""
+        clipboard = FakeClipboard()
+        last = ''
+
+        def run():
+            nonlocal last
+            for content in self.contents:
+                clipboard.copy(content)
+                current = clipboard.paste()
+                if current != last and current.strip():
+                    last = current
+                    model.post_capture(current)
+                # The app drains its queue in batches of up to 500
+                if model.inbox.qsize() >= 500:
+                    model.process_pending(limit=500)
+            model.process_pending()
+
+        self.measure('add_to_history', len(self.contents), run)
+        self.results[-1]['stored'] = len(model)
+
+    def dedupe(self, model: HistoryModel):
+        """Copying something already in the history moves it to the top"""
+        repeats = random.Random(2).choices(self.contents, k=min(len(self.contents), 10000))
+        self.measure('duplicate_detection', len(repeats),
+                     lambda: [model.add(content) for content in repeats])
+
+    def search(self, model: HistoryModel):
+        for query in QUERIES:
+            matches = []
+            self.measure(f"filter[{query}]", 1,
+                         lambda: matches.append(len(model.filter_keys(query))))
+            self.results[-1]['matches'] = matches[0]
+
+    def load(self):
+        model = self.new_model()
+        self.measure('load_history', 1, model.load)
+        self.results[-1]['stored'] = len(model)
+        model.store.close()
+
+        model = self.new_model()
+
+        def first_page():
+            model.start_loading()
+            while not model.process_pending(limit=500) and model.loading:
+                time.sleep(0.0005)
+
+        self.measure('load_first_page', 1, first_page)
+        model.finish_loading()
+        model.store.close()
+
+    def refresh(self):
+        """Search-as-you-type and full list rebuilds through the real Tk UI
+
+        filter_history includes the search debounce delay.
+        """
+        import tkinter as tk
+        import clipboard_manager
+
+        config = dict(clipboard_manager.DEFAULT_CONFIG, max_history=self.size,
+                      storage=self.storage)
+        with open(os.path.join(self.workdir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        FakeClipboard().install()
+        root = tk.Tk()
+        try:
+            app = clipboard_manager.ClipboardManager(root)
+            app.model.finish_loading()
+            app.flush_refresh()
+            root.update()
+            for query in QUERIES:
+                def type_query():
+                    # Until the search worker's results are on screen
+                    app.search_var.set(query)
+                    while app.debounce_job is not None or app.search_job is not None:
+                        root.update()
+                    root.update_idletasks()
+                self.measure(f"filter_history[{query}]", 1, type_query)
+            app.search_var.set('')
+            app.run_search()
+            self.measure('refresh_history_display', 1, lambda: (
+                app.refresh_history_display(), root.update_idletasks()))
+            app.stop_monitoring()
+        finally:
+            root.destroy()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(results: Dict, baseline_path: str):
+    """Print the time ratio of each benchmark against an earlier run"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    before = {(r['benchmark'], r['size']): r['total_ms'] for r in baseline['results']}
+    print(f"{'benchmark':<34} {'size':>7} {'before ms':>10} {'after ms':>10} {'ratio':>6}")
+    for result in results['results']:
+        key = (result['benchmark'], result['size'])
+        if key in before:
+            ratio = result['total_ms'] / before[key] if before[key] else float('inf')
+            print(f"{key[0]:<34} {key[1]:>7} {before[key]:>10.1f} "
+                  f"{result['total_ms']:>10.1f} {ratio:>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated history sizes (default: 1000,10000,100000)')
+    parser.add_argument('--backend', choices=('journal', 'sqlite'), default='journal')
+    parser.add_argument('--compression', default='zlib', help="'zlib', 'lzma' or 'none'")
+    parser.add_argument('--ui', action='store_true',
+                        help='also time list refreshes through Tk (needs a display, e.g. Xvfb)')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    parser.add_argument('--compare', help='print ratios against an earlier results file')
+    args = parser.parse_args()
+
+    storage = {'backend': args.backend, 'compression': args.compression}
+    results = {
+        'version': RESULTS_VERSION,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'storage': storage,
+        'results': [],
+    }
+    cwd = os.getcwd()
+    for size in (int(size) for size in args.sizes.split(',')):
+        print(f"{size} items", file=sys.stderr)
+        workdir = tempfile.mkdtemp(prefix='clipboard-bench-')
+        try:
+            results['results'].extend(Suite(size, storage, workdir, args.ui).run())
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    elif not args.compare:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
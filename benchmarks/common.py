@@ -0,0 +1,113 @@
+"""
+Shared helpers for the Clipboard History Manager benchmarks
+Synthetic clipboard content, an in-process fake clipboard and timers
+"""
+
+import os
+import random
+import sys
+import time
+import types
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+WORDS = ['config', 'release', 'request', 'value', 'deploy', 'cache', 'index', 'window',
+         'history', 'search', 'server', 'client', 'token', 'update', 'journal', 'render',
+         'payload', 'export', 'session', 'invoice', 'meeting', 'budget', 'review', 'draft']
+
+# Share of items per size class: (weight, min chars, max chars)
+SIZE_MIX = {
+    'short': (70.0, 4, 80),
+    'medium': (25.0, 80, 1000),
+    'long': (4.9, 1000, 8000),
+    'huge': (0.1, 80000, 256000),
+}
+
+
+def synthetic_contents(count: int, seed: int = 1) -> List[str]:
+    """Clipboard-like texts with a realistic spread of sizes and kinds
+
+    Most copies are short (words, URLs, numbers), a quarter are code or
+    log excerpts, a few are documents and one in a thousand is big
+    enough to go to the blob store. About 5% repeat an earlier copy.
+    """
+    rng = random.Random(seed)
+    classes = list(SIZE_MIX)
+    weights = [SIZE_MIX[name][0] for name in classes]
+
+    def words(n: int) -> str:
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+    def line() -> str:
+        kind = rng.randrange(3)
+        if kind == 0:
+            return (f"    {rng.choice(WORDS)}_{rng.choice(WORDS)} = "
+                    f"self.{rng.choice(WORDS)}.get({rng.choice(WORDS)!r})")
+        if kind == 1:
+            return (f"2024-01-{rng.randint(10, 28)} 10:{rng.randint(10, 59)}:00 INFO "
+                    f"{words(3)} finished in {rng.randint(1, 900)}ms")
+        return words(rng.randint(6, 14))
+
+    def text(low: int, high: int) -> str:
+        target = rng.randint(low, high)
+        lines, size = [], 0
+        while size < target:
+            lines.append(line())
+            size += len(lines[-1]) + 1
+        return '\n'.join(lines)[:target]
+
+    contents: List[str] = []
+    for i in range(count):
+        if contents and rng.random() < 0.05:
+            contents.append(rng.choice(contents))
+            continue
+        size_class = rng.choices(classes, weights)[0]
+        if size_class == 'short':
+            kind = rng.randrange(4)
+            if kind == 0:
+                content = (f"https://github.com/{rng.choice(WORDS)}/{rng.choice(WORDS)}"
+                           f"/pull/{rng.randint(1, 99999)}")
+            elif kind == 1:
+                content = str(rng.randint(1000, 10 ** 12))
+            else:
+                content = words(rng.randint(1, 8))
+        else:
+            content = text(*SIZE_MIX[size_class][1:])
+        # Tag each copy so distinct copies really are distinct
+        contents.append(f"{content} #{i}")
+    return contents
+
+
+class FakeClipboard:
+    """In-process stand-in for pyperclip's copy/paste"""
+
+    def __init__(self):
+        self.text = ''
+        self.reads = 0
+
+    def copy(self, text: str):
+        self.text = text
+
+    def paste(self) -> str:
+        self.reads += 1
+        return self.text
+
+    def install(self):
+        """Make ``import pyperclip`` return this clipboard"""
+        module = types.ModuleType('pyperclip')
+        module.copy = self.copy
+        module.paste = self.paste
+        sys.modules['pyperclip'] = module
+
+
+def timed(function: Callable, repeat: int = 5) -> float:
+    """Best wall time of ``repeat`` runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
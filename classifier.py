@@ -0,0 +1,164 @@
+"""
+Content type classification for Clipboard History Manager
+Detectors from config.json are compiled once and tried in priority order
+"""
+
+import json
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Characters of a payload any one detector looks at by default
+MAX_SCAN = 4096
+# Content digests whose detector results are remembered
+CACHE_SIZE = 4096
+DEFAULT_LABEL = 'Text'
+
+
+def _is_json(sample: str, content: str) -> bool:
+    """Whether the content parses as a JSON object or array"""
+    if len(content) > len(sample):
+        # Too big to parse on every copy; trust matching brackets
+        end = content.rstrip()[-1:]
+        return (sample[0], end) in (('{', '}'), ('[', ']'))
+    try:
+        return isinstance(json.loads(sample), (dict, list))
+    except ValueError:
+        return False
+
+
+# Extra checks a detector can name in its "check" setting
+CHECKS: Dict[str, Callable[[str, str], bool]] = {
+    'json': _is_json,
+}
+
+# Built-in content types; entries in config.json's content_types with
+# the same key override these field by field, new keys add detectors
+BUILTIN_TYPES: Dict[str, Dict] = {
+    'url': {'label': 'URL', 'priority': 10, 'patterns': [r'^https?://']},
+    'email': {'label': 'Email', 'priority': 20,
+              'patterns': [r'^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$']},
+    'color': {'label': 'Color', 'priority': 30,
+              'patterns': [r'^#(?:[0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})$',
+                           r'^(?:rgb|hsl)a?\([\d\s.,%/]+\)$']},
+    'number': {'label': 'Number', 'priority': 40, 'patterns': [r'^\d+$']},
+    # Segments don't start or end with a space, and the first has none,
+    # so prose that merely starts with a slash stays text
+    'path': {'label': 'Path', 'priority': 50,
+             'patterns': [r'^(?:~|\.\.?)?/[^/\s]+(?:/[^/\s](?:[^/\n]*[^/\s])?)*/?$',
+                          r'^[A-Za-z]:\\(?:[^\\\s](?:[^\\\n]*[^\\\s])?\\?)*$']},
+    'json': {'label': 'JSON', 'priority': 60, 'patterns': [r'^[\[{]'], 'check': 'json'},
+    # Keywords only count in a code-shaped statement (a name followed by
+    # a bracket, '=' or ':'), as "let me know" or "using it" are prose
+    'code': {'label': 'Code', 'priority': 70,
+             'patterns': [r'(?m)^\s*(?:async\s+)?(?:def|fn|func|function)\s+[\w$]+\s*[(<]',
+                          r'(?m)^\s*func\s+\([^)\n]*\)\s*\w+\s*\(',
+                          r'(?m)^\s*class\s+\w+\s*[(:{<]',
+                          r'(?m)^\s*class\s+\w+\s+(?:extends|implements)\s+\w+',
+                          r'(?m)^\s*(?:const|let|var)\s+[\w$]+\s*(?::[^=\n]+)?=',
+                          r'(?m)^\s*(?:(?:public|private|protected|static|final)\s+)+'
+                          r'[\w<>\[\],]+(?:\s+\w+)?\s*\([^)\n]*\)\s*(?:\{|;|throws\b)',
+                          r'(?m)^\s*(?:from\s+[\w.]+\s+import\s+[\w*(]'
+                          r'|import\s+[\w.]+(?:\s+as\s+\w+)?\s*;?\s*$'
+                          r'|import\s+.+\s+from\s+[\'"])',
+                          r'(?m)^\s*(?:using\s+[\w.:]+(?:\s*=\s*[\w.:]+)?|package\s+[\w.]+)\s*;',
+                          r'(?m)^\s*#include\s*[<"]',
+                          r'(?m)(?:\)\s*\{|=>\s*\{?|\)\s*;)\s*$',
+                          r'(?m)^\s*[\w$.\[\]]+\s*[-+*/]?=\s*[^=\s].*;\s*$']},
+    'multi_line': {'label': 'Multi-line', 'priority': 80, 'patterns': [r'(?:\n[^\n]*){3}']},
+}
+
+
+class Detector:
+    """One content type: any matching pattern (and its check) selects it"""
+
+    def __init__(self, key: str, label: str, priority: int, patterns: List[str],
+                 check: Optional[str] = None, max_scan: int = MAX_SCAN):
+        self.key = key
+        self.label = label
+        self.priority = priority
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.check = CHECKS[check] if check else None
+        self.max_scan = max_scan
+        # Results cached under this key stay valid while the spec is unchanged
+        self.fingerprint = (key, tuple(patterns), check, max_scan)
+
+    def matches(self, sample: str, content: str) -> bool:
+        """Test the stripped first ``max_scan`` characters of content"""
+        if not sample or not any(pattern.search(sample) for pattern in self.patterns):
+            return False
+        return self.check is None or self.check(sample, content.strip())
+
+
+class ContentClassifier:
+    """Labels clipboard content with the first detector that matches
+
+    Results are cached per content digest and per detector, so after a
+    config change only new or edited detectors run again.
+    """
+
+    def __init__(self, detectors: List[Detector], default: str = DEFAULT_LABEL,
+                 cache_size: int = CACHE_SIZE):
+        self.detectors = sorted(detectors, key=lambda detector: detector.priority)
+        self.default = default
+        self.cache_size = cache_size
+        self.cache: 'OrderedDict[str, Dict[Tuple, bool]]' = OrderedDict()
+
+    @classmethod
+    def from_config(cls, content_types: Optional[Dict] = None) -> 'ContentClassifier':
+        """Build detectors from the built-ins merged with config.json's content_types
+
+        A type with "enabled": false is dropped; one whose only pattern
+        is ".*" is taken as the label for unmatched content.
+        """
+        specs = {key: dict(spec) for key, spec in BUILTIN_TYPES.items()}
+        for key, spec in (content_types or {}).items():
+            specs.setdefault(key, {}).update(spec)
+
+        detectors, default = [], DEFAULT_LABEL
+        for key, spec in specs.items():
+            if not spec.get('enabled', True):
+                continue
+            label = spec.get('label', key.replace('_', ' ').title())
+            patterns = spec.get('patterns', [])
+            if patterns == ['.*']:
+                default = label
+                continue
+            try:
+                detectors.append(Detector(key, label, spec.get('priority', 100), patterns,
+                                          spec.get('check'), spec.get('max_scan', MAX_SCAN)))
+            except (re.error, KeyError) as e:
+                print(f"Error loading content type {key}: {e}")
+        return cls(detectors, default)
+
+    def classify(self, content: Union[str, Callable[[], str]],
+                 digest: Optional[str] = None) -> str:
+        """Return the label of the first matching detector
+
+        ``content`` may be a function returning the text, so it is only
+        read when a detector has no cached result for ``digest``.
+        """
+        results = None
+        if digest is not None:
+            results = self.cache.get(digest)
+            if results is None:
+                results = self.cache[digest] = {}
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(digest)
+        samples: Dict[int, str] = {}
+        for detector in self.detectors:
+            matched = results.get(detector.fingerprint) if results is not None else None
+            if matched is None:
+                if callable(content):
+                    content = content()
+                sample = samples.get(detector.max_scan)
+                if sample is None:
+                    sample = samples[detector.max_scan] = content[:detector.max_scan].strip()
+                matched = detector.matches(sample, content)
+                if results is not None:
+                    results[detector.fingerprint] = matched
+            if matched:
+                return detector.label
+        return self.default
@@ -0,0 +1,266 @@
+"""
+Command-line access to Clipboard History Manager
+``clipboard_manager.py list|search|get|copy|stats`` without starting Tk
+
+Queries go to the daemon when one is running; otherwise the store is
+read directly, newest page first, and reading stops as soon as the
+answer is known.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app_config import load_config
+from history_storage import open_blob_store, open_store
+
+PREVIEW_WIDTH = 80
+# The daemon's first search of a large packed history decompresses it all
+DAEMON_TIMEOUT = 30.0
+
+
+class LocalHistory:
+    """Reads the stored history without loading it whole"""
+
+    def __init__(self, config: Dict):
+        self.storage = config['storage']
+        self.store = open_store(self.storage, read_only=True)
+        self.blobs = open_blob_store(self.storage)
+
+    def items(self) -> Iterator[Dict]:
+        for page in self.store.load_pages():
+            yield from page
+
+    def content(self, item: Dict) -> str:
+        if 'content' in item:
+            return item['content']
+        if 'packed' in item:
+            return item['packed'].unpack()
+        if self.blobs is None:
+            return item.get('preview', '')
+        try:
+            # One-off read: caching it would only hold on to the memory
+            return self.blobs.get(item['digest'], cache=False)
+        except OSError:
+            return item.get('preview', '')
+
+    def summary(self, position: int, item: Dict, content: Optional[str] = None) -> Dict:
+        if content is None:
+            content = item['preview'] if item.get('blob') else self.content(item)
+        return {
+            'position': position,
+            'id': item.get('id'),
+            'type': item.get('type', 'Text'),
+            'timestamp': str(item.get('timestamp', '')),
+            'use_count': item.get('use_count', 1),
+            'size': item['size'] if item.get('blob') else len(content),
+            'preview': content[:200],
+        }
+
+    def list(self, limit: int, offset: int = 0) -> Iterator[Dict]:
+        for position, item in enumerate(self.items(), 1):
+            if position > offset + limit:
+                return
+            if position > offset:
+                yield self.summary(position, item)
+
+    def find(self, position: Optional[int] = None, item_id: Optional[int] = None
+             ) -> Optional[Tuple[int, Dict]]:
+        for index, item in enumerate(self.items(), 1):
+            if index == position or (item_id is not None and item.get('id') == item_id):
+                return index, item
+        return None
+
+    def search(self, query: str, limit: int, fuzzy: bool = False) -> Iterator[Dict]:
+        query = query.lower()
+        if fuzzy:
+            from search_index import fuzzy_score
+            scored = []
+            for position, item in enumerate(self.items(), 1):
+                score = fuzzy_score(query, self.content(item).lower())
+                if score is not None:
+                    scored.append((score, -position, item))
+            for _, position, item in heapq.nlargest(limit, scored, key=lambda s: s[:2]):
+                yield self.summary(-position, item)
+            return
+        found = 0
+        for position, item in enumerate(self.items(), 1):
+            content = self.content(item)
+            if query in content.lower():
+                yield self.summary(position, item, content)
+                found += 1
+                if found >= limit:
+                    return
+
+    def stats(self) -> Dict:
+        types: Dict[str, int] = {}
+        count, newest, oldest = 0, None, None
+        for item in self.items():
+            count += 1
+            item_type = item.get('type', 'Text')
+            types[item_type] = types.get(item_type, 0) + 1
+            newest = newest or str(item.get('timestamp'))
+            oldest = str(item.get('timestamp'))
+        return {'items': count, 'types': types, 'newest': newest, 'oldest': oldest}
+
+
+def storage_files(storage: Dict) -> Dict[str, int]:
+    """Size in bytes of each history file that exists"""
+    files = {}
+    for key in ('history_file', 'database_file'):
+        path = storage.get(key)
+        if not path:
+            continue
+        base = os.path.splitext(path)[0]
+        for candidate in (path, base + '.chmz', base + '.journal'):
+            if os.path.exists(candidate):
+                files[candidate] = os.path.getsize(candidate)
+    return files
+
+
+def connect_daemon(config: Dict):
+    """Client for a running daemon, or None"""
+    try:
+        from daemon_client import DaemonClient, socket_path
+        path = socket_path(config)
+        return DaemonClient(path, timeout=DAEMON_TIMEOUT) if os.path.exists(path) else None
+    except (ImportError, OSError, AttributeError):
+        # No Unix sockets here, or nothing listening
+        return None
+
+
+def print_item(summary: Dict, as_json: bool):
+    if as_json:
+        print(json.dumps(summary, ensure_ascii=False), flush=True)
+        return
+    preview = ' '.join(summary['preview'].split())
+    if len(preview) > PREVIEW_WIDTH:
+        preview = preview[:PREVIEW_WIDTH - 3] + '...'
+    timestamp = summary['timestamp'][:19].replace('T', ' ')
+    print(f"{summary['position']}\t{timestamp}\t{summary['type']}\t{preview}", flush=True)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='clipboard_manager.py',
+                                     description="Query the clipboard history")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='read the store directly even if the daemon is running')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='newest items first')
+    list_parser.add_argument('-n', '--limit', type=int, default=20)
+    list_parser.add_argument('--offset', type=int, default=0)
+
+    search_parser = commands.add_parser('search', help='items containing a query')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-n', '--limit', type=int, default=20)
+    search_parser.add_argument('--fuzzy', action='store_true', help='ranked fuzzy matching')
+
+    for name, help_text in (('get', 'print an item'), ('copy', 'copy an item to the clipboard')):
+        item_parser = commands.add_parser(name, help=help_text)
+        item_parser.add_argument('n', type=int, help='position in the list (1 = newest)')
+        item_parser.add_argument('--id', action='store_true', help='N is an item ID')
+
+    commands.add_parser('stats', help='history size and types')
+
+    for command in commands.choices.values():
+        command.add_argument('--json', action='store_true',
+                             help='newline-delimited JSON output')
+    return parser
+
+
+def print_stats(stats: Dict, storage: Dict, as_json: bool):
+    stats['files'] = storage_files(storage)
+    print(json.dumps(stats, indent=None if as_json else 2))
+
+
+def run_daemon_command(client, args, storage: Dict) -> int:
+    if args.command in ('list', 'search'):
+        if args.command == 'list':
+            results = client.request('list', offset=args.offset, limit=args.limit)
+        else:
+            results = client.request('search', query=args.query, limit=args.limit,
+                                     fuzzy=args.fuzzy)
+        for summary in results:
+            print_item(summary, args.json)
+        return 0
+    if args.command == 'stats':
+        print_stats(client.request('stats'), storage, args.json)
+        return 0
+
+    item_id = args.n
+    if not args.id:
+        found = client.request('list', offset=args.n - 1, limit=1)
+        if not found:
+            print(f"No item {args.n}", file=sys.stderr)
+            return 1
+        item_id = found[0]['id']
+    try:
+        if args.command == 'copy':
+            client.request('copy', item=item_id)
+        else:
+            item = client.request('get', item=item_id)
+            output_content(item['content'], item, args.json)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_local_command(history: LocalHistory, args) -> int:
+    if args.command == 'list':
+        for summary in history.list(args.limit, args.offset):
+            print_item(summary, args.json)
+        return 0
+    if args.command == 'search':
+        for summary in history.search(args.query, args.limit, args.fuzzy):
+            print_item(summary, args.json)
+        return 0
+    if args.command == 'stats':
+        print_stats(history.stats(), history.storage, args.json)
+        return 0
+
+    found = history.find(item_id=args.n) if args.id else history.find(position=args.n)
+    if found is None:
+        print(f"No item {args.n}", file=sys.stderr)
+        return 1
+    position, item = found
+    content = history.content(item)
+    if args.command == 'copy':
+        import pyperclip
+        pyperclip.copy(content)
+    else:
+        output_content(content, history.summary(position, item, content), args.json)
+    return 0
+
+
+def output_content(content: str, summary: Dict, as_json: bool):
+    if as_json:
+        print(json.dumps(dict(summary, content=content), ensure_ascii=False))
+    else:
+        sys.stdout.write(content)
+        sys.stdout.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+    try:
+        client = None if args.no_daemon else connect_daemon(config)
+        if client is None:
+            return run_local_command(LocalHistory(config), args)
+        try:
+            return run_daemon_command(client, args, config['storage'])
+        finally:
+            client.close()
+    except BrokenPipeError:
+        # Output piped into head and friends; keep the exit quiet
+        sys.stdout = open(os.devnull, 'w')
+        return 0
+    except OSError as e:
+        print(f"Error reading clipboard history: {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,343 @@
+"""
+Clipboard change detection backends for Clipboard History Manager
+Polling through pyperclip everywhere, event-driven XFixes on X11
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import metrics
+
+READ_SECONDS = metrics.histogram('clipboard_read_seconds', 'Time to read the system clipboard')
+READ_ERRORS = metrics.counter('clipboard_read_errors_total', 'Clipboard reads that raised')
+
+
+class ClipboardBackend:
+    """Watches the system clipboard and reports new text
+
+    ``start`` runs the watcher on its own daemon thread and calls
+    ``on_change`` with the clipboard text whenever it may have changed;
+    the caller is responsible for ignoring repeats. ``stop`` blocks until
+    the thread has exited, so there is never more than one watcher.
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self, on_change: Callable[[str], None]):
+        """Start watching the clipboard"""
+        self.stop()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_change,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching and wait for the watcher thread to exit"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, on_change: Callable[[str], None]):
+        raise NotImplementedError
+
+
+class AdaptivePollScheduler:
+    """Decides how long to sleep between clipboard polls
+
+    Right after a change the interval drops to ``min_interval`` so a
+    burst of copies is followed closely; every idle poll then multiplies
+    it by ``backoff`` until it reaches ``max_interval``.
+    """
+
+    def __init__(self, min_interval: float = 0.25, max_interval: float = 10.0,
+                 backoff: float = 1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def next_interval(self, changed: bool) -> float:
+        """Return the sleep before the next poll given the last result"""
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        self.interval = max(self.min_interval, self.interval)
+        return self.interval
+
+    def configure(self, min_interval: float, max_interval: float):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+
+
+class PollingBackend(ClipboardBackend):
+    """Reads the clipboard through pyperclip on an adaptive schedule
+
+    Only reads that differ from the previous one are reported.
+    """
+
+    name = 'polling'
+
+    def __init__(self, min_interval: float = 0.25, max_interval: float = 10.0,
+                 backoff: float = 1.5, paste: Optional[Callable[[], str]] = None):
+        super().__init__()
+        self.scheduler = AdaptivePollScheduler(min_interval, max_interval, backoff)
+        self._paste = paste
+
+    def read(self) -> str:
+        if self._paste is None:
+            import pyperclip
+            self._paste = pyperclip.paste
+        return self._paste()
+
+    def _run(self, on_change: Callable[[str], None]):
+        last = None
+        while not self._stop_event.is_set():
+            changed = False
+            try:
+                with READ_SECONDS.time():
+                    current = self.read()
+                if current != last:
+                    changed = last is not None
+                    last = current
+                    on_change(current)
+            except Exception as e:
+                READ_ERRORS.inc()
+                print(f"Error monitoring clipboard: {e}")
+            self._stop_event.wait(self.scheduler.next_interval(changed))
+
+
+# X11 constants (X.h, Xatom.h, xfixes.h)
+_SELECTION_NOTIFY = 31
+_ANY_PROPERTY_TYPE = 0
+_CURRENT_TIME = 0
+_XFIXES_SELECTION_NOTIFY = 0
+_XFIXES_SET_SELECTION_OWNER_NOTIFY_MASK = 1
+
+
+class _XSelectionEvent(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_int),
+                ('serial', ctypes.c_ulong),
+                ('send_event', ctypes.c_int),
+                ('display', ctypes.c_void_p),
+                ('requestor', ctypes.c_ulong),
+                ('selection', ctypes.c_ulong),
+                ('target', ctypes.c_ulong),
+                ('property', ctypes.c_ulong),
+                ('time', ctypes.c_ulong)]
+
+
+class _XEvent(ctypes.Union):
+    _fields_ = [('type', ctypes.c_int),
+                ('xselection', _XSelectionEvent),
+                ('pad', ctypes.c_long * 24)]
+
+
+class X11Backend(ClipboardBackend):
+    """Event-driven clipboard watcher using the XFixes extension
+
+    Keeps one Xlib connection open and asks the server for
+    selection-owner-change notifications on CLIPBOARD, so the clipboard
+    is only read when another client actually takes ownership of it.
+    The thread sleeps in ``select`` on the connection socket, which costs
+    no CPU while idle. The text is fetched as UTF8_STRING with
+    ConvertSelection; transfers the owner sends incrementally (INCR) are
+    read through pyperclip instead.
+
+    Runs headlessly against any X server, including Xvfb.
+    """
+
+    name = 'x11'
+
+    def __init__(self, display_name: Optional[str] = None, timeout: float = 1.0):
+        super().__init__()
+        self.display_name = display_name
+        self.timeout = timeout
+        self.xlib = _load_library('X11')
+        self.xfixes = _load_library('Xfixes')
+        if self.xlib is None or self.xfixes is None:
+            raise OSError("libX11 and libXfixes are required for the X11 backend")
+        self._declare_functions()
+        if not (display_name or os.environ.get('DISPLAY')):
+            raise OSError("No X display available")
+        # Fail here rather than on the watcher thread so callers can fall back
+        display = self._open_display()
+        try:
+            event_base, error_base = ctypes.c_int(), ctypes.c_int()
+            if not self.xfixes.XFixesQueryExtension(display, ctypes.byref(event_base),
+                                                    ctypes.byref(error_base)):
+                raise OSError("X server lacks the XFixes extension")
+        finally:
+            self.xlib.XCloseDisplay(display)
+
+    def _open_display(self):
+        name = self.display_name.encode() if self.display_name else None
+        display = self.xlib.XOpenDisplay(name)
+        if not display:
+            raise OSError("Cannot open X display")
+        return display
+
+    def _declare_functions(self):
+        xlib, xfixes = self.xlib, self.xfixes
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XCreateSimpleWindow.restype = ctypes.c_ulong
+        xlib.XCreateSimpleWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong] + \
+            [ctypes.c_int] * 2 + [ctypes.c_uint] * 3 + [ctypes.c_ulong] * 2
+        xlib.XDestroyWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        xlib.XPending.argtypes = [ctypes.c_void_p]
+        xlib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XEvent)]
+        xlib.XCheckTypedWindowEvent.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int,
+                                                ctypes.POINTER(_XEvent)]
+        xlib.XFlush.argtypes = [ctypes.c_void_p]
+        xlib.XConvertSelection.argtypes = [ctypes.c_void_p] + [ctypes.c_ulong] * 5
+        xlib.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long, ctypes.c_long,
+            ctypes.c_int, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_void_p)]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xfixes.XFixesQueryExtension.argtypes = [
+            ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+        xfixes.XFixesSelectSelectionInput.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]
+
+    def _run(self, on_change: Callable[[str], None]):
+        xlib = self.xlib
+        try:
+            display = self._open_display()
+        except OSError as e:
+            print(f"Error monitoring clipboard: {e}")
+            return
+        try:
+            event_base, error_base = ctypes.c_int(), ctypes.c_int()
+            self.xfixes.XFixesQueryExtension(display, ctypes.byref(event_base),
+                                             ctypes.byref(error_base))
+            window = xlib.XCreateSimpleWindow(display, xlib.XDefaultRootWindow(display),
+                                              0, 0, 1, 1, 0, 0, 0)
+            self._atoms = {atom: xlib.XInternAtom(display, atom.encode(), 0)
+                           for atom in ('CLIPBOARD', 'UTF8_STRING', 'INCR',
+                                        'CLIPBOARD_HISTORY_MANAGER')}
+            self.xfixes.XFixesSelectSelectionInput(
+                display, window, self._atoms['CLIPBOARD'],
+                _XFIXES_SET_SELECTION_OWNER_NOTIFY_MASK)
+            xlib.XFlush(display)
+            owner_changed = event_base.value + _XFIXES_SELECTION_NOTIFY
+            fd = xlib.XConnectionNumber(display)
+
+            # Pick up whatever is on the clipboard when we start
+            self._report(display, window, on_change)
+            event = _XEvent()
+            while not self._stop_event.is_set():
+                if not xlib.XPending(display):
+                    # Wake up periodically only to notice stop()
+                    select.select([fd], [], [], 0.25)
+                    continue
+                xlib.XNextEvent(display, ctypes.byref(event))
+                if event.type == owner_changed:
+                    self._report(display, window, on_change)
+            xlib.XDestroyWindow(display, window)
+        finally:
+            xlib.XCloseDisplay(display)
+
+    def _report(self, display, window, on_change: Callable[[str], None]):
+        try:
+            with READ_SECONDS.time():
+                text = self._read_clipboard(display, window)
+            if text is not None:
+                on_change(text)
+        except Exception as e:
+            READ_ERRORS.inc()
+            print(f"Error monitoring clipboard: {e}")
+
+    def _read_clipboard(self, display, window) -> Optional[str]:
+        """Ask the owner for the clipboard as UTF-8 and wait for the reply"""
+        xlib, atoms = self.xlib, self._atoms
+        prop = atoms['CLIPBOARD_HISTORY_MANAGER']
+        xlib.XConvertSelection(display, atoms['CLIPBOARD'], atoms['UTF8_STRING'],
+                               prop, window, _CURRENT_TIME)
+        xlib.XFlush(display)
+
+        event = _XEvent()
+        fd = xlib.XConnectionNumber(display)
+        deadline = time.monotonic() + self.timeout
+        # Only take the reply off the queue; owner changes that arrive in the
+        # meantime stay queued for the loop in _run to report afterwards
+        while not xlib.XCheckTypedWindowEvent(display, window, _SELECTION_NOTIFY,
+                                              ctypes.byref(event)):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            select.select([fd], [], [], remaining)
+        if event.xselection.property == 0:
+            # The owner could not convert to text (e.g. an image)
+            return None
+
+        actual_type, actual_format = ctypes.c_ulong(), ctypes.c_int()
+        n_items, bytes_after = ctypes.c_ulong(), ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        xlib.XGetWindowProperty(display, window, prop, 0, 0x1FFFFFFF, 1, _ANY_PROPERTY_TYPE,
+                                ctypes.byref(actual_type), ctypes.byref(actual_format),
+                                ctypes.byref(n_items), ctypes.byref(bytes_after),
+                                ctypes.byref(data))
+        try:
+            if actual_type.value == atoms['INCR']:
+                import pyperclip
+                return pyperclip.paste()
+            if not data.value or actual_format.value != 8:
+                return None
+            raw = ctypes.string_at(data.value, n_items.value)
+            return raw.decode('utf-8', errors='replace')
+        finally:
+            if data.value:
+                xlib.XFree(data)
+
+
+def _load_library(name: str):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        return None
+    try:
+        return ctypes.CDLL(path)
+    except OSError:
+        return None
+
+
+def create_backend(config: Dict) -> ClipboardBackend:
+    """Pick a clipboard backend from the ``clipboard_backend`` setting
+
+    ``auto`` uses X11 notifications on Linux when an X display and the
+    libraries are available and falls back to pyperclip polling.
+    """
+    choice = config.get('clipboard_backend', 'auto')
+    if choice == 'x11' or (choice == 'auto' and sys.platform.startswith('linux')
+                           and os.environ.get('DISPLAY')):
+        try:
+            return X11Backend()
+        except OSError as e:
+            if choice == 'x11':
+                print(f"X11 clipboard backend unavailable, polling instead: {e}")
+    return PollingBackend(config.get('poll_interval_min', 0.25),
+                          config.get('poll_interval_max', 10.0),
+                          config.get('poll_backoff', 1.5))
@@ -1,12 +1,26 @@
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Command-line queries answer without importing Tk
+    from cli import main as cli_main
+    sys.exit(cli_main())
+
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pyperclip
-import threading
-import time
-import json
-import os
-from datetime import datetime
+from tkinter import ttk
 from typing import List, Dict, Optional
+from app_config import DEFAULT_CONFIG, load_config
+from history_storage import open_store, open_blob_store
+from history_model import HistoryModel
+from history_view import VirtualHistoryList
+from classifier import ContentClassifier
+from near_duplicates import NearDuplicateIndex
+from retention import RetentionPolicy
+from search_worker import SearchWorker
+import metrics
+
+CAPTURES = metrics.counter('clipboard_captures_total', 'Clipboard changes handed to the history')
+REFRESH_SECONDS = metrics.histogram('history_refresh_seconds', 'Time to rebuild the history list')
+FRAME_SECONDS = metrics.histogram('history_frame_seconds', 'Time to apply one frame of changes')
 
 class ClipboardManager:
     def __init__(self, root):
@@ -16,20 +30,56 @@ class ClipboardManager:
         self.root.resizable(True, True)
         
         # Configuration
-        self.max_history = 50
-        self.poll_interval = 1.0  # seconds
-        self.history: List[Dict] = []
+        self.config = load_config()
+        self.max_history = self.config['max_history']
+        # Polling backs off from min to max while the clipboard is idle (seconds)
+        self.poll_interval_min = self.config['poll_interval_min']
+        self.poll_interval_max = self.config['poll_interval_max']
         self.last_clipboard = ""
         self.is_monitoring = False
+        # Created when monitoring first starts, after the window is up
+        self.clipboard_backend = None
+        
+        # The model is only ever mutated on the Tk thread; the monitor
+        # thread hands captures over through its queue
+        self.model = HistoryModel(open_store(self.config['storage']), self.max_history,
+                                  open_blob_store(self.config['storage']),
+                                  ContentClassifier.from_config(self.config.get('content_types')),
+                                  RetentionPolicy.from_config(self.config),
+                                  NearDuplicateIndex.from_config(self.config['near_duplicates']))
+        self.model.subscribe(self.on_history_change)
+        
+        # Model changes are batched and redrawn at most once per frame
+        self.frame_interval = 16  # ms
+        self.pending_changes: List[tuple] = []
+        self.full_refresh_pending = False
+        self.refresh_job = None
+        self.status_job = None
+        
+        # Searches run on a worker thread; keystrokes within the debounce
+        # delay (ms) collapse into one query and stale queries are cancelled
+        self.search_worker = SearchWorker()
+        self.search_debounce = self.config['search_debounce']
+        self.search_job = None
+        self.search_results_shown = False
+        self.search_poll_job = None
+        self.debounce_job = None
+        
+        # Setup UI first so the window appears before the history is read
+        self.setup_ui()
         
-        # Load existing history
+        # Stream existing history in, newest page first
         self.load_history()
         
-        # Setup UI
-        self.setup_ui()
+        # Start clipboard monitoring once the window has been drawn, and
+        # start draining its captures
+        self.drain_interval = 100  # ms
+        self.root.after_idle(self.start_monitoring)
+        self.process_captures()
         
-        # Start clipboard monitoring
-        self.start_monitoring()
+        # Periodically write the runtime metrics to a local file
+        self.metrics_job = None
+        self.schedule_metrics_dump()
         
         # Bind window events
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -63,6 +113,9 @@ class ClipboardManager:
         ttk.Button(control_frame, text="🗑️ Clear All", 
                   command=self.clear_all_history).pack(side=tk.LEFT, padx=(0, 5))
         
+        ttk.Button(control_frame, text="📈 Diagnostics", 
+                  command=self.show_diagnostics).pack(side=tk.LEFT, padx=(0, 5))
+        
         ttk.Button(control_frame, text="⚙️ Settings", 
                   command=self.show_settings).pack(side=tk.LEFT)
         
@@ -76,34 +129,22 @@ class ClipboardManager:
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=30)
         search_entry.pack(side=tk.LEFT, padx=(5, 0))
         
+        # Fuzzy mode ranks matches instead of listing them newest first
+        self.fuzzy_var = tk.BooleanVar(value=self.config['fuzzy_search'])
+        ttk.Checkbutton(search_frame, text="Fuzzy", variable=self.fuzzy_var,
+                        command=self.filter_history).pack(side=tk.LEFT, padx=(5, 0))
+        
         # History list
         list_frame = ttk.Frame(main_frame)
         list_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
         list_frame.columnconfigure(0, weight=1)
         list_frame.rowconfigure(0, weight=1)
         
-        # Create Treeview for history
-        columns = ('Time', 'Content', 'Type')
-        self.history_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
-        
-        # Configure columns
-        self.history_tree.heading('Time', text='Time')
-        self.history_tree.heading('Content', text='Content')
-        self.history_tree.heading('Type', text='Type')
-        
-        self.history_tree.column('Time', width=120, minwidth=100)
-        self.history_tree.column('Content', width=300, minwidth=200)
-        self.history_tree.column('Type', width=80, minwidth=60)
-        
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
-        h_scrollbar = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.history_tree.xview)
-        self.history_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        # Grid layout
-        self.history_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        # Virtualized list: only the visible rows exist in the Treeview
+        columns = (('Time', 120, 100), ('Content', 300, 200), ('Type', 80, 60))
+        self.history_list = VirtualHistoryList(list_frame, columns, self.row_values)
+        self.history_tree = self.history_list.tree
+        self.history_list.grid(row=0, column=0)
         
         # Bind events
         self.history_tree.bind('<Double-1>', self.copy_selected)
@@ -121,6 +162,7 @@ class ClipboardManager:
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="Copy", command=self.copy_selected)
         self.context_menu.add_command(label="Delete", command=self.delete_selected)
+        self.context_menu.add_command(label="Pin / Unpin", command=self.toggle_pin_selected)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="Copy to clipboard", command=self.copy_to_clipboard)
         
@@ -130,113 +172,187 @@ class ClipboardManager:
         self.refresh_history_display()
         
     def start_monitoring(self):
-        """Start clipboard monitoring in a separate thread"""
+        """Start the clipboard backend on its own thread"""
+        if self.clipboard_backend is None:
+            # Backends pull in ctypes and pyperclip, so load them off the startup path
+            from clipboard_backends import create_backend
+            self.clipboard_backend = create_backend(self.config)
         self.is_monitoring = True
-        self.monitor_thread = threading.Thread(target=self.monitor_clipboard, daemon=True)
-        self.monitor_thread.start()
-        
-    def monitor_clipboard(self):
-        """Monitor clipboard for changes"""
-        while self.is_monitoring:
-            try:
-                current_clipboard = pyperclip.paste()
-                if current_clipboard != self.last_clipboard and current_clipboard.strip():
-                    self.add_to_history(current_clipboard)
-                    self.last_clipboard = current_clipboard
-                    
-                    # Update status on main thread
-                    self.root.after(0, self.update_status, f"New item added: {current_clipboard[:50]}...")
-                    
-            except Exception as e:
-                print(f"Error monitoring clipboard: {e}")
-                
-            time.sleep(self.poll_interval)
+        self.clipboard_backend.start(self.monitor_clipboard)
     
-    def add_to_history(self, content: str):
-        """Add new content to history"""
-        # Check if content already exists (avoid duplicates)
-        if any(item['content'] == content for item in self.history):
-            return
-            
-        # Determine content type
-        content_type = self.detect_content_type(content)
-        
-        # Create history item
-        item = {
-            'content': content,
-            'type': content_type,
-            'timestamp': datetime.now().isoformat(),
-            'time_display': datetime.now().strftime('%H:%M:%S')
-        }
-        
-        # Add to beginning of list
-        self.history.insert(0, item)
-        
-        # Limit history size
-        if len(self.history) > self.max_history:
-            self.history = self.history[:self.max_history]
-        
-        # Save and refresh display
-        self.save_history()
-        self.root.after(0, self.refresh_history_display)
-    
-    def detect_content_type(self, content: str) -> str:
-        """Detect the type of content"""
-        if content.startswith('http://') or content.startswith('https://'):
-            return 'URL'
-        elif len(content) > 100:
-            return 'Text'
-        elif content.count('\n') > 2:
-            return 'Multi-line'
-        elif content.isdigit():
-            return 'Number'
+    def stop_monitoring(self):
+        """Stop the clipboard backend and wait for its thread to exit"""
+        self.is_monitoring = False
+        if self.clipboard_backend is not None:
+            self.clipboard_backend.stop()
+        
+    def monitor_clipboard(self, current_clipboard: str):
+        """Handle clipboard text reported by the backend (monitor thread)"""
+        if current_clipboard != self.last_clipboard and current_clipboard.strip():
+            self.last_clipboard = current_clipboard
+            CAPTURES.inc()
+            self.model.post_capture(current_clipboard)
+    
+    def process_captures(self):
+        """Apply captures queued by the monitor thread (Tk thread)"""
+        # Bound the work per pass so a flood of captures can't stall the UI
+        processed = self.model.process_pending(limit=500)
+        if processed >= 500:
+            delay = 0
+        elif self.model.loading:
+            # Pick up the next loaded page on the next frame
+            delay = self.frame_interval
         else:
-            return 'Text'
+            delay = self.drain_interval
+        self.root.after(delay, self.process_captures)
+    
+    def add_to_history(self, content: str):
+        """Add new content to history (Tk thread)"""
+        self.model.add(content)
+    
+    def selected_items(self) -> List[Dict]:
+        """Return the history items selected in the list"""
+        items = (self.model.get(item_id) for item_id in self.history_list.selection())
+        return [item for item in items if item is not None]
     
     def filter_history(self, *args):
         """Filter history based on search term"""
-        search_term = self.search_var.get().lower()
-        self.refresh_history_display(search_term)
-    
-    def refresh_history_display(self, filter_term: str = ""):
-        """Refresh the history display"""
-        # Clear existing items
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        # Add filtered items
-        for item in self.history:
-            if not filter_term or filter_term in item['content'].lower():
-                # Truncate content for display
-                display_content = item['content']
-                if len(display_content) > 50:
-                    display_content = display_content[:47] + "..."
-                
-                self.history_tree.insert('', 'end', values=(
-                    item['time_display'],
-                    display_content,
-                    item['type']
-                ))
+        # Drop the stale query at once and start a new one when typing pauses
+        self.search_worker.cancel()
+        if self.debounce_job is not None:
+            self.root.after_cancel(self.debounce_job)
+        self.debounce_job = self.root.after(self.search_debounce, self.run_search)
+    
+    def run_search(self):
+        self.debounce_job = None
+        self.refresh_history_display()
+    
+    def row_values(self, key: int) -> tuple:
+        """Column values for the row showing the item with this key"""
+        item = self.model.get(key)
+        # Truncate content for display
+        display_content = self.model.preview(item)
+        if len(display_content) > 50:
+            display_content = display_content[:47] + "..."
+        time_display = item['time_display']
+        if item.get('pinned'):
+            time_display = "📌 " + time_display
+        return (time_display, display_content, item['type'])
+    
+    def refresh_history_display(self, filter_term: Optional[str] = None, offset: int = 0):
+        """Rebuild the list model; only visible rows are redrawn"""
+        with REFRESH_SECONDS.time():
+            if filter_term is None:
+                filter_term = self.search_var.get()
+            if filter_term:
+                self.start_search(filter_term)
+            else:
+                self.search_worker.cancel()
+                self.search_job = None
+                self.history_list.set_keys(self.model.filter_keys(), offset)
+    
+    def start_search(self, filter_term: str):
+        """Run a query on the search worker; results replace the list as they arrive"""
+        self.search_job = self.model.search_job(filter_term, self.fuzzy_var.get(),
+                                                self.config['fuzzy_limit'])
+        self.search_worker.submit(self.search_job)
+        self.search_results_shown = False
+        if self.search_poll_job is None:
+            self.search_poll_job = self.root.after(self.frame_interval, self.poll_search)
+    
+    def poll_search(self):
+        """Show result chunks delivered by the search worker (Tk thread)"""
+        self.search_poll_job = None
+        if self.search_job is None:
+            return
+        chunks, done = self.search_worker.poll()
+        for chunk in chunks:
+            keys = [key for key in chunk if key in self.model.history]
+            if self.search_results_shown:
+                self.history_list.extend_bottom(keys)
+            else:
+                self.history_list.set_keys(keys)
+                self.search_results_shown = True
+        if done:
+            if not self.search_results_shown:
+                self.history_list.set_keys([])
+            self.model.keep_unpacked(self.search_job.unpacked)
+            self.search_job = None
+        else:
+            self.search_poll_job = self.root.after(self.frame_interval, self.poll_search)
+    
+    def on_history_change(self, event: str, item: Optional[Dict]):
+        """Queue a model change for the next frame"""
+        if event == 'clear':
+            self.pending_changes.clear()
+            self.full_refresh_pending = True
+        else:
+            self.pending_changes.append((event, item))
+        self.schedule_refresh()
+    
+    def schedule_refresh(self):
+        """Redraw on the next frame unless a redraw is already scheduled"""
+        if self.refresh_job is None:
+            self.refresh_job = self.root.after(self.frame_interval, self.flush_refresh)
+    
+    def flush_refresh(self):
+        """Apply every change queued since the last frame in one redraw"""
+        self.refresh_job = None
+        with FRAME_SECONDS.time():
+            self.apply_changes()
+    
+    def apply_changes(self):
+        """Redraw the list for the changes queued since the last frame"""
+        changes, self.pending_changes = self.pending_changes, []
+        loaded = [item for event, item in changes if event == 'load']
+        changes = [(event, item) for event, item in changes if event != 'load']
+        added = [item for event, item in changes if event == 'add']
+        
+        # Ranked or still-arriving results can't be patched in place, so
+        # search again
+        if (changes or loaded) and self.search_var.get() and \
+                (self.fuzzy_var.get() or self.search_job is not None):
+            self.full_refresh_pending = True
+        
+        # Stored items stream in below everything already shown
+        if loaded and not self.full_refresh_pending:
+            search_term = self.search_var.get()
+            self.history_list.extend_bottom(
+                [item['id'] for item in loaded
+                 if item['id'] in self.model.history and self.model.matches(item, search_term)])
+        
+        # A burst bigger than the viewport is cheaper as one rebuild
+        if self.full_refresh_pending:
+            self.full_refresh_pending = False
+            self.refresh_history_display()
+        elif len(changes) > self.history_list.visible_rows:
+            # Keep a scrolled view on the same rows
+            offset = self.history_list.offset
+            self.refresh_history_display(offset=offset + len(added) if offset else 0)
+        else:
+            search_term = self.search_var.get()
+            for event, item in changes:
+                key = item['id']
+                if event in ('pin', 'type'):
+                    self.history_list.refresh_row(key)
+                if event in ('touch', 'delete'):
+                    self.history_list.remove(key)
+                if event in ('add', 'touch') and key in self.model.history and \
+                        self.model.matches(item, search_term):
+                    self.history_list.insert_top(key)
+        
+        if len(added) == 1:
+            self.update_status(f"New item added: {self.model.preview(added[0])[:50]}...")
+        elif added:
+            self.update_status(f"{len(added)} new items added")
     
     def copy_selected(self, event=None):
         """Copy selected item to clipboard"""
-        selection = self.history_tree.selection()
-        if selection:
-            item_id = selection[0]
-            item_values = self.history_tree.item(item_id, 'values')
-            if item_values:
-                # Find the full content from history
-                time_display = item_values[0]
-                content_preview = item_values[1]
-                
-                # Find matching item in history
-                for item in self.history:
-                    if (item['time_display'] == time_display and 
-                        (item['content'].startswith(content_preview.replace("...", "")) or 
-                         content_preview == item['content'])):
-                        pyperclip.copy(item['content'])
-                        self.update_status(f"Copied: {item['content'][:50]}...")
-                        break
+        import pyperclip
+        for item in self.selected_items()[:1]:
+            # Large items are read straight from disk without filling the cache
+            pyperclip.copy(self.model.content(item, cache=False))
+            self.update_status(f"Copied: {self.model.preview(item)[:50]}...")
     
     def copy_to_clipboard(self):
         """Copy selected item to clipboard (context menu)"""
@@ -244,95 +360,50 @@ class ClipboardManager:
     
     def delete_selected(self, event=None):
         """Delete selected item from history"""
-        selection = self.history_tree.selection()
-        if selection:
-            item_id = selection[0]
-            item_values = self.history_tree.item(item_id, 'values')
-            if item_values:
-                time_display = item_values[0]
-                content_preview = item_values[1]
-                
-                # Remove from history
-                self.history = [item for item in self.history 
-                              if not (item['time_display'] == time_display and 
-                                    (item['content'].startswith(content_preview.replace("...", "")) or 
-                                     content_preview == item['content']))]
-                
-                self.save_history()
-                self.refresh_history_display()
-                self.update_status("Item deleted from history")
+        for item in self.selected_items()[:1]:
+            self.model.delete(item['id'])
+            self.update_status("Item deleted from history")
+    
+    def toggle_pin_selected(self):
+        """Pin the selected item so it is never evicted, or unpin it"""
+        for item in self.selected_items()[:1]:
+            pinned = not item.get('pinned')
+            self.model.pin(item['id'], pinned)
+            self.update_status("Item pinned" if pinned else "Item unpinned")
     
     def clear_all_history(self):
         """Clear all history"""
+        from tkinter import messagebox
         if messagebox.askyesno("Clear History", "Are you sure you want to clear all history?"):
-            self.history.clear()
-            self.save_history()
-            self.refresh_history_display()
+            self.model.clear()
             self.update_status("All history cleared")
     
     def toggle_monitoring(self):
         """Toggle clipboard monitoring on/off"""
         if self.is_monitoring:
-            self.is_monitoring = False
+            self.stop_monitoring()
             self.monitor_btn.config(text="▶️ Resume")
             self.update_status("Monitoring paused")
         else:
-            self.is_monitoring = True
             self.monitor_btn.config(text="⏸️ Pause")
             self.start_monitoring()
             self.update_status("Monitoring resumed")
     
+    def reload_content_types(self) -> int:
+        """Re-read content_types from config.json and relabel the history"""
+        self.config['content_types'] = load_config().get('content_types')
+        return len(self.model.set_classifier(
+            ContentClassifier.from_config(self.config['content_types'])))
+    
     def show_settings(self):
         """Show settings dialog"""
-        settings_window = tk.Toplevel(self.root)
-        settings_window.title("Settings")
-        settings_window.geometry("400x300")
-        settings_window.transient(self.root)
-        settings_window.grab_set()
-        
-        # Settings content
-        ttk.Label(settings_window, text="Settings", font=("Arial", 14, "bold")).pack(pady=10)
-        
-        # Max history setting
-        history_frame = ttk.Frame(settings_window)
-        history_frame.pack(fill=tk.X, padx=20, pady=5)
-        ttk.Label(history_frame, text="Max History Items:").pack(side=tk.LEFT)
-        history_var = tk.StringVar(value=str(self.max_history))
-        history_entry = ttk.Entry(history_frame, textvariable=history_var, width=10)
-        history_entry.pack(side=tk.RIGHT)
-        
-        # Poll interval setting
-        interval_frame = ttk.Frame(settings_window)
-        interval_frame.pack(fill=tk.X, padx=20, pady=5)
-        ttk.Label(interval_frame, text="Poll Interval (seconds):").pack(side=tk.LEFT)
-        interval_var = tk.StringVar(value=str(self.poll_interval))
-        interval_entry = ttk.Entry(interval_frame, textvariable=interval_var, width=10)
-        interval_entry.pack(side=tk.RIGHT)
-        
-        # Save button
-        def save_settings():
-            try:
-                new_max = int(history_var.get())
-                new_interval = float(interval_var.get())
-                
-                if new_max > 0 and new_interval > 0:
-                    self.max_history = new_max
-                    self.poll_interval = new_interval
-                    
-                    # Trim history if needed
-                    if len(self.history) > self.max_history:
-                        self.history = self.history[:self.max_history]
-                        self.save_history()
-                        self.refresh_history_display()
-                    
-                    settings_window.destroy()
-                    self.update_status("Settings saved")
-                else:
-                    messagebox.showerror("Error", "Values must be positive numbers")
-            except ValueError:
-                messagebox.showerror("Error", "Please enter valid numbers")
-        
-        ttk.Button(settings_window, text="Save", command=save_settings).pack(pady=20)
+        from settings_dialog import SettingsDialog
+        SettingsDialog(self)
+    
+    def show_diagnostics(self):
+        """Show counters and latencies of the hot paths"""
+        from diagnostics_dialog import DiagnosticsDialog
+        DiagnosticsDialog(self)
     
     def show_context_menu(self, event):
         """Show right-click context menu"""
@@ -344,59 +415,58 @@ class ClipboardManager:
     def update_status(self, message: str):
         """Update status bar message"""
         self.status_label.config(text=message)
-        # Clear status after 3 seconds
-        self.root.after(3000, lambda: self.status_label.config(text="Ready - Monitoring clipboard..."))
+        # Replace the pending reset rather than stacking another timer
+        if self.status_job is not None:
+            self.root.after_cancel(self.status_job)
+        self.status_job = self.root.after(self.config['status_message_duration'],
+                                          self.reset_status)
+    
+    def reset_status(self):
+        self.status_job = None
+        self.status_label.config(text="Ready - Monitoring clipboard...")
     
     def save_history(self):
-        """Save history to file"""
-        try:
-            # Convert datetime objects to strings for JSON serialization
-            save_data = []
-            for item in self.history:
-                save_item = item.copy()
-                if isinstance(save_item['timestamp'], datetime):
-                    save_item['timestamp'] = save_item['timestamp'].isoformat()
-                save_data.append(save_item)
-            
-            with open('clipboard_history.json', 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error saving history: {e}")
+        """Fold the journal into a full snapshot of the history"""
+        self.model.save()
     
     def load_history(self):
-        """Load history from file"""
-        try:
-            if os.path.exists('clipboard_history.json'):
-                with open('clipboard_history.json', 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Convert timestamp strings back to datetime objects
-                for item in data:
-                    if 'timestamp' in item and isinstance(item['timestamp'], str):
-                        try:
-                            item['timestamp'] = datetime.fromisoformat(item['timestamp'])
-                            item['time_display'] = item['timestamp'].strftime('%H:%M:%S')
-                        except ValueError:
-                            # If timestamp parsing fails, use current time
-                            item['timestamp'] = datetime.now()
-                            item['time_display'] = datetime.now().strftime('%H:%M:%S')
-                
-                self.history = data
-        except Exception as e:
-            print(f"Error loading history: {e}")
-            self.history = []
+        """Start reading stored history in the background, newest first"""
+        self.model.start_loading()
+        # Pick up what other instances sharing the history add or remove
+        self.model.watch_store(self.config['storage']['sync_interval'])
+    
+    def schedule_metrics_dump(self):
+        """Dump metrics every dump_interval seconds (0 turns dumping off)"""
+        interval = self.config['metrics'].get('dump_interval', 0)
+        if interval > 0:
+            self.metrics_job = self.root.after(int(interval * 1000), self.dump_metrics)
+    
+    def dump_metrics(self):
+        """Write the metrics file and schedule the next dump"""
+        self.write_metrics()
+        self.schedule_metrics_dump()
+    
+    def write_metrics(self):
+        """Write the metrics in the configured format"""
+        settings = self.config['metrics']
+        metrics.REGISTRY.dump(settings['file'], settings.get('format', 'prometheus'))
     
     def on_closing(self):
         """Handle application closing"""
-        self.is_monitoring = False
-        self.save_history()
+        self.stop_monitoring()
+        self.search_worker.stop()
+        self.model.process_pending()
+        self.model.close()
+        if self.metrics_job is not None:
+            self.root.after_cancel(self.metrics_job)
+            self.write_metrics()
         self.root.destroy()
 
 def main():
-    # Check if pyperclip is available
-    try:
-        import pyperclip
-    except ImportError:
+    # Check if pyperclip is available without importing it
+    import importlib.util
+    if importlib.util.find_spec('pyperclip') is None:
+        from tkinter import messagebox
         messagebox.showerror("Error", "pyperclip module not found. Please install it with: pip install pyperclip")
         return
     
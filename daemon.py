@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Headless daemon for Clipboard History Manager
+Captures the clipboard without Tk and answers queries on a Unix socket
+(Unix-like systems only)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+from typing import Dict, List, Optional, Set
+
+from app_config import load_config
+from classifier import ContentClassifier
+from daemon_client import DaemonClient, default_socket_path, socket_path
+from history_model import HistoryModel
+from history_storage import open_blob_store, open_store
+from near_duplicates import NearDuplicateIndex
+from retention import RetentionPolicy
+import metrics
+
+PREVIEW_LENGTH = 200
+# Requests are one JSON line each; anything longer is refused
+MAX_REQUEST_BYTES = 1024 * 1024
+
+REQUESTS = metrics.counter('daemon_requests_total', 'Socket API requests served')
+REQUEST_SECONDS = metrics.histogram('daemon_request_seconds', 'Time to answer one socket request')
+
+
+class ClipboardDaemon:
+    """Clipboard capture and history queries on one asyncio loop
+
+    The loop's thread owns the model, like the Tk thread does in the
+    GUI: the clipboard backend only queues captures and wakes the loop.
+    Clients send one JSON object per line, {"cmd": ..., "id": ...} plus
+    the command's arguments, and get one JSON line back with the same
+    "id" and either "result" or "error". Commands: list, search, get,
+    copy, delete, stats and subscribe. After subscribe the connection receives
+    {"event": ..., "item": ...} lines for every change.
+
+    SIGHUP re-reads the content types from ``config_path`` and relabels
+    the history.
+    """
+
+    def __init__(self, config: Dict, capture: bool = True,
+                 config_path: Optional[str] = None):
+        self.config = config
+        self.config_path = config_path
+        self.path = socket_path(config)
+        self.capture = capture
+        self.model = HistoryModel(open_store(config['storage']), config['max_history'],
+                                  open_blob_store(config['storage']),
+                                  ContentClassifier.from_config(config.get('content_types')),
+                                  RetentionPolicy.from_config(config),
+                                  NearDuplicateIndex.from_config(config['near_duplicates']))
+        self.model.subscribe(self.on_history_change)
+        self.backend = None
+        self.last_clipboard = ""
+        self.subscribers: Set[asyncio.Queue] = set()
+        # Connection handlers, cancelled on shutdown so subscribers let go
+        self.clients: Set[asyncio.Task] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server = None
+        self.stopped: Optional[asyncio.Event] = None
+        self.loaded: Optional[asyncio.Event] = None
+        self.drain_task: Optional[asyncio.Task] = None
+        self.commands = {
+            'list': self.cmd_list,
+            'search': self.cmd_search,
+            'get': self.cmd_get,
+            'copy': self.cmd_copy,
+            'delete': self.cmd_delete,
+            'stats': self.cmd_stats,
+        }
+
+    # Lifecycle
+
+    async def run(self):
+        """Serve until ``stop`` is called or the process gets SIGINT/SIGTERM"""
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Not available on this platform or off the main thread
+                pass
+        try:
+            self.loop.add_signal_handler(signal.SIGHUP, self.reload_config)
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            pass
+        await self.start()
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.shutdown()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = self.stopped or asyncio.Event()
+        self.loaded = asyncio.Event()
+        self.model.start_loading()
+        self.model.watch_store(self.config['storage']['sync_interval'])
+        self.drain_task = self.loop.create_task(self.drain())
+        self._remove_stale_socket()
+        self.server = await asyncio.start_unix_server(self.handle_client, self.path,
+                                                      limit=MAX_REQUEST_BYTES)
+        # Only this user may read the history
+        os.chmod(self.path, 0o600)
+        if self.capture:
+            from clipboard_backends import create_backend
+            self.backend = create_backend(self.config)
+            self.backend.start(self.on_clipboard)
+
+    def reload_config(self) -> int:
+        """Relabel the history with the content types now in the config file"""
+        if self.config_path is None:
+            return 0
+        self.config['content_types'] = load_config(self.config_path).get('content_types')
+        changed = self.model.set_classifier(
+            ContentClassifier.from_config(self.config['content_types']))
+        print(f"Reloaded content types, {len(changed)} items relabelled", flush=True)
+        return len(changed)
+
+    def stop(self):
+        if self.stopped is not None:
+            self.stopped.set()
+
+    async def shutdown(self):
+        if self.backend is not None:
+            self.backend.stop()
+        if self.drain_task is not None:
+            self.drain_task.cancel()
+        if self.server is not None:
+            self.server.close()
+            clients = list(self.clients)
+            for task in clients:
+                task.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+            await self.server.wait_closed()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.model.process_pending()
+        self.model.close()
+
+    def _remove_stale_socket(self):
+        """Remove a socket file left by a daemon that is gone; refuse to run twice"""
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.remove(self.path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Another daemon is already serving {self.path}")
+
+    # Capture
+
+    def on_clipboard(self, current_clipboard: str):
+        """Handle clipboard text reported by the backend (backend thread)"""
+        if current_clipboard != self.last_clipboard and current_clipboard.strip():
+            self.last_clipboard = current_clipboard
+            self.model.post_capture(current_clipboard)
+            self.loop.call_soon_threadsafe(self.process_captures)
+
+    def process_captures(self) -> int:
+        return self.model.process_pending(limit=500)
+
+    async def drain(self):
+        """Merge loaded pages and catch captures missed by a wakeup"""
+        while not self.stopped.is_set():
+            busy = self.process_captures() >= 500
+            if not self.model.loading:
+                self.loaded.set()
+            await asyncio.sleep(0 if busy else 0.01 if self.model.loading else 0.1)
+
+    def on_history_change(self, event: str, item: Optional[Dict]):
+        if event == 'load' or not self.subscribers:
+            return
+        message = {'event': event, 'item': self.summary(item) if item is not None else None}
+        for queue in self.subscribers:
+            queue.put_nowait(message)
+
+    # Protocol
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscription: Optional[asyncio.Queue] = None
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, {'error': 'request too long'})
+                    break
+                response = await self.dispatch(line)
+                if response.get('result') == 'subscribed':
+                    # Registered before the reply so no event can slip between
+                    subscription = asyncio.Queue()
+                    self.subscribers.add(subscription)
+                await self.send(writer, response)
+                if subscription is not None:
+                    # Pushed events take over the connection
+                    await self.stream_events(subscription, reader, writer)
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if subscription is not None:
+                self.subscribers.discard(subscription)
+            self.clients.discard(task)
+            writer.close()
+
+    async def dispatch(self, line: bytes) -> Dict:
+        start = self.loop.time()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            return {'error': f"bad request: {e}"}
+        response = {'id': request.get('id')}
+        cmd = request.get('cmd')
+        # Answer from the whole history, not the pages loaded so far
+        await self.loaded.wait()
+        try:
+            if cmd == 'subscribe':
+                response['result'] = 'subscribed'
+            elif cmd in self.commands:
+                response['result'] = await self.commands[cmd](request)
+            else:
+                response['error'] = f"unknown command: {cmd}"
+        except (KeyError, TypeError, ValueError) as e:
+            response['error'] = f"bad arguments for {cmd}: {e}"
+        REQUESTS.inc()
+        REQUEST_SECONDS.observe(self.loop.time() - start)
+        return response
+
+    async def stream_events(self, queue: asyncio.Queue, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        """Forward history events until the client hangs up"""
+        closed = self.loop.create_task(reader.read())
+        getter = None
+        try:
+            while not closed.done():
+                getter = self.loop.create_task(queue.get())
+                done, _ = await asyncio.wait({getter, closed},
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                await self.send(writer, getter.result())
+        finally:
+            closed.cancel()
+            if getter is not None:
+                getter.cancel()
+
+    @staticmethod
+    async def send(writer: asyncio.StreamWriter, message: Dict):
+        writer.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        await writer.drain()
+
+    # Commands
+
+    def summary(self, item: Dict) -> Dict:
+        """Item metadata and the start of its content"""
+        preview = self.model.preview(item)
+        return {
+            'id': item['id'],
+            'type': item['type'],
+            'timestamp': item['timestamp'].isoformat(),
+            'use_count': item.get('use_count', 1),
+            'size': item['size'] if item.get('blob') else len(preview),
+            'preview': preview[:PREVIEW_LENGTH],
+        }
+
+    def item(self, request: Dict) -> Dict:
+        item = self.model.get(int(request['item']))
+        if item is None:
+            raise KeyError(f"no item {request['item']}")
+        return item
+
+    async def cmd_list(self, request: Dict) -> List[Dict]:
+        offset, limit = int(request.get('offset', 0)), int(request.get('limit', 50))
+        keys = self.model.ordered_keys()[offset:offset + limit]
+        return [dict(self.summary(self.model.get(key)), position=offset + index + 1)
+                for index, key in enumerate(keys)]
+
+    async def cmd_search(self, request: Dict) -> List[Dict]:
+        limit = int(request.get('limit', 50))
+        job = self.model.search_job(str(request['query']), bool(request.get('fuzzy')), limit)
+
+        def matching_keys() -> List[int]:
+            keys = []
+            for chunk in job.run(lambda: False):
+                keys.extend(chunk)
+                if len(keys) >= limit:
+                    break
+            return keys[:limit]
+
+        # Scan the snapshot off the loop so other clients keep being served
+        keys = await self.loop.run_in_executor(None, matching_keys)
+        self.model.keep_unpacked(job.unpacked)
+        positions = [(key, self.model.position(key)) for key in keys]
+        return [dict(self.summary(self.model.get(key)), position=position + 1)
+                for key, position in positions if position is not None]
+
+    async def cmd_get(self, request: Dict) -> Dict:
+        item = self.item(request)
+        result = self.summary(item)
+        result['content'] = self.model.content(item, cache=False)
+        return result
+
+    async def cmd_copy(self, request: Dict) -> Dict:
+        content = self.model.content(self.item(request), cache=False)
+        import pyperclip
+        await self.loop.run_in_executor(None, pyperclip.copy, content)
+        return {'copied': len(content)}
+
+    async def cmd_delete(self, request: Dict) -> Dict:
+        return {'deleted': self.model.delete(self.item(request)['id']) is not None}
+
+    async def cmd_stats(self, request: Dict) -> Dict:
+        history = self.model.history
+        types: Dict[str, int] = {}
+        for item in history.values():
+            types[item['type']] = types.get(item['type'], 0) + 1
+        newest, oldest = (next(reversed(history.values())), next(iter(history.values()))) \
+            if history else ({}, {})
+        return {
+            'items': len(history),
+            'types': types,
+            'newest': newest['timestamp'].isoformat() if newest else None,
+            'oldest': oldest['timestamp'].isoformat() if oldest else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Clipboard History Manager without a window")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--socket', help='socket path (default: config daemon.socket)')
+    parser.add_argument('--no-capture', action='store_true',
+                        help='serve the stored history without watching the clipboard')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.socket:
+        config['daemon']['socket'] = args.socket
+    daemon = ClipboardDaemon(config, capture=not args.no_capture, config_path=args.config)
+    print(f"Serving clipboard history on {daemon.path}", flush=True)
+    try:
+        asyncio.run(daemon.run())
+    except RuntimeError as e:
+        print(f"Error starting daemon: {e}")
+
+
+if __name__ == "__main__":
+    main()
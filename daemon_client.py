@@ -0,0 +1,64 @@
+"""
+Client side of the Clipboard History Manager daemon's socket API
+Kept apart from the daemon so the CLI connects without importing asyncio
+or the history model
+"""
+
+import json
+import os
+import socket
+import tempfile
+from typing import Dict, Optional
+
+
+def default_socket_path() -> str:
+    """Per-user socket in $XDG_RUNTIME_DIR, or the temp dir without one"""
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, f"clipboard-manager-{os.getuid()}.sock")
+
+
+def socket_path(config: Dict) -> str:
+    return config.get('daemon', {}).get('socket') or default_socket_path()
+
+
+class DaemonClient:
+    """Blocking client for the daemon's socket, for scripts and the CLI"""
+
+    def __init__(self, path: Optional[str] = None, timeout: float = 5.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path or default_socket_path())
+        except OSError:
+            self.sock.close()
+            raise
+        self.file = self.sock.makefile('rwb')
+        self.next_id = 0
+
+    def request(self, cmd: str, **params):
+        """Send one command and return its result; errors raise RuntimeError"""
+        self.next_id += 1
+        message = dict(params, cmd=cmd, id=self.next_id)
+        self.file.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.file.flush()
+        response = self.read()
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def read(self) -> Dict:
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("daemon closed the connection")
+        return json.loads(line)
+
+    def events(self):
+        """Subscribe and yield every history event as it happens"""
+        self.request('subscribe')
+        self.sock.settimeout(None)
+        while True:
+            yield self.read()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
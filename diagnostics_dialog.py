@@ -0,0 +1,77 @@
+"""
+Diagnostics window for Clipboard History Manager
+Live view of the runtime counters and latency histograms
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+import metrics
+
+
+class DiagnosticsDialog:
+    """Window listing every metric, refreshed once a second while open"""
+
+    refresh_interval = 1000  # ms
+
+    def __init__(self, app):
+        self.app = app
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Diagnostics")
+        self.window.geometry("620x320")
+        self.window.transient(app.root)
+
+        ttk.Label(self.window, text="Diagnostics", font=("Arial", 14, "bold")).pack(pady=10)
+
+        columns = ('Count', 'Mean', 'p50', 'p95', 'Max')
+        self.tree = ttk.Treeview(self.window, columns=columns, height=10)
+        self.tree.heading('#0', text='Metric')
+        self.tree.column('#0', width=220)
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=70, anchor=tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        button_frame = ttk.Frame(self.window)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Write metrics file",
+                   command=self.write_metrics).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="Close", command=self.window.destroy).pack(side=tk.LEFT)
+
+        self.refresh()
+
+    @staticmethod
+    def format_seconds(seconds: float) -> str:
+        if seconds < 0.001:
+            return f"{seconds * 1e6:.0f} µs"
+        if seconds < 1:
+            return f"{seconds * 1000:.1f} ms"
+        return f"{seconds:.2f} s"
+
+    def row_values(self, metric) -> tuple:
+        """Column values for one metric"""
+        if metric.kind == 'counter':
+            return (metric.value, '', '', '', '')
+        if not metric.count:
+            return (0, '', '', '', '')
+        return (metric.count,
+                self.format_seconds(metric.sum / metric.count),
+                self.format_seconds(metric.quantile(0.5)),
+                self.format_seconds(metric.quantile(0.95)),
+                self.format_seconds(metric.max))
+
+    def refresh(self):
+        """Redraw the table and schedule the next refresh"""
+        if not self.window.winfo_exists():
+            return
+        for metric in metrics.REGISTRY.all():
+            values = self.row_values(metric)
+            if self.tree.exists(metric.name):
+                self.tree.item(metric.name, values=values)
+            else:
+                self.tree.insert('', tk.END, iid=metric.name, text=metric.name, values=values)
+        self.window.after(self.refresh_interval, self.refresh)
+
+    def write_metrics(self):
+        self.app.write_metrics()
+        self.app.update_status(f"Metrics written to {self.app.config['metrics']['file']}")
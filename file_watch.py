@@ -0,0 +1,171 @@
+"""
+File change notification for Clipboard History Manager
+inotify on Linux, stat polling everywhere else
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, List, Optional, Tuple
+
+# inotify constants (linux/inotify.h)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_CLOEXEC = 0o2000000
+_IN_NONBLOCK = 0o4000
+# struct inotify_event: wd, mask, cookie, len, then the name
+_EVENT = struct.Struct('iIII')
+
+
+class FileWatcher:
+    """Watches a few files and reports when any of them may have changed
+
+    ``start`` runs the watcher on its own daemon thread and calls
+    ``on_change()`` after a watched file is written, created or replaced
+    by a rename; several changes may be reported as one, and a report
+    may come for a write that changed nothing. ``stop`` blocks until the
+    thread has exited.
+    """
+
+    name = 'base'
+
+    def __init__(self, paths: List[str]):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self, on_change: Callable[[], None]):
+        """Start watching the files"""
+        self.stop()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_change,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching and wait for the watcher thread to exit"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self, on_change: Callable[[], None]):
+        raise NotImplementedError
+
+
+class StatWatcher(FileWatcher):
+    """Compares each file's inode, size and mtime every ``interval`` seconds"""
+
+    name = 'stat'
+
+    def __init__(self, paths: List[str], interval: float = 1.0):
+        super().__init__(paths)
+        self.interval = interval
+
+    def signature(self) -> List[Optional[Tuple[int, int, int]]]:
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                signature.append(None)
+                continue
+            signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        return signature
+
+    def _run(self, on_change: Callable[[], None]):
+        last = self.signature()
+        while not self._stop_event.wait(self.interval):
+            current = self.signature()
+            if current != last:
+                last = current
+                on_change()
+
+
+class InotifyWatcher(FileWatcher):
+    """Linux inotify watches on the files' directories
+
+    Watching the directories rather than the files themselves also
+    catches a file being replaced with ``os.replace``, which gives it a
+    new inode. The thread sleeps in ``select`` on the inotify descriptor
+    and only wakes for events in those directories.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, paths: List[str]):
+        super().__init__(paths)
+        self.libc = _load_libc()
+        if self.libc is None or not hasattr(self.libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.libc.inotify_init1.argtypes = [ctypes.c_int]
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+    def _open(self) -> int:
+        fd = self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        try:
+            for directory in {os.path.dirname(path) for path in self.paths}:
+                if self.libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                    raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+        except OSError:
+            os.close(fd)
+            raise
+        return fd
+
+    def _run(self, on_change: Callable[[], None]):
+        try:
+            fd = self._open()
+        except OSError as e:
+            print(f"Error watching history files: {e}")
+            return
+        names = {os.fsencode(os.path.basename(path)) for path in self.paths}
+        try:
+            while not self._stop_event.is_set():
+                # Wake up periodically only to notice stop()
+                ready, _, _ = select.select([fd], [], [], 0.25)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                if any(name in names for name in _event_names(data)):
+                    on_change()
+        finally:
+            os.close(fd)
+
+
+def _event_names(data: bytes) -> List[bytes]:
+    names, offset = [], 0
+    while offset + _EVENT.size <= len(data):
+        _, _, _, length = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        names.append(data[offset:offset + length].rstrip(b'\0'))
+        offset += length
+    return names
+
+
+def _load_libc():
+    path = ctypes.util.find_library('c')
+    try:
+        return ctypes.CDLL(path, use_errno=True)
+    except OSError:
+        return None
+
+
+def create_watcher(paths: List[str], interval: float = 1.0) -> FileWatcher:
+    """inotify on Linux, stat polling every ``interval`` seconds elsewhere"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths)
+        except OSError:
+            pass
+    return StatWatcher(paths, interval)
@@ -0,0 +1,178 @@
+"""
+Compact history items for Clipboard History Manager
+One slot per field instead of a dict per clipboard entry
+"""
+
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+# Keys kept as they are, each in its own slot
+FIELDS = ('id', 'digest', 'type', 'use_count', 'size', 'content', 'packed', 'preview',
+          'blob', 'pinned', 'simhash')
+_SLOTS = frozenset(FIELDS)
+# Keys handled without going through the extra dict
+_KNOWN = _SLOTS | {'timestamp', 'time_display'}
+_MISSING = object()
+
+
+def epoch(timestamp) -> float:
+    """Seconds since the epoch for a datetime, an ISO string or a number"""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            # Unreadable timestamps count as copied now
+            return time.time()
+    return float(timestamp)
+
+
+class HistoryItem:
+    """A history entry that reads and writes like the dict it replaces
+
+    A dict per item, holding a ``datetime`` and a preformatted
+    'time_display' string, cost several hundred bytes before the content
+    itself. Here each known key has a slot, 'timestamp' is kept as an
+    epoch float and handed out as a ``datetime``, type labels are
+    interned and 'time_display' is derived from the timestamp when it is
+    read. A slot holding ``_MISSING`` is a missing key (so lookups never
+    raise internally); keys without a slot go to a dict created on first
+    use.
+
+    ``rank`` is not a key: the model keeps it to order items by recency
+    without walking its history (higher is newer), and it isn't stored.
+    """
+
+    __slots__ = FIELDS + ('_time', '_extra', 'rank')
+
+    def __init__(self, data: Optional[Dict] = None, **fields):
+        if fields:
+            data = dict(data or {}, **fields)
+        elif data is None:
+            data = {}
+        # Items are built once per stored entry on load, so fill the
+        # slots directly rather than key by key through __setitem__
+        get = data.get
+        for name in FIELDS:
+            setattr(self, name, get(name, _MISSING))
+        if isinstance(self.type, str):
+            self.type = sys.intern(self.type)
+        timestamp = get('timestamp', _MISSING)
+        self._time = _MISSING if timestamp is _MISSING else epoch(timestamp)
+        self._extra = None
+        self.rank = 0
+        if len(data) > len(_KNOWN) or not data.keys() <= _KNOWN:
+            self._extra = {key: value for key, value in data.items() if key not in _KNOWN}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _SLOTS:
+            value = getattr(self, key)
+        elif key == 'timestamp':
+            value = self._time
+            if value is not _MISSING:
+                value = datetime.fromtimestamp(value)
+        elif key == 'time_display':
+            value = self._time
+            if value is not _MISSING:
+                value = time.strftime('%H:%M:%S', time.localtime(value))
+        else:
+            value = self._extra.get(key, _MISSING) if self._extra else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        if key in _SLOTS:
+            if key == 'type' and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, key, value)
+        elif key == 'timestamp':
+            self._time = epoch(value)
+        elif key == 'time_display':
+            # Derived from the timestamp; older files still store it
+            pass
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        name = '_time' if key == 'timestamp' else key
+        if name in _SLOTS or name == '_time':
+            if getattr(self, name) is _MISSING:
+                raise KeyError(key)
+            setattr(self, name, _MISSING)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        if key in _SLOTS:
+            return getattr(self, key) is not _MISSING
+        if key in ('timestamp', 'time_display'):
+            return self._time is not _MISSING
+        return bool(self._extra) and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        """Stored keys; 'time_display' is left out as it is derived"""
+        for key in FIELDS:
+            if getattr(self, key) is not _MISSING:
+                yield key
+        if self._time is not _MISSING:
+            yield 'timestamp'
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"HistoryItem({self.copy()!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _SLOTS:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key: str, *default) -> Any:
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def update(self, data: Optional[Dict] = None, **fields):
+        for source in (data or {}, fields):
+            for key, value in source.items():
+                self[key] = value
+
+    def copy(self) -> Dict:
+        """A plain dict of the stored keys, e.g. for serializing"""
+        # Straight from the slots: snapshots copy every item
+        data = {}
+        for key in FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                data[key] = value
+        if self._time is not _MISSING:
+            data['timestamp'] = datetime.fromtimestamp(self._time)
+        if self._extra:
+            data.update(self._extra)
+        return data
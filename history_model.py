@@ -0,0 +1,808 @@
+"""
+History model for Clipboard History Manager
+Owns the clipboard history, its indexes and storage, independent of Tk
+"""
+
+import contextlib
+import heapq
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional
+
+from history_item import HistoryItem
+from history_storage import (HistoryStore, BlobStore, item_key, item_digest, content_digest,
+                             assign_ids, set_pinned)
+from search_index import FUZZY_MAX_SCORED, TrigramIndex, fuzzy_score
+from search_worker import SEARCH_SECONDS, SearchJob
+from classifier import ContentClassifier
+from near_duplicates import NearDuplicateIndex
+from retention import EvictionOrder, RetentionPolicy
+import metrics
+
+PREVIEW_LENGTH = 200
+
+ADD_SECONDS = metrics.histogram('history_add_seconds', 'Time to add one capture to the history')
+DUPLICATES = metrics.counter('history_duplicates_total', 'Captures that repeated an existing item')
+SAVE_SECONDS = metrics.histogram('history_save_seconds', 'Time to write a full snapshot')
+REMOTE_CHANGES = metrics.counter('history_remote_changes_total',
+                                 'Changes applied from other processes sharing the history')
+RELOADS = metrics.counter('history_reloads_total',
+                          'Full reloads after falling too far behind other processes')
+EVICTIONS = {
+    'count': metrics.counter('history_evicted_over_count_total',
+                             'Items evicted to stay within max_history'),
+    'bytes': metrics.counter('history_evicted_over_bytes_total',
+                             'Items evicted to stay within retention.max_bytes'),
+    'age': metrics.counter('history_evicted_expired_total',
+                           'Items evicted for being older than retention.max_age_days'),
+}
+EVICTED_BYTES = metrics.counter('history_evicted_bytes_total',
+                                'Bytes of content evicted by the retention limits')
+REJECTED = metrics.counter('history_rejected_total',
+                           'Captures larger than retention.max_item_bytes, not kept')
+NEAR_DUPLICATES = metrics.counter('history_near_duplicates_total',
+                                  'Older near-duplicates replaced by a new capture')
+
+
+class HistoryModel:
+    """Clipboard history with a single writer
+
+    All mutating methods must be called from the thread that owns the
+    model (the Tk main loop in the app). Other threads hand over new
+    clipboard text with ``post_capture``, which only puts it on a queue;
+    the owner applies queued captures by calling ``process_pending``.
+
+    ``start_loading`` reads the stored history on a background thread;
+    its pages, newest first, are merged by ``process_pending`` as they
+    arrive (listeners get a 'load' event per item) and captures wait
+    until the whole history has been merged.
+
+    Listeners registered with ``subscribe`` are called on the owner
+    thread as ``listener(event, item)`` where event is one of 'add',
+    'touch', 'delete', 'pin', 'clear' (item is None), 'load' (an item
+    merged from the stored history) or 'type' (an item relabelled after
+    the content types were reloaded).
+
+    What is kept follows a ``RetentionPolicy``: limits on item count,
+    total bytes and age evict the oldest unpinned items (as 'delete'
+    events), and captures above the per-item limit are not kept at all.
+    Pinned items are never evicted.
+
+    With a ``NearDuplicateIndex`` a capture also replaces older items
+    that are nearly the same text (whitespace aside, or a token changed),
+    taking over their use counts and pins. Items carry their SimHash in
+    'simhash'; stored items from before the mode was on are fingerprinted
+    while loading if their content is at hand, so packed and blob items
+    only take part once copied again.
+
+    Several processes may share one store. Every change first applies
+    what the others wrote (``sync``) while holding the store's lock, so
+    IDs, duplicate checks and order stay consistent across them.
+    ``watch_store`` starts a watcher thread that flags changes in the
+    store's files, and ``process_pending`` then syncs; listeners see
+    those changes as ordinary events.
+
+    Items are ``HistoryItem`` records, read and written like dicts.
+    With a ``BlobStore``, content above its threshold is kept on disk
+    and the item only holds 'digest', 'size' and 'preview' (and 'blob'
+    set to True). Items loaded from a compressed snapshot hold their
+    content in 'packed' until it is first needed. Use ``content`` and
+    ``preview`` rather than reading item['content'] directly.
+    """
+
+    def __init__(self, store: HistoryStore, max_history: int = 50,
+                 blobs: Optional[BlobStore] = None,
+                 classifier: Optional[ContentClassifier] = None,
+                 retention: Optional[RetentionPolicy] = None,
+                 near_duplicates: Optional[NearDuplicateIndex] = None):
+        self.store = store
+        self.blobs = blobs
+        self.classifier = classifier or ContentClassifier.from_config()
+        self.retention = retention or RetentionPolicy(max_items=max_history)
+        # Item ID -> item, oldest first so moves to the top are O(1)
+        self.history: 'OrderedDict[int, Dict]' = OrderedDict()
+        self.ids_by_digest: Dict[str, int] = {}
+        self.blob_ids = set()
+        self.packed_ids = set()
+        self.next_id = 1
+        self.eviction = EvictionOrder()
+        self.near_duplicates = near_duplicates
+        # In-memory substring index, unless the store keeps its own
+        self.search_index = None
+        if not store.indexes_content:
+            self.search_index = TrigramIndex(loader=self._load_lowered)
+        self.inbox: 'queue.Queue[str]' = queue.Queue()
+        self.loading = False
+        self.ids_assigned = False
+        self._pages: 'queue.Queue[Optional[List[Dict]]]' = queue.Queue()
+        self._cancel_load = threading.Event()
+        self.listeners: List[Callable[[str, Optional[Dict]], None]] = []
+        # Newest-first IDs and their positions, until the next change
+        self._ordered_keys: Optional[List[int]] = None
+        self._positions: Optional[Dict[int, int]] = None
+        # Item ranks handed out at the top and bottom of the history
+        self._newest_rank = 0
+        self._oldest_rank = 0
+        self.watcher = None
+        self._store_changed = threading.Event()
+
+    def __len__(self):
+        return len(self.history)
+
+    @property
+    def max_history(self) -> int:
+        return self.retention.max_items
+
+    # Events
+
+    def subscribe(self, listener: Callable[[str, Optional[Dict]], None]):
+        """Call ``listener(event, item)`` after every change"""
+        self.listeners.append(listener)
+
+    def _notify(self, event: str, item: Optional[Dict]):
+        # Every change to the history is notified, so the cached order ends here
+        self._ordered_keys = self._positions = None
+        for listener in self.listeners:
+            listener(event, item)
+
+    def post_capture(self, content: str):
+        """Queue clipboard text for the owner thread; safe from any thread"""
+        self.inbox.put(content)
+
+    def process_pending(self, limit: Optional[int] = None) -> int:
+        """Merge loaded pages, then apply queued captures; returns how many items
+
+        Without a limit this first waits for loading to finish.
+        """
+        if limit is None:
+            self.finish_loading()
+        processed = 0
+        while self.loading and (limit is None or processed < limit):
+            try:
+                page = self._pages.get_nowait()
+            except queue.Empty:
+                break
+            processed += self._merge_page(page)
+        if self.loading:
+            # Captures wait until duplicate checks and IDs can see every item
+            return processed
+        if self._store_changed.is_set():
+            self._store_changed.clear()
+            processed += self.sync()
+        # Items age out while nothing is happening
+        if self.eviction.next_victim(len(self.history), self.retention) is not None:
+            self.enforce_retention()
+        while limit is None or processed < limit:
+            try:
+                content = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            self.add(content)
+            processed += 1
+        return processed
+
+    # Queries
+
+    def items(self) -> List[Dict]:
+        """Return history items, newest first"""
+        return list(reversed(self.history.values()))
+
+    def get(self, item_id: int) -> Optional[Dict]:
+        """Look up a history item by its ID"""
+        return self.history.get(item_id)
+
+    def content(self, item: Dict, cache: bool = True) -> str:
+        """Return the full content of an item, reading its blob if needed"""
+        content = item.get('content')
+        if content is not None:
+            return content
+        if 'packed' in item:
+            return self._unpack(item)
+        try:
+            return self.blobs.get(item['digest'], cache=cache)
+        except (AttributeError, OSError) as e:
+            print(f"Error reading stored content: {e}")
+            return item.get('preview', '')
+
+    def preview(self, item: Dict) -> str:
+        """Return the start of an item's content without loading blobs"""
+        content = item.get('content')
+        if content is not None:
+            return content
+        if 'packed' in item:
+            return self._unpack(item)
+        return item.get('preview', '')
+
+    def _unpack(self, item: Dict) -> str:
+        """Decompress a packed item in place and make it searchable"""
+        content = item['packed'].unpack()
+        self._set_unpacked(item, content)
+        return content
+
+    def _set_unpacked(self, item: Dict, content: str):
+        # Content first: a background compaction may be serializing the item
+        item['content'] = content
+        del item['packed']
+        self.packed_ids.discard(item_key(item))
+        if self.search_index is not None:
+            self.search_index.add(item_key(item), content)
+
+    def _load_lowered(self, item_id: int) -> str:
+        return self.content(self.history[item_id]).lower()
+
+    def search_keys(self, search_term: str) -> Optional[set]:
+        """Return IDs of items matching search_term, or None to scan"""
+        # Searching needs every item's text, so expand what is still packed
+        for item_id in list(self.packed_ids):
+            self._unpack(self.history[item_id])
+        if self.search_index is not None:
+            return self.search_index.search(search_term)
+        matches = self.store.search(search_term)
+        if matches is None:
+            return None
+        # The store only indexed the preview of blob items
+        search_term = search_term.lower()
+        return set(matches) | {item_id for item_id in self.blob_ids
+                               if search_term in self._load_lowered(item_id)}
+
+    def filter_keys(self, filter_term: str = "") -> List[int]:
+        """Return IDs of items containing filter_term, newest first"""
+        filter_term = filter_term.lower()
+        if not filter_term:
+            return list(self.ordered_keys())
+        with SEARCH_SECONDS.time():
+            return self._filter_keys(filter_term)
+
+    def _filter_keys(self, filter_term: str) -> List[int]:
+        # Answer the query from an index when one is available
+        matches = self.search_keys(filter_term)
+        if matches is None:
+            return [item_key(item) for item in reversed(self.history.values())
+                    if filter_term in self.content(item).lower()]
+        history = self.history
+        if len(matches) * 8 > len(history):
+            # Most items match: walking the order beats sorting them
+            return [key for key in self.ordered_keys() if key in matches]
+        # A store still has items a load in progress hasn't merged
+        ranked = [history[key] for key in matches if key in history]
+        ranked.sort(key=attrgetter('rank'), reverse=True)
+        return [item_key(item) for item in ranked]
+
+    def fuzzy_keys(self, filter_term: str, limit: int = 200) -> List[int]:
+        """Return IDs of the best fuzzy matches for filter_term, best first"""
+        filter_term = filter_term.lower()
+        keys = self.ordered_keys()
+        if not filter_term:
+            return list(keys)
+        with SEARCH_SECONDS.time():
+            for item_id in list(self.packed_ids):
+                self._unpack(self.history[item_id])
+            if self.search_index is not None:
+                matches = self.search_index.fuzzy_search(filter_term, keys, limit)
+            else:
+                # The store's index only answers substring queries: past the
+                # newest items it narrows the rest down to outright matches
+                outright = self.search_keys(filter_term) or set()
+                keys = keys[:FUZZY_MAX_SCORED] + [key for key in keys[FUZZY_MAX_SCORED:]
+                                                  if key in outright]
+                scored = ((fuzzy_score(filter_term, self._load_lowered(key)), key)
+                          for key in keys)
+                matches = heapq.nlargest(limit, ((score, key) for score, key in scored
+                                                 if score is not None),
+                                         key=lambda match: match[0])
+            return [key for _, key in matches]
+
+    def ordered_keys(self) -> List[int]:
+        """Item IDs, newest first, shared until the next change: don't modify"""
+        if self._ordered_keys is None:
+            self._ordered_keys = list(reversed(self.history))
+        return self._ordered_keys
+
+    def position(self, item_id: int) -> Optional[int]:
+        """Index of an item in ``ordered_keys``"""
+        if self._positions is None:
+            self._positions = {key: index for index, key in enumerate(self.ordered_keys())}
+        return self._positions.get(item_id)
+
+    def _rank_newest(self, item: Dict):
+        self._newest_rank += 1
+        item.rank = self._newest_rank
+
+    def _rank_oldest(self, item: Dict):
+        self._oldest_rank -= 1
+        item.rank = self._oldest_rank
+
+    def search_job(self, filter_term: str, fuzzy: bool = False, limit: int = 200) -> SearchJob:
+        """Set up a query to run on another thread
+
+        Call on the owner thread, then pass the finished job's
+        ``unpacked`` texts to ``keep_unpacked``. Keystrokes between two
+        changes copy nothing: the job shares the cached order and reads
+        the live index and items one key at a time.
+        """
+        filter_term = filter_term.lower()
+        keys = self.ordered_keys()
+        if self.search_index is None:
+            # The store's connection belongs to this thread; answer now
+            results = self.fuzzy_keys(filter_term, limit) if fuzzy else self.filter_keys(filter_term)
+            return SearchJob(filter_term, keys, fuzzy, limit, results=results)
+
+        history, blobs = self.history, self.blobs
+        # Empty once a search has unpacked everything
+        job = SearchJob(filter_term, keys, fuzzy, limit, self.search_index,
+                        packed=set(self.packed_ids))
+
+        def load(key: int) -> str:
+            item = history.get(key)
+            if item is None:
+                # Removed since the job was set up
+                return ''
+            # 'packed' first: unpacking sets 'content' before dropping it
+            packed = item.get('packed')
+            if packed is not None:
+                content = job.unpacked[key] = packed.unpack()
+                return content.lower()
+            content = item.get('content')
+            if content is not None:
+                return content.lower()
+            try:
+                # Bypass the blob cache so a search can't flush it
+                return blobs.get(item['digest'], cache=False).lower()
+            except (AttributeError, OSError):
+                return item.get('preview', '').lower()
+
+        job.load = load
+        return job
+
+    def keep_unpacked(self, unpacked: Dict[int, str]):
+        """Keep content a search job decompressed, so it is indexed from now on"""
+        for item_id, content in unpacked.items():
+            item = self.history.get(item_id)
+            if item is not None and 'packed' in item:
+                self._set_unpacked(item, content)
+
+    def matches(self, item: Dict, filter_term: str) -> bool:
+        """Whether a single item contains filter_term"""
+        filter_term = filter_term.lower()
+        return not filter_term or filter_term in self.content(item).lower()
+
+    # Mutations (owner thread only)
+
+    def add(self, content: str) -> Optional[Dict]:
+        """Add new content to history"""
+        if not content.strip():
+            return None
+        with ADD_SECONDS.time(), self._writing():
+            return self._add(content)
+
+    def _add(self, content: str) -> Optional[Dict]:
+        # A repeated copy moves the existing item back to the top
+        digest = content_digest(content)
+        existing_id = self.ids_by_digest.get(digest)
+        if existing_id is not None:
+            DUPLICATES.inc()
+            return self.touch(self.history[existing_id])
+
+        size = len(content.encode('utf-8', 'surrogatepass'))
+        if not self.retention.accepts(size):
+            REJECTED.inc()
+            return None
+
+        item = HistoryItem(type=self.detect_content_type(content, digest),
+                           timestamp=time.time(), use_count=1, digest=digest, size=size,
+                           id=self.next_id)
+        self.next_id += 1
+        if self.near_duplicates is not None:
+            fingerprint = self.near_duplicates.fingerprint(content)
+            if fingerprint is not None:
+                item['simhash'] = fingerprint[0]
+                self._collapse(item, self.near_duplicates.find(*fingerprint))
+        if self.blobs is not None and self.blobs.should_store(content):
+            # Large payloads live on disk, shared by every copy of them
+            self.blobs.put(digest, content)
+            item['preview'] = content[:PREVIEW_LENGTH]
+            item['blob'] = True
+        else:
+            item['content'] = content
+
+        # Add to the top of the history
+        self.history[item_key(item)] = item
+        self._rank_newest(item)
+        self.store.append_add(item)
+        self._index_item(item)
+        self._notify('add', item)
+
+        self._evict()
+
+        # Fold the journal into the snapshot once it grows large
+        if self.store.needs_compaction():
+            self.store.compact_in_background(self.items())
+        return item
+
+    def _collapse(self, item: Dict, similar_ids: List[int]):
+        """Replace near-duplicates of a new item with it"""
+        replaced = []
+        for item_id in similar_ids:
+            old = self.history.pop(item_id)
+            self.store.append_delete(old)
+            self._unindex_item(old)
+            item['use_count'] += old.get('use_count', 1)
+            if old.get('pinned'):
+                set_pinned(item, True)
+            replaced.append(old)
+        NEAR_DUPLICATES.inc(len(replaced))
+        for old in replaced:
+            self._notify('delete', old)
+
+    def touch(self, item: Dict) -> Dict:
+        """Move an existing item to the top with a fresh timestamp"""
+        item['timestamp'] = time.time()
+        item['use_count'] = item.get('use_count', 1) + 1
+        self.history.move_to_end(item_key(item))
+        self._rank_newest(item)
+        self.eviction.touch(item_key(item))
+        self.store.append_touch(item)
+        self._notify('touch', item)
+        return item
+
+    def delete(self, item_id: int) -> Optional[Dict]:
+        """Remove a single item"""
+        with self._writing():
+            item = self.history.pop(item_id, None)
+            if item is not None:
+                self.store.append_delete(item)
+                self._unindex_item(item)
+                self._notify('delete', item)
+        return item
+
+    def clear(self):
+        """Remove every item"""
+        with self._writing():
+            self._stop_loading()
+            self._forget_all()
+            self.store.append_clear()
+        self._notify('clear', None)
+
+    def _forget_all(self):
+        self.history.clear()
+        self.ids_by_digest.clear()
+        self.blob_ids.clear()
+        self.packed_ids.clear()
+        self.eviction.clear()
+        if self.near_duplicates is not None:
+            self.near_duplicates.clear()
+        if self.search_index is not None:
+            self.search_index.clear()
+
+    def pin(self, item_id: int, pinned: bool = True) -> Optional[Dict]:
+        """Keep an item out of eviction, or let it be evicted again"""
+        with self._writing():
+            item = self.history.get(item_id)
+            if item is None or bool(item.get('pinned')) == pinned:
+                return item
+            self._set_pinned(item, pinned)
+            self.store.append_pin(item)
+            self._notify('pin', item)
+            # An unpinned item counts against the limits again
+            self._evict()
+        return item
+
+    def _set_pinned(self, item: Dict, pinned: bool):
+        set_pinned(item, pinned)
+        if pinned:
+            self.eviction.pin(item_key(item))
+        else:
+            self.eviction.rebuild(self.history.values())
+
+    def set_max_history(self, max_history: int):
+        self.retention.max_items = max_history
+        self.enforce_retention()
+
+    def set_retention(self, retention: RetentionPolicy):
+        """Switch to new limits, evicting whatever they no longer allow"""
+        self.retention = retention
+        self.enforce_retention()
+
+    def enforce_retention(self) -> List[Dict]:
+        """Evict the oldest unpinned items until every limit holds; returns them"""
+        with self._writing():
+            return self._evict()
+
+    def trim(self) -> List[Dict]:
+        """Drop the oldest unpinned items beyond max_history and return them"""
+        return self.enforce_retention()
+
+    def _evict(self) -> List[Dict]:
+        now = datetime.now()
+        evicted = []
+        while True:
+            victim = self.eviction.next_victim(len(self.history), self.retention, now)
+            if victim is None:
+                break
+            item, reason = victim
+            del self.history[item_key(item)]
+            EVICTED_BYTES.inc(self._unindex_item(item))
+            EVICTIONS[reason].inc()
+            evicted.append(item)
+        if evicted:
+            # Every limit evicts from the oldest end, so one record that
+            # keeps the newest unpinned items covers the whole batch
+            self.store.append_trim(len(self.eviction))
+        for item in evicted:
+            self._notify('delete', item)
+        return evicted
+
+    def _drop_unpinned(self, keep: int) -> List[Dict]:
+        """Drop the oldest unpinned items until ``keep`` are left"""
+        dropped = []
+        while len(self.eviction) > keep:
+            item = self.eviction.oldest()
+            del self.history[item_key(item)]
+            self._unindex_item(item)
+            dropped.append(item)
+        return dropped
+
+    def _index_item(self, item: Dict, oldest: bool = False):
+        self.ids_by_digest[item_digest(item)] = item_key(item)
+        self.eviction.add(item, oldest)
+        if self.near_duplicates is not None and item.get('simhash') is not None:
+            self.near_duplicates.add(item_key(item), item['simhash'])
+        if item.get('blob'):
+            self.blob_ids.add(item_key(item))
+            if self.search_index is not None:
+                self.search_index.add_unindexed(item_key(item))
+        elif 'packed' in item:
+            # Indexed once it is decompressed
+            self.packed_ids.add(item_key(item))
+        elif self.search_index is not None:
+            self.search_index.add(item_key(item), item['content'])
+
+    def _unindex_item(self, item: Dict) -> int:
+        """Forget an item everywhere but ``history``; returns its size"""
+        self.ids_by_digest.pop(item_digest(item), None)
+        self.blob_ids.discard(item_key(item))
+        self.packed_ids.discard(item_key(item))
+        if self.search_index is not None:
+            self.search_index.remove(item_key(item))
+        if self.near_duplicates is not None:
+            self.near_duplicates.remove(item_key(item))
+        return self.eviction.remove(item_key(item))
+
+    def detect_content_type(self, content: str, digest: Optional[str] = None) -> str:
+        """Detect the type of content"""
+        return self.classifier.classify(content, digest)
+
+    def set_classifier(self, classifier: ContentClassifier) -> List[Dict]:
+        """Switch classifiers and relabel every item; returns the items that changed
+
+        Detector results cached by the old classifier are kept, so only
+        detectors that are new or edited have to read any content. Each
+        relabelled item is announced as a 'type' change.
+        """
+        classifier.cache = self.classifier.cache
+        self.classifier = classifier
+        changed = []
+        for item in self.history.values():
+            content_type = classifier.classify(lambda item=item: self._classify_text(item),
+                                               item_digest(item))
+            if content_type != item['type']:
+                item['type'] = content_type
+                changed.append(item)
+        for item in changed:
+            self._notify('type', item)
+        return changed
+
+    def _classify_text(self, item: Dict) -> str:
+        """Content for classification, leaving packed and blob items as they are"""
+        if 'packed' in item:
+            return item['packed'].unpack()
+        return self.content(item, cache=False)
+
+    # Other processes
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Hold the store's lock and catch up with other processes first"""
+        with self.store.locked():
+            self._catch_up()
+            yield
+
+    def sync(self) -> int:
+        """Apply changes other processes made to the store; returns how many"""
+        with self.store.locked():
+            return self._catch_up()
+
+    def _catch_up(self) -> int:
+        if self.loading:
+            # The load in progress reads them, or they follow it
+            return 0
+        records = self.store.read_changes()
+        if records is None:
+            self.reload()
+            return len(self.history)
+        for record in records:
+            self._apply_record(record)
+        if records:
+            REMOTE_CHANGES.inc(len(records))
+        return len(records)
+
+    def reload(self):
+        """Replace the history with what is stored, e.g. after falling behind"""
+        RELOADS.inc()
+        self._stop_loading()
+        self._forget_all()
+        self._notify('clear', None)
+        self.load()
+
+    def _apply_record(self, record: Dict):
+        """Apply one journal record written by another process"""
+        op = record.get('op')
+        if op == 'add':
+            item = HistoryItem(record['item'])
+            # The same content copied in both processes: the newer copy wins
+            for existing_id in (self.ids_by_digest.get(item_digest(item)), item_key(item)):
+                if existing_id in self.history:
+                    self._remove_remote(existing_id)
+            self.history[item_key(item)] = item
+            self._rank_newest(item)
+            self.next_id = max(self.next_id, item_key(item) + 1)
+            self._index_item(item)
+            self._notify('add', item)
+        elif op == 'touch':
+            item = self.history.get(record['key'])
+            if item is not None:
+                item['timestamp'] = record['timestamp']
+                item['use_count'] = record['use_count']
+                self.history.move_to_end(item_key(item))
+                self._rank_newest(item)
+                self.eviction.touch(item_key(item))
+                self._notify('touch', item)
+        elif op == 'delete':
+            item = self.history.get(record['key'])
+            if item is not None:
+                self._remove_remote(item_key(item))
+        elif op == 'clear':
+            self._forget_all()
+            self._notify('clear', None)
+        elif op == 'pin':
+            item = self.history.get(record['key'])
+            if item is not None and bool(item.get('pinned')) != record['pinned']:
+                self._set_pinned(item, record['pinned'])
+                self._notify('pin', item)
+        elif op == 'trim':
+            for item in self._drop_unpinned(record['size']):
+                self._notify('delete', item)
+
+    def _remove_remote(self, item_id: int):
+        item = self.history.pop(item_id)
+        self._unindex_item(item)
+        self._notify('delete', item)
+
+    def watch_store(self, interval: float = 1.0):
+        """Sync whenever another process changes the store's files"""
+        paths = self.store.watch_paths()
+        if not paths or self.watcher is not None:
+            return
+        from file_watch import create_watcher
+        self.watcher = create_watcher(paths, interval)
+        self.watcher.start(self._store_changed.set)
+
+    # Persistence
+
+    def load(self):
+        """Load the stored history, blocking until every page is merged"""
+        self.start_loading(background=False)
+        self.finish_loading()
+
+    def start_loading(self, page_size: int = 256, background: bool = True):
+        """Start reading the stored history, newest page first"""
+        self.loading = True
+        self.ids_assigned = False
+        # Each load gets its own queue so a cancelled reader can't leak pages
+        self._pages = queue.Queue()
+        self._cancel_load = threading.Event()
+        args = (page_size, self._pages, self._cancel_load)
+        if background:
+            threading.Thread(target=self._read_pages, args=args, daemon=True).start()
+        else:
+            self._read_pages(*args)
+
+    def finish_loading(self):
+        """Block until the stored history has been merged"""
+        while self.loading:
+            self._merge_page(self._pages.get())
+
+    def _read_pages(self, page_size: int, pages: queue.Queue, cancel: threading.Event):
+        """Parse stored pages off the owner thread and queue them"""
+        try:
+            unnumbered: List[Dict] = []
+            next_id = 1
+            for page in self.store.load_pages(page_size):
+                if cancel.is_set():
+                    return
+                page = [HistoryItem(item) for item in page]
+                if self.near_duplicates is not None:
+                    self._fingerprint_page(page)
+                if unnumbered or any(item.get('id') is None for item in page):
+                    # Items from files written before IDs existed are
+                    # numbered once everything has been read
+                    unnumbered.extend(page)
+                    continue
+                next_id = max([next_id] + [item['id'] + 1 for item in page])
+                pages.put(page)
+            if unnumbered:
+                self.ids_assigned = assign_ids(unnumbered, next_id)
+                for start in range(0, len(unnumbered), page_size):
+                    pages.put(unnumbered[start:start + page_size])
+        except Exception as e:
+            print(f"Error loading history: {e}")
+        finally:
+            pages.put(None)
+
+    def _fingerprint_page(self, page: List[Dict]):
+        """Fingerprint loaded items stored before near-duplicate mode was on"""
+        for item in page:
+            if 'simhash' not in item and 'content' in item:
+                fingerprint = self.near_duplicates.fingerprint(item['content'])
+                if fingerprint is not None:
+                    item['simhash'] = fingerprint[0]
+
+    def _merge_page(self, page: Optional[List[Dict]]) -> int:
+        """Add a loaded page below everything already in the history"""
+        if page is None:
+            self.loading = False
+            # Past IDs of items deleted before the snapshot was written
+            self.next_id = max(self.next_id, self.store.next_id)
+            if self.ids_assigned:
+                self.save()
+            return 0
+        merged = []
+        for item in page:
+            # The newer copy of duplicated content has already been merged
+            if item_digest(item) in self.ids_by_digest:
+                continue
+            self.history[item_key(item)] = item
+            self.history.move_to_end(item_key(item), last=False)
+            self._rank_oldest(item)
+            self.next_id = max(self.next_id, item_key(item) + 1)
+            self._index_item(item, oldest=True)
+            merged.append(item)
+        for item in merged:
+            self._notify('load', item)
+        # Keep reading past the limits: older pages may still hold pinned items
+        if self.eviction.next_victim(len(self.history), self.retention) is not None:
+            self.enforce_retention()
+        return len(page)
+
+    def _stop_loading(self):
+        """Drop the rest of a load in progress"""
+        self._cancel_load.set()
+        self.loading = False
+
+    def save(self):
+        """Fold the journal into a full snapshot of the history"""
+        # A snapshot of a partly loaded history would lose the rest
+        self.finish_loading()
+        try:
+            with SAVE_SECONDS.time():
+                self.store.compact(self.items())
+                if self.blobs is not None:
+                    # Blobs other processes added are only known once their
+                    # records are read, and none can be added while we hold
+                    # the lock they write under
+                    with self._writing():
+                        live = {self.history[item_id]['digest'] for item_id in self.blob_ids}
+                        self.blobs.collect(live)
+        except Exception as e:
+            print(f"Error saving history: {e}")
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.save()
+        self.store.close()
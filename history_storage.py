@@ -0,0 +1,1145 @@
+"""
+Storage engines for Clipboard History Manager
+Persists history as a snapshot plus an append-only journal of changes,
+or in an SQLite database with a full-text index
+"""
+
+import contextlib
+import json
+import mmap
+import os
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterator, List, Dict, Optional, Set
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+import snapshot_format
+
+SNAPSHOT_VERSION = 2
+# Records already folded into the snapshot that compaction leaves at the
+# end of the journal, so other processes a little behind can catch up
+JOURNAL_KEEP = 100
+# Compaction rewrites the whole history, so it waits for a journal of at
+# least this fraction of the snapshot: its cost per change stays flat
+JOURNAL_RATIO = 4
+
+
+def content_digest(content: str) -> str:
+    """Return the stable digest used to identify a piece of content"""
+    return hashlib.sha1(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def serialize_item(item: Dict, keep_packed: bool = False) -> Dict:
+    """Return a JSON-safe copy of a history item
+
+    With ``keep_packed`` compressed content loaded from a packed snapshot
+    is left as is for ``snapshot_format.dump`` instead of being expanded.
+    Safe to call off the owner thread: an item unpacked meanwhile gets its
+    'content' before losing 'packed', so reading 'packed' first means one
+    of the two is always seen.
+    """
+    packed = item.get('packed')
+    save_item = item.copy()
+    if packed is not None and 'content' not in save_item:
+        save_item['packed'] = packed
+    if isinstance(save_item.get('timestamp'), datetime):
+        save_item['timestamp'] = save_item['timestamp'].isoformat()
+    if 'packed' in save_item and not keep_packed:
+        save_item['content'] = save_item.pop('packed').unpack()
+    return save_item
+
+
+def item_content(item: Dict) -> str:
+    """Return the inline content of an item, decompressing it if packed"""
+    packed = item.get('packed')
+    return packed.unpack() if packed is not None else item['content']
+
+
+def item_digest(item: Dict) -> str:
+    """Return the content digest of an item, computing it if missing"""
+    digest = item.get('digest')
+    if digest is None:
+        digest = content_digest(item_content(item))
+        item['digest'] = digest
+    return digest
+
+
+def item_key(item: Dict) -> int:
+    """Return the stable ID storage uses to refer to an item"""
+    return item['id']
+
+
+def set_pinned(item: Dict, pinned: bool):
+    """Pinned items carry 'pinned': True; unpinned ones leave the key out"""
+    if pinned:
+        item['pinned'] = True
+    else:
+        item.pop('pinned', None)
+
+
+class JournalReplay:
+    """Journal records applied to a list of items in one pass
+
+    Items sit in an ordered dict, oldest first, looked up by ID, so
+    touches, pins and deletes don't scan the history. Trims evict from the front of a
+    second ordered dict holding only unpinned items; an unpin would have
+    to go back into its middle, so it drops that dict and the next trim
+    rebuilds it, as ``retention.EvictionOrder`` does.
+    """
+
+    def __init__(self, items: List[Dict] = ()):
+        # Keyed by object identity: items from old files may lack an ID
+        self.order = OrderedDict((id(item), item) for item in reversed(items))
+        self.by_id = {item.get('id'): item for item in self.order.values()}
+        self._unpinned: Optional[OrderedDict] = None
+
+    def find(self, key: int) -> Optional[Dict]:
+        """The item a journal key refers to"""
+        return self.by_id.get(key)
+
+    def unpinned(self) -> OrderedDict:
+        """Keys of the unpinned items, oldest first"""
+        if self._unpinned is None:
+            self._unpinned = OrderedDict((key, None) for key, item in self.order.items()
+                                         if not item.get('pinned'))
+        return self._unpinned
+
+    def apply(self, record: Dict) -> bool:
+        """Apply one record; False if it names an item that isn't here"""
+        op = record.get('op')
+        if op == 'add':
+            item = record['item']
+            self.order[id(item)] = item
+            self.by_id[item.get('id')] = item
+            if self._unpinned is not None and not item.get('pinned'):
+                self._unpinned[id(item)] = None
+        elif op in ('touch', 'delete', 'pin'):
+            item = self.find(record['key'])
+            if item is None:
+                return False
+            if op == 'touch':
+                item['timestamp'] = record['timestamp']
+                item['use_count'] = record['use_count']
+                self.order.move_to_end(id(item))
+                if self._unpinned is not None and id(item) in self._unpinned:
+                    self._unpinned.move_to_end(id(item))
+            elif op == 'delete':
+                self._forget(item)
+            else:
+                set_pinned(item, record['pinned'])
+                if not record['pinned']:
+                    self._unpinned = None
+                elif self._unpinned is not None:
+                    self._unpinned.pop(id(item), None)
+        elif op == 'clear':
+            self.order.clear()
+            self.by_id.clear()
+            self._unpinned = None
+        elif op == 'trim':
+            unpinned = self.unpinned()
+            while len(unpinned) > record['size']:
+                key, _ = unpinned.popitem(last=False)
+                self._forget(self.order[key])
+        return True
+
+    def _forget(self, item: Dict):
+        del self.order[id(item)]
+        if self.by_id.get(item.get('id')) is item:
+            del self.by_id[item.get('id')]
+        if self._unpinned is not None:
+            self._unpinned.pop(id(item), None)
+
+    def items(self) -> List[Dict]:
+        """The items, newest first"""
+        return list(reversed(self.order.values()))
+
+
+def assign_ids(items: List[Dict], next_id: int = 1) -> bool:
+    """Give items loaded from older files an ID; returns True if any were missing"""
+    next_id = max(next_id, max((item.get('id') or 0 for item in items), default=0) + 1)
+    missing = False
+    # Oldest first so IDs follow the order items were copied in
+    for item in reversed(items):
+        if item.get('id') is None:
+            item['id'] = next_id
+            next_id += 1
+            missing = True
+    return missing
+
+
+class FileLock:
+    """Advisory lock shared by every process using the same history
+
+    ``flock`` on Unix and ``msvcrt.locking`` on Windows, on a small file
+    next to the history. Re-entrant: nested ``with`` blocks on one thread
+    take the OS lock once, and other threads of the process wait for it
+    like other processes do. While the lock is held the file can also
+    hold a short value (see ``read_value``).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._depth = 0
+        self._owner: Optional[int] = None
+        self._fd: Optional[int] = None
+        # Bumped each time the OS lock is taken, to tell one hold from the next
+        self.acquisitions = 0
+
+    def __enter__(self):
+        if self._owner == threading.get_ident():
+            # Nested: only the owning thread can get here
+            self._depth += 1
+            return self
+        self._thread_lock.acquire()
+        try:
+            self._lock_file()
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self.acquisitions += 1
+        self._owner = threading.get_ident()
+        self._depth = 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth:
+            return
+        self._owner = None
+        try:
+            self._unlock_file()
+        finally:
+            self._thread_lock.release()
+
+    def held(self) -> bool:
+        """Whether the calling thread holds the lock"""
+        return self._owner == threading.get_ident()
+
+    def _lock_file(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            while True:
+                try:
+                    # Locks the first byte; LK_LOCK gives up after 10 seconds
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def read_value(self) -> str:
+        """The value stored in the lock file; call with the lock held"""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        return os.read(self._fd, 256).decode('ascii', 'replace').strip()
+
+    def write_value(self, value: str):
+        """Replace the value stored in the lock file; call with the lock held"""
+        data = value.encode('ascii') + b'\n'
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, data)
+        os.ftruncate(self._fd, len(data))
+
+    def close(self):
+        # Left open if a thread still holds it
+        if self._thread_lock.acquire(blocking=False):
+            try:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+            finally:
+                self._thread_lock.release()
+
+
+class HistoryStore:
+    """Base class for history storage engines
+
+    Stores receive every change as it happens (``append_*``) and may be
+    asked for a full snapshot with ``compact``. Engines that don't need
+    some of the hooks inherit the no-op defaults below.
+    """
+
+    # Whether ``search`` can answer substring queries from an index
+    indexes_content = False
+    # IDs below this have been handed out, by this process or another, even
+    # if their items are gone; known after loading and never reused
+    next_id = 1
+
+    def load(self) -> List[Dict]:
+        """Return all stored items, newest first"""
+        raise NotImplementedError
+
+    def load_pages(self, page_size: int = 256) -> Iterator[List[Dict]]:
+        """Yield stored items newest first, about ``page_size`` at a time
+
+        Engines that can read the newest items without reading everything
+        override this; the default splits up ``load``.
+        """
+        items = self.load()
+        for start in range(0, len(items), page_size):
+            yield items[start:start + page_size]
+
+    def append_add(self, item: Dict):
+        raise NotImplementedError
+
+    def append_touch(self, item: Dict):
+        raise NotImplementedError
+
+    def append_delete(self, item: Dict):
+        raise NotImplementedError
+
+    def append_clear(self):
+        raise NotImplementedError
+
+    def append_pin(self, item: Dict):
+        raise NotImplementedError
+
+    def append_trim(self, size: int):
+        """Keep pinned items and the newest ``size`` unpinned ones"""
+        raise NotImplementedError
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def compact_in_background(self, items: List[Dict]):
+        pass
+
+    def compact(self, items: List[Dict]):
+        pass
+
+    def search(self, term: str) -> Optional[List[int]]:
+        """Return IDs of items containing ``term``, newest first
+
+        ``None`` means the store has no index that can answer the query
+        and the caller should scan the history itself.
+        """
+        return None
+
+    def locked(self):
+        """Context manager that keeps other processes from writing"""
+        return contextlib.nullcontext()
+
+    def read_changes(self) -> Optional[List[Dict]]:
+        """Records other processes wrote since the last call, oldest first
+
+        ``None`` means they can't be applied one by one and the history
+        has to be loaded again.
+        """
+        return []
+
+    def watch_paths(self) -> List[str]:
+        """Files that change when another process writes to the store"""
+        return []
+
+    def close(self):
+        pass
+
+
+# Windows can't replace a file another process has open, which compacting
+# the shared journal does, so there it is only open while appending
+KEEP_JOURNAL_OPEN = os.name != 'nt'
+
+
+class JournalStore(HistoryStore):
+    """Snapshot + append-only journal storage
+
+    Every change is appended to the journal as a single JSON line, so a
+    new clipboard item costs one small write instead of rewriting the
+    whole history. Once the journal grows past ``compact_threshold``
+    records, and past a ``JOURNAL_RATIO`` share of the snapshot, it is
+    folded into the snapshot on a background thread.
+
+    Each record carries a sequence number and the snapshot remembers the
+    last sequence number it contains, so a crash between writing the
+    snapshot and trimming the journal never applies a change twice.
+
+    With ``compression`` set to 'zlib' or 'lzma' snapshots are written in
+    the packed format from ``snapshot_format``: loading only parses item
+    metadata and each item's content stays compressed (under 'packed')
+    until it is needed. For zlib a preset dictionary trained on the
+    history is stored in the snapshot and reused by later compactions.
+    Packed snapshots go to ``<name>.chmz`` so ``path`` always holds JSON;
+    either format is read, and a compaction removes the other one, so
+    turning compression on or off migrates the history.
+
+    Several processes can share the files. Reads and writes take a
+    ``FileLock`` on ``<name>.lock``, and sequence numbers are global:
+    before appending, a process reads what others appended after its
+    last read, and ``read_changes`` hands those records to the owner so
+    it can apply them instead of reloading. A snapshot only replaces one
+    with a lower sequence number, which the lock file records.
+    """
+
+    def __init__(self, path: str = 'clipboard_history.json', compact_threshold: int = 500,
+                 compression: Optional[str] = None, train_dictionary: bool = True):
+        base = os.path.splitext(path)[0]
+        if compression not in snapshot_format.CODECS:
+            compression = None
+        self.compression = compression
+        # Where snapshots are written, and where one in the other format may be
+        packed_path = base + '.chmz'
+        self.path, self.other_path = (packed_path, path) if compression else (path, packed_path)
+        self.journal_path = base + '.journal'
+        self.compact_threshold = compact_threshold
+        self.train_dictionary = train_dictionary and compression == 'zlib'
+        self.zdict = b''
+        self.seq = 0
+        self.journal_records = 0
+        self.snapshot_items = 0
+        self.next_id = 1
+        self._lock = FileLock(base + '.lock')
+        # Kept open for appending while the journal file stays the same
+        self._journal_file = None
+        self._journal_file_id = None
+        self._compact_thread: Optional[threading.Thread] = None
+        # How far the journal has been read: its (device, inode) and byte offset
+        self._journal_id = None
+        self._journal_offset = 0
+        # Records found by an append before the owner asked for them
+        self._pending: List[Dict] = []
+        # The lock hold during which the journal was last read to its end
+        self._read_during = -1
+        self._reload_needed = False
+
+    # Loading
+
+    def load(self) -> List[Dict]:
+        """Load the snapshot and replay the journal tail on top of it"""
+        with self._lock:
+            items, snapshot_seq = self._read_snapshot()
+            records = self._read_journal()
+        self.seq = snapshot_seq
+        self.snapshot_items = len(items)
+        self.journal_records = 0
+        self._pending, self._reload_needed = [], False
+        replay = JournalReplay(items)
+        for record in records:
+            if record.get('seq', 0) <= snapshot_seq:
+                continue
+            replay.apply(record)
+            self.seq = max(self.seq, record['seq'])
+            self.journal_records += 1
+        return replay.items()
+
+    def load_pages(self, page_size: int = 256) -> Iterator[List[Dict]]:
+        """Yield items newest first, reading packed snapshots page by page
+
+        Journal records newer than a packed snapshot are replayed on the
+        way: items they added come first, then the snapshot's pages with
+        deleted and trimmed-away items left out, so a reader that stops
+        early never decodes the rest of the snapshot. A journal that moves
+        a snapshot item back to the top (a touch) can't be streamed, and
+        neither can a plain JSON snapshot; those are loaded whole and then
+        split up.
+        """
+        with self._lock:
+            try:
+                f = open(self.snapshot_file() or self.path, 'rb')
+            except FileNotFoundError:
+                f = None
+            # Read with the snapshot still open, so both are from one moment
+            records = self._read_journal()
+        if f is not None:
+            with f:
+                if snapshot_format.is_packed_snapshot(f.read(len(snapshot_format.MAGIC))):
+                    f.seek(0)
+                    reader = self._open_reader(f)
+                    self.next_id = max(self.next_id, reader.info.get('next_id', 1))
+                    records = [record for record in records
+                               if record.get('seq', 0) > reader.seq]
+                    replay = self._replay_over_snapshot(records)
+                    if replay is not None:
+                        self.seq = max([reader.seq] + [record['seq'] for record in records])
+                        self.snapshot_items = reader.info.get('count', 0)
+                        self.journal_records = len(records)
+                        self._pending, self._reload_needed = [], False
+                        yield from self._stream_replay(reader, replay, page_size)
+                        return
+        yield from super().load_pages(page_size)
+
+    @staticmethod
+    def _replay_over_snapshot(records: List[Dict]) -> Optional[Dict]:
+        """Apply journal records without the snapshot's items at hand
+
+        Returns the items the journal added (newest first), when each
+        snapshot item was deleted, and the trims that cut the snapshot's
+        part short, or None if a record needs the snapshot's items.
+        Trims only count unpinned items, so each one is stored as how many
+        unpinned snapshot items it keeps.
+        """
+        head = JournalReplay()
+        removed: Dict = {}
+        trims: List[tuple] = []
+        snapshot_dropped = False
+        for time, record in enumerate(records):
+            op = record.get('op')
+            if head.apply(record):
+                if op == 'clear':
+                    snapshot_dropped = True
+                elif op == 'trim':
+                    trims.append((time, record['size'] - len(head.unpinned())))
+                continue
+            # Names a snapshot item
+            if op != 'delete':
+                return None
+            removed.setdefault(record['key'], time)
+        return {'head': head.items(), 'removed': removed, 'trims': trims,
+                'snapshot_dropped': snapshot_dropped}
+
+    @staticmethod
+    def _stream_replay(reader: 'snapshot_format.SnapshotReader', replay: Dict,
+                       page_size: int) -> Iterator[List[Dict]]:
+        head = replay['head']
+        for start in range(0, len(head), page_size):
+            yield head[start:start + page_size]
+        if replay['snapshot_dropped']:
+            return
+        removed, trims = replay['removed'], replay['trims']
+        # A trim keeps the first ``limit`` unpinned snapshot items still
+        # present when it happened: those streamed so far minus the ones
+        # removed before it. Pinned items further down survive every trim.
+        removed_before = [0] * len(trims)
+        streamed = 0
+        cutoff = min((limit for _, limit in trims), default=None)
+        for page in reader.pages():
+            kept = []
+            for item in page:
+                pinned = item.get('pinned')
+                if not pinned:
+                    if cutoff is not None and streamed >= cutoff:
+                        continue
+                    streamed += 1
+                removed_at = removed.get(item.get('id'))
+                if removed_at is None:
+                    kept.append(item)
+                    continue
+                if pinned:
+                    continue
+                for index, (time, _) in enumerate(trims):
+                    if removed_at < time:
+                        removed_before[index] += 1
+                cutoff = min((limit + count for (_, limit), count
+                              in zip(trims, removed_before)), default=None)
+            if kept:
+                yield kept
+
+    def _open_reader(self, f) -> snapshot_format.SnapshotReader:
+        reader = snapshot_format.SnapshotReader(f)
+        if self.compression == 'zlib':
+            self.zdict = reader.zdict
+        return reader
+
+    def snapshot_file(self) -> Optional[str]:
+        """The snapshot to load, or None if there is none yet
+
+        One in the other format is left by a different compression setting
+        (or a crash before the compaction after it removed it); the one
+        written last is current.
+        """
+        paths = [path for path in (self.path, self.other_path) if os.path.exists(path)]
+        return max(paths, key=os.path.getmtime) if paths else None
+
+    def _read_snapshot(self):
+        path = self.snapshot_file()
+        if path is None:
+            return [], 0
+        with open(path, 'rb') as f:
+            if snapshot_format.is_packed_snapshot(f.read(len(snapshot_format.MAGIC))):
+                f.seek(0)
+                reader = self._open_reader(f)
+                self.next_id = max(self.next_id, reader.info.get('next_id', 1))
+                return [item for page in reader.pages() for item in page], reader.seq
+            f.seek(0)
+            data = json.loads(f.read().decode('utf-8'))
+        # Plain lists are snapshots written before the journal existed
+        if isinstance(data, list):
+            return data, 0
+        self.next_id = max(self.next_id, data.get('next_id', 1))
+        return data.get('items', []), data.get('seq', 0)
+
+    def _read_journal(self, offset: int = 0) -> List[Dict]:
+        """Parse journal records from ``offset`` on and remember where reading stopped"""
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            self._journal_id, self._journal_offset = None, 0
+            return []
+        with f:
+            st = os.fstat(f.fileno())
+            f.seek(offset)
+            data = f.read()
+        self._journal_id = (st.st_dev, st.st_ino)
+        self._journal_offset = offset + len(data)
+        records = []
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final line left by a crash mid-append
+                continue
+            if record.get('op') == 'add':
+                self.next_id = max(self.next_id, (record['item'].get('id') or 0) + 1)
+            records.append(record)
+        return records
+
+    # Changes from other processes
+
+    def locked(self) -> FileLock:
+        return self._lock
+
+    def watch_paths(self) -> List[str]:
+        return [self.path, self.other_path, self.journal_path]
+
+    def read_changes(self) -> Optional[List[Dict]]:
+        with self._lock:
+            records = self._pending + self._read_new_records()
+            self._pending = []
+            if self._reload_needed:
+                self._reload_needed = False
+                return None
+            return records
+
+    def _read_new_records(self) -> List[Dict]:
+        """Journal records past ``seq``; call with the lock held"""
+        if self._read_during == self._lock.acquisitions:
+            # Nobody else can have written since, within one hold of the lock
+            return []
+        self._read_during = self._lock.acquisitions
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            st = None
+        journal_id = (st.st_dev, st.st_ino) if st is not None else None
+        replaced = journal_id != self._journal_id or \
+            (st is not None and st.st_size < self._journal_offset)
+        if not replaced and (st is None or st.st_size == self._journal_offset):
+            # Nothing appended since the last read: the common case
+            return []
+        # A compaction elsewhere rewrites the journal; read it again by seq
+        offset = 0 if replaced else self._journal_offset
+        records = [record for record in self._read_journal(offset)
+                   if record.get('seq', 0) > self.seq]
+        if records and records[0]['seq'] != self.seq + 1:
+            self._reload_needed = True
+        elif not records and replaced and self._snapshot_seq() > self.seq:
+            self._reload_needed = True
+        if self._reload_needed:
+            self.seq = max([self.seq, self._snapshot_seq()] +
+                           [record['seq'] for record in records])
+            return []
+        self.seq = records[-1]['seq'] if records else self.seq
+        self.journal_records += len(records)
+        return records
+
+    def _snapshot_seq(self) -> int:
+        """Sequence number of the snapshot on disk, as recorded in the lock file"""
+        try:
+            return int(self._lock.read_value() or 0)
+        except ValueError:
+            return 0
+
+    # Journal writes
+
+    def _append(self, record: Dict):
+        with self._lock:
+            # Number after whatever other processes appended meanwhile
+            self._pending.extend(self._read_new_records())
+            self.seq += 1
+            record['seq'] = self.seq
+            line = json.dumps(record, ensure_ascii=False) + '\n'
+            f = self._journal_handle()
+            f.write(line.encode('utf-8', 'surrogatepass'))
+            f.flush()
+            self._journal_id, self._journal_offset = self._journal_file_id, f.tell()
+            self.journal_records += 1
+            if not KEEP_JOURNAL_OPEN:
+                self._close_journal()
+
+    def _journal_handle(self):
+        """The journal opened for appending, reopened if it was replaced"""
+        # After _read_new_records, _journal_id is the file now at journal_path
+        if self._journal_file is not None and self._journal_file_id == self._journal_id:
+            return self._journal_file
+        self._close_journal()
+        self._journal_file = open(self.journal_path, 'ab')
+        st = os.fstat(self._journal_file.fileno())
+        self._journal_file_id = (st.st_dev, st.st_ino)
+        return self._journal_file
+
+    def _close_journal(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def append_add(self, item: Dict):
+        """Record a new item at the top of the history"""
+        self.next_id = max(self.next_id, (item.get('id') or 0) + 1)
+        self._append({'op': 'add', 'item': serialize_item(item)})
+
+    def append_touch(self, item: Dict):
+        """Record that an existing item was copied again and moved to the top"""
+        save_item = serialize_item(item)
+        self._append({'op': 'touch', 'key': item_key(item),
+                      'timestamp': save_item['timestamp'],
+                      'use_count': save_item.get('use_count', 1)})
+
+    def append_delete(self, item: Dict):
+        """Record the removal of a single item"""
+        self._append({'op': 'delete', 'key': item_key(item)})
+
+    def append_clear(self):
+        """Record that the whole history was cleared"""
+        self._append({'op': 'clear'})
+
+    def append_pin(self, item: Dict):
+        """Record that an item was pinned or unpinned"""
+        self._append({'op': 'pin', 'key': item_key(item), 'pinned': bool(item.get('pinned'))})
+
+    def append_trim(self, size: int):
+        """Record that all but the newest ``size`` unpinned items were evicted"""
+        self._append({'op': 'trim', 'size': size})
+
+    # Compaction
+
+    def needs_compaction(self) -> bool:
+        """Whether the journal has grown enough to be folded into the snapshot"""
+        if self._compact_thread and self._compact_thread.is_alive():
+            return False
+        return self.journal_records >= max(self.compact_threshold,
+                                           self.snapshot_items // JOURNAL_RATIO)
+
+    def compact_in_background(self, items: List[Dict]):
+        """Fold the journal into a new snapshot without blocking the caller
+
+        Only references are taken here and items are serialized on the
+        compaction thread. Touches and unpacking the owner does meanwhile
+        may reach the snapshot early, which replaying the journal after
+        ``seq`` undoes or repeats harmlessly. Pins are the exception, as
+        replayed trims count unpinned items, so they are noted now.
+        """
+        if self._compact_thread and self._compact_thread.is_alive():
+            return
+        items = list(items)
+        pinned = [item.get('pinned', False) for item in items]
+        self._compact_thread = threading.Thread(
+            target=self._compact, args=(items, self.seq, pinned), daemon=True)
+        self._compact_thread.start()
+
+    def compact(self, items: List[Dict]):
+        """Write a full snapshot of ``items`` and drop the journal"""
+        # The background compaction needs the lock to finish; if this thread
+        # holds it the two just race, and the snapshot with the higher seq wins
+        if self._compact_thread and self._compact_thread.is_alive() and not self._lock.held():
+            self._compact_thread.join()
+        self._compact(items, self.seq)
+
+    def _compact(self, items: List[Dict], seq: int, pinned: Optional[List[bool]] = None):
+        try:
+            save_data = [serialize_item(item, self.compression is not None) for item in items]
+            if pinned is not None:
+                # As they were when ``seq`` was current
+                for save_item, was_pinned in zip(save_data, pinned):
+                    set_pinned(save_item, was_pinned)
+            self.snapshot_items = len(save_data)
+            # Deleted items may have held the highest IDs, so the mark is kept
+            next_id = max([self.next_id] + [(item.get('id') or 0) + 1 for item in save_data])
+            # Per process and thread, as another compaction may be running
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if self.compression is not None:
+                if self.train_dictionary and not self.zdict:
+                    self.zdict = snapshot_format.train_zdict(
+                        [item['content'] for item in save_data[:1000]
+                         if 'content' in item and len(item['content']) <= 4096])
+                data = snapshot_format.dump(save_data, seq, SNAPSHOT_VERSION,
+                                            self.compression, self.zdict, next_id=next_id)
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    # json.dumps uses the C encoder; json.dump streams through
+                    # the pure Python one
+                    f.write(json.dumps({'version': SNAPSHOT_VERSION, 'seq': seq,
+                                        'next_id': next_id, 'items': save_data},
+                                       ensure_ascii=False))
+                    f.flush()
+                    os.fsync(f.fileno())
+            with self._lock:
+                if seq < self._snapshot_seq():
+                    # Another process already wrote a newer snapshot
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.path)
+                if os.path.exists(self.other_path):
+                    os.remove(self.other_path)
+                self._lock.write_value(str(seq))
+                self._trim_journal(seq)
+        except Exception as e:
+            print(f"Error compacting history: {e}")
+
+    def _trim_journal(self, seq: int):
+        """Drop journal records already contained in the snapshot"""
+        with self._lock:
+            records = self._read_journal()
+            kept = [record for record in records if record.get('seq', 0) > seq - JOURNAL_KEEP]
+            tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+            self._close_journal()
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in kept:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.journal_path)
+            self.journal_records = sum(1 for record in kept if record.get('seq', 0) > seq)
+            # Records other processes added and nobody here has read yet are
+            # still in the new journal; the next read goes through it by seq
+            self._journal_id = None
+            self._read_during = -1
+
+    def close(self):
+        with self._lock:
+            self._close_journal()
+        self._lock.close()
+
+
+class SqliteStore(HistoryStore):
+    """SQLite storage with an FTS5 trigram index over item content
+
+    Items live in a single table ordered by an autoincrement position, so
+    adds, deletes and trims are single indexed statements. The trigram
+    tokenizer lets FTS5 answer case-insensitive substring queries of
+    three or more characters; shorter terms fall back to a scan.
+
+    On first open an existing JSON history (snapshot and journal) is
+    imported once and the import is recorded in the ``meta`` table.
+    With ``read_only`` an existing database is opened without writing to it.
+    """
+
+    def __init__(self, path: str = 'clipboard_history.db',
+                 import_path: Optional[str] = 'clipboard_history.json',
+                 read_only: bool = False):
+        # Only this engine needs sqlite3, so it isn't imported at startup
+        import sqlite3
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only and os.path.exists(path):
+            from urllib.request import pathname2url
+            self.conn = sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro',
+                                        uri=True, check_same_thread=False)
+            self.fts = self.indexes_content = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone() is not None
+            return
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+        if import_path:
+            self._migrate_json(import_path)
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    pos INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id INTEGER,
+                    digest TEXT NOT NULL UNIQUE,
+                    content TEXT NOT NULL,
+                    type TEXT,
+                    timestamp TEXT,
+                    use_count INTEGER NOT NULL DEFAULT 1,
+                    -- Set when the body lives in the blob store and content is a preview
+                    blob_size INTEGER,
+                    pinned INTEGER NOT NULL DEFAULT 0
+                )""")
+            self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS items_id ON items (id)')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            try:
+                self.conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                        content, content='items', content_rowid='pos',
+                        tokenize='trigram')""")
+            except self.conn.OperationalError as e:
+                # SQLite built without FTS5 or older than 3.34
+                print(f"Full-text index unavailable: {e}")
+                self.fts = False
+                return
+            self.fts = True
+            self.indexes_content = True
+            self.conn.executescript("""
+                CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+                    INSERT INTO items_fts(rowid, content) VALUES (new.pos, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+                    INSERT INTO items_fts(items_fts, rowid, content)
+                        VALUES ('delete', old.pos, old.content);
+                END;
+            """)
+
+    def _migrate_json(self, import_path: str):
+        """Import a JSON history the first time the database is opened"""
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        source = JournalStore(import_path)
+        if row or not (source.snapshot_file() or os.path.exists(source.journal_path)):
+            return
+        try:
+            items = source.load()
+        except Exception as e:
+            print(f"Error importing {import_path}: {e}")
+            return
+        assign_ids(items)
+        with self._lock, self.conn:
+            # Oldest first so positions keep the original order
+            for item in reversed(items):
+                self._insert(serialize_item(item))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('migrated_from', ?)",
+                              (import_path,))
+
+    def _insert(self, item: Dict):
+        self.conn.execute('DELETE FROM items WHERE digest = ? OR id = ?',
+                          (item_digest(item), item_key(item)))
+        if item.get('blob'):
+            content, blob_size = item['preview'], item['size']
+        else:
+            content, blob_size = item['content'], None
+        self.conn.execute(
+            'INSERT INTO items (id, digest, content, type, timestamp, use_count, blob_size, '
+            'pinned) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (item_key(item), item_digest(item), content, item.get('type'),
+             item.get('timestamp'), item.get('use_count', 1), blob_size,
+             int(bool(item.get('pinned')))))
+
+    @staticmethod
+    def _row_item(row) -> Dict:
+        _, item_id, digest, content, content_type, timestamp, use_count, blob_size, pinned = row
+        item = {'id': item_id, 'digest': digest, 'type': content_type,
+                'timestamp': timestamp, 'use_count': use_count}
+        set_pinned(item, bool(pinned))
+        if blob_size is None:
+            item['content'] = content
+        else:
+            item.update(blob=True, size=blob_size, preview=content)
+        return item
+
+    def _read_next_id(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        self.next_id = max(self.next_id, int(row[0]) if row else 1)
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            self._read_next_id()
+            rows = self.conn.execute(
+                'SELECT pos, id, digest, content, type, timestamp, use_count, blob_size, pinned '
+                'FROM items ORDER BY pos DESC').fetchall()
+        return [self._row_item(row) for row in rows]
+
+    def load_pages(self, page_size: int = 256) -> Iterator[List[Dict]]:
+        # Keyset pagination: each page starts below the last position seen
+        last_pos = 2 ** 63 - 1
+        with self._lock:
+            self._read_next_id()
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    'SELECT pos, id, digest, content, type, timestamp, use_count, blob_size, pinned '
+                    'FROM items WHERE pos < ? ORDER BY pos DESC LIMIT ?',
+                    (last_pos, page_size)).fetchall()
+            if not rows:
+                return
+            last_pos = rows[-1][0]
+            yield [self._row_item(row) for row in rows]
+
+    def append_add(self, item: Dict):
+        with self._lock, self.conn:
+            self._insert(serialize_item(item))
+            if (item.get('id') or 0) >= self.next_id:
+                self.next_id = item['id'] + 1
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('next_id', ?)",
+                                  (str(self.next_id),))
+
+    def append_touch(self, item: Dict):
+        # Re-inserting gives the row a new top position
+        self.append_add(item)
+
+    def append_delete(self, item: Dict):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM items WHERE id = ?', (item_key(item),))
+
+    def append_clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM items')
+
+    def append_pin(self, item: Dict):
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE items SET pinned = ? WHERE id = ?',
+                              (int(bool(item.get('pinned'))), item_key(item)))
+
+    def append_trim(self, size: int):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'DELETE FROM items WHERE pinned = 0 AND pos NOT IN '
+                '(SELECT pos FROM items WHERE pinned = 0 ORDER BY pos DESC LIMIT ?)', (size,))
+
+    def search(self, term: str) -> Optional[List[int]]:
+        if not self.fts or len(term) < 3:
+            return None
+        query = '"' + term.replace('"', '""') + '"'
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT items.id FROM items_fts JOIN items ON items.pos = items_fts.rowid '
+                'WHERE items_fts MATCH ? ORDER BY items.pos DESC', (query,)).fetchall()
+        return [item_id for (item_id,) in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class BlobStore:
+    """Content-addressed on-disk storage for large clipboard payloads
+
+    Each payload is written once to ``<directory>/<digest[:2]>/<digest>``,
+    so repeated large pastes share one file. Bodies are read back through
+    ``mmap`` and kept in an LRU cache bounded by ``memory_budget`` bytes;
+    the least recently used bodies are evicted once the budget is
+    exceeded. Files no longer referenced by any item are removed by
+    ``collect`` once they have been left alone for ``grace_period``
+    seconds, so a blob another process just wrote (and this one has not
+    heard of yet) is never taken for garbage.
+    """
+
+    def __init__(self, directory: str = 'clipboard_blobs', threshold: int = 65536,
+                 memory_budget: int = 32 * 1024 * 1024, grace_period: float = 3600):
+        self.directory = directory
+        self.threshold = threshold
+        self.memory_budget = memory_budget
+        self.grace_period = grace_period
+        self.cached_bytes = 0
+        self.evictions = 0
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def should_store(self, content: str) -> bool:
+        """Whether content is big enough to live in the blob store"""
+        # Cheap pre-check before encoding: a str never encodes to fewer bytes
+        return len(content) > self.threshold or \
+            len(content.encode('utf-8', 'surrogatepass')) > self.threshold
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, digest: str, content: str) -> int:
+        """Store content under its digest and return its size in bytes"""
+        data = content.encode('utf-8', 'surrogatepass')
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        else:
+            # Reused: restart its grace period
+            os.utime(path)
+        self._remember(digest, content)
+        return len(data)
+
+    def get(self, digest: str, cache: bool = True) -> str:
+        """Return the body stored under digest"""
+        with self._lock:
+            content = self._cache.get(digest)
+            if content is not None:
+                self._cache.move_to_end(digest)
+                return content
+        content = b''.join(self.iter_chunks(digest)).decode('utf-8', 'surrogatepass')
+        if cache:
+            self._remember(digest, content)
+        return content
+
+    def iter_chunks(self, digest: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream the raw bytes of a blob without loading it all at once"""
+        with open(self.path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, len(mapped), chunk_size):
+                    yield mapped[start:start + chunk_size]
+
+    def _remember(self, digest: str, content: str):
+        size = len(content)
+        if size > self.memory_budget:
+            return
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return
+            self._cache[digest] = content
+            self.cached_bytes += size
+            while self.cached_bytes > self.memory_budget:
+                _, evicted = self._cache.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+                self.evictions += 1
+
+    def collect(self, live: Set[str]):
+        """Delete blob files past the grace period whose digest is not in ``live``"""
+        if not os.path.isdir(self.directory):
+            return
+        cutoff = time.time() - self.grace_period
+        for prefix in os.listdir(self.directory):
+            prefix_dir = os.path.join(self.directory, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name not in live:
+                    path = os.path.join(prefix_dir, name)
+                    try:
+                        if os.path.getmtime(path) <= cutoff:
+                            os.remove(path)
+                    except OSError:
+                        pass
+        with self._lock:
+            for digest in [digest for digest in self._cache if digest not in live]:
+                self.cached_bytes -= len(self._cache.pop(digest))
+
+
+def open_store(config: Dict, read_only: bool = False) -> HistoryStore:
+    """Create the storage engine selected by the ``storage`` config section"""
+    history_file = config.get('history_file', 'clipboard_history.json')
+    if config.get('backend', 'journal') == 'sqlite':
+        return SqliteStore(config.get('database_file', 'clipboard_history.db'),
+                           import_path=history_file, read_only=read_only)
+    return JournalStore(history_file, compression=config.get('compression'),
+                        train_dictionary=config.get('compression_dictionary', True))
+
+
+def open_blob_store(config: Dict) -> Optional[BlobStore]:
+    """Create the blob store described by the ``storage`` config section"""
+    threshold = config.get('blob_threshold', 65536)
+    if not threshold:
+        return None
+    return BlobStore(config.get('blob_dir', 'clipboard_blobs'), threshold,
+                     config.get('blob_cache_bytes', 32 * 1024 * 1024),
+                     config.get('blob_grace_seconds', 3600))
@@ -0,0 +1,264 @@
+"""
+Virtualized history list for Clipboard History Manager
+Only the rows inside the viewport are materialized in the Treeview
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class VirtualHistoryList:
+    """Treeview that renders a window of a much larger list of keys
+
+    The model is just an ordered list of keys plus a ``row_values``
+    callback that turns a key into the column values. The Treeview only
+    ever holds the rows that fit in the viewport plus ``overscan`` extra
+    rows, and a separate scrollbar maps onto the full list, so scrolling
+    and inserting new items cost the same at 50 or 100,000 items.
+
+    Keys are stored oldest first so a new item is an O(1) append; row 0
+    on screen is the last key. Where a key sits is looked up in a map
+    holding each key's index plus ``_base``: dropping the oldest key or
+    adding older ones only moves ``_base``, and any other removal
+    renumbers the keys on its shorter side.
+    """
+
+    def __init__(self, parent, columns: Sequence[Tuple[str, int, int]],
+                 row_values: Callable[[Hashable], Tuple], overscan: int = 2):
+        self.row_values = row_values
+        self.overscan = overscan
+        self._keys: List[Hashable] = []
+        # Built on the first lookup after set_keys
+        self._rows: Optional[Dict[Hashable, int]] = None
+        self._base = 0
+        self._rendered: Dict[str, Hashable] = {}
+        self.offset = 0
+        self.visible_rows = 15
+        self.selected_key: Optional[Hashable] = None
+
+        self.tree = ttk.Treeview(parent, columns=[name for name, _, _ in columns],
+                                 show='headings', height=self.visible_rows,
+                                 selectmode='browse')
+        for name, width, min_width in columns:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=width, minwidth=min_width)
+
+        self.v_scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.h_scrollbar = ttk.Scrollbar(parent, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.h_scrollbar.set)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_by(3))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self._move_selection(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self._move_selection(self.visible_rows))
+
+    def grid(self, row: int = 0, column: int = 0):
+        """Place the list and its scrollbars in the parent grid"""
+        self.tree.grid(row=row, column=column, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.v_scrollbar.grid(row=row, column=column + 1, sticky=(tk.N, tk.S))
+        self.h_scrollbar.grid(row=row + 1, column=column, sticky=(tk.W, tk.E))
+
+    # Model updates
+
+    def __len__(self):
+        return len(self._keys)
+
+    def key_at(self, index: int) -> Hashable:
+        """Return the key shown at list position ``index`` (0 = top)"""
+        return self._keys[-1 - index]
+
+    def set_keys(self, keys: Sequence[Hashable], offset: int = 0):
+        """Replace the whole model, ``keys`` given newest first"""
+        self._keys = list(reversed(keys))
+        self._rows = None
+        self.offset = offset
+        self._render()
+
+    def insert_top(self, key: Hashable):
+        """Add a new key above all others"""
+        self._keys.append(key)
+        if self._rows is not None:
+            self._rows[key] = len(self._keys) - 1 + self._base
+        if self.offset > 0:
+            # Keep the rows the user is looking at in place
+            self.offset += 1
+            self._update_scrollbar()
+            return
+        self.tree.insert('', 0, iid=str(key), values=self.row_values(key))
+        self._rendered[str(key)] = key
+        window = self.visible_rows + self.overscan
+        children = self.tree.get_children()
+        if len(children) > window:
+            for iid in children[window:]:
+                self._rendered.pop(iid, None)
+            self.tree.delete(*children[window:])
+        self._update_scrollbar()
+
+    def extend_bottom(self, keys: Sequence[Hashable]):
+        """Add keys below all others, ``keys`` given newest first"""
+        if not keys:
+            return
+        self._keys[0:0] = reversed(keys)
+        if self._rows is not None:
+            self._base -= len(keys)
+            for index, key in enumerate(reversed(keys)):
+                self._rows[key] = index + self._base
+        # Only a window that isn't full yet gains visible rows
+        if len(self._rendered) < self.visible_rows + self.overscan:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def remove(self, key: Hashable):
+        """Remove a single key from the model"""
+        stored_index = self._stored_index(key)
+        if stored_index is None:
+            return
+        del self._keys[stored_index]
+        rows = self._rows
+        del rows[key]
+        if stored_index < len(self._keys) - stored_index:
+            # Fewer older keys: shift everything down, then put those back
+            self._base += 1
+            for older in self._keys[:stored_index]:
+                rows[older] += 1
+        else:
+            for newer in self._keys[stored_index:]:
+                rows[newer] -= 1
+        position = len(self._keys) - stored_index
+        if self.selected_key == key:
+            self.selected_key = None
+        if position < self.offset:
+            self.offset -= 1
+            self._update_scrollbar()
+            return
+        iid = str(key)
+        if iid in self._rendered:
+            del self._rendered[iid]
+            self.tree.delete(iid)
+            # Pull up the next row to refill the window
+            next_index = self.offset + len(self._rendered)
+            if next_index < len(self._keys):
+                next_key = self.key_at(next_index)
+                if str(next_key) not in self._rendered:
+                    self.tree.insert('', 'end', iid=str(next_key),
+                                     values=self.row_values(next_key))
+                    self._rendered[str(next_key)] = next_key
+        offset = self.offset
+        self._clamp_offset()
+        if self.offset != offset:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def _stored_index(self, key: Hashable) -> Optional[int]:
+        """Index of ``key`` in ``_keys``, or None if it isn't listed"""
+        if self._rows is None:
+            self._rows = dict(zip(self._keys, range(len(self._keys))))
+            self._base = 0
+        row = self._rows.get(key)
+        return None if row is None else row - self._base
+
+    def refresh_row(self, key: Hashable):
+        """Redraw a single row if it is currently materialized"""
+        if str(key) in self._rendered:
+            self.tree.item(str(key), values=self.row_values(key))
+
+    def selection(self) -> List[Hashable]:
+        """Return the keys of the selected rows"""
+        return [self._rendered[iid] for iid in self.tree.selection() if iid in self._rendered]
+
+    # Rendering
+
+    def _render(self):
+        """Rebuild the materialized window from the current offset"""
+        self._clamp_offset()
+        end = min(len(self._keys), self.offset + self.visible_rows + self.overscan)
+        wanted = [self.key_at(i) for i in range(self.offset, end)]
+        wanted_iids = [str(key) for key in wanted]
+        if list(self.tree.get_children()) != wanted_iids:
+            self.tree.delete(*self.tree.get_children())
+            self._rendered = {}
+            for key, iid in zip(wanted, wanted_iids):
+                self.tree.insert('', 'end', iid=iid, values=self.row_values(key))
+                self._rendered[iid] = key
+            if self.selected_key is not None and str(self.selected_key) in self._rendered:
+                self.tree.selection_set(str(self.selected_key))
+                self.tree.focus(str(self.selected_key))
+        self._update_scrollbar()
+
+    def _clamp_offset(self):
+        max_offset = max(0, len(self._keys) - self.visible_rows)
+        self.offset = max(0, min(self.offset, max_offset))
+
+    def _update_scrollbar(self):
+        total = len(self._keys)
+        if total <= self.visible_rows:
+            self.v_scrollbar.set(0.0, 1.0)
+        else:
+            self.v_scrollbar.set(self.offset / total,
+                                 (self.offset + self.visible_rows) / total)
+
+    def _scroll_to(self, offset: int):
+        self.offset = offset
+        self._render()
+
+    def _scroll_by(self, rows: int):
+        self._scroll_to(self.offset + rows)
+        return 'break'
+
+    # Event handlers
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self._scroll_to(int(float(amount) * len(self._keys)))
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self._scroll_by(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll_by(-3 * delta)
+
+    def _on_configure(self, event=None):
+        children = self.tree.get_children()
+        bbox = self.tree.bbox(children[0]) if children else None
+        if bbox:
+            top, row_height = bbox[1], bbox[3]
+            rows = max(1, (self.tree.winfo_height() - top) // max(1, row_height))
+            if rows != self.visible_rows:
+                self.visible_rows = rows
+                self._render()
+
+    def _on_select(self, event=None):
+        keys = self.selection()
+        if keys:
+            self.selected_key = keys[0]
+
+    def _move_selection(self, step: int):
+        """Move the selection, scrolling the window at its edges"""
+        if not self._keys:
+            return 'break'
+        index = self.offset - 1 if step > 0 else self.offset
+        stored_index = None if self.selected_key is None else \
+            self._stored_index(self.selected_key)
+        if stored_index is not None:
+            index = len(self._keys) - 1 - stored_index
+        index = max(0, min(len(self._keys) - 1, index + step))
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible_rows:
+            self.offset = index - self.visible_rows + 1
+        self.selected_key = self.key_at(index)
+        self._render()
+        iid = str(self.selected_key)
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        return 'break'
@@ -6,29 +6,26 @@ Provides a nice startup experience and error handling
 
 import sys
 import os
-import subprocess
-import tkinter as tk
-from tkinter import messagebox
+import importlib.util
 
 
 def check_dependencies():
     """Check if all required dependencies are available"""
     missing_deps = []
     
-    try:
-        import tkinter
-    except ImportError:
+    # find_spec locates a module without importing it, so the check
+    # doesn't pay for loading Tk and pyperclip twice
+    if importlib.util.find_spec("tkinter") is None:
         missing_deps.append("tkinter (should be included with Python)")
     
-    try:
-        import pyperclip
-    except ImportError:
+    if importlib.util.find_spec("pyperclip") is None:
         missing_deps.append("pyperclip")
     
     return missing_deps
 
 def install_dependencies():
     """Install missing dependencies"""
+    import subprocess
     try:
         print("Installing missing dependencies...")
         subprocess.check_call([sys.executable, "-m", "pip", "install", "pyperclip"])
@@ -40,6 +37,12 @@ def install_dependencies():
 
 def show_error_dialog(title, message):
     """Show error dialog"""
+    try:
+        import tkinter as tk
+        from tkinter import messagebox
+    except ImportError:
+        print(f"{title}: {message}")
+        return
     root = tk.Tk()
     root.withdraw()  # Hide the main window
     messagebox.showerror(title, message)
@@ -62,6 +65,7 @@ def main():
             print("\nAttempting to install pyperclip...")
             if install_dependencies():
                 print("Retrying dependency check...")
+                importlib.invalidate_caches()
                 missing_deps = check_dependencies()
             else:
                 print("\nPlease install dependencies manually:")
@@ -0,0 +1,204 @@
+"""
+Runtime metrics for Clipboard History Manager
+Counters and latency histograms for the hot paths, exportable as
+Prometheus text or JSON lines
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Upper bounds of the latency buckets in seconds, 50us up to 10s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic count of events"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str = ''):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict:
+        return {'name': self.name, 'type': self.kind, 'value': self.value}
+
+
+class _Timer:
+    """Context manager that records its elapsed time in a histogram"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: 'Histogram'):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets
+
+    Observing is a bisect and three additions under a lock, so it is
+    cheap enough to leave on around every clipboard read and redraw.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str = '',
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # One slot per bucket plus one for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def time(self) -> _Timer:
+        """Time a ``with`` block into this histogram"""
+        return _Timer(self)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            count, maximum = self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(estimate, maximum)
+            seen += bucket_count
+        return maximum
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self.counts)
+            snapshot = {'name': self.name, 'type': self.kind, 'count': self.count,
+                        'sum': self.sum, 'max': self.max}
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            buckets[repr(bound)] = cumulative
+        snapshot['buckets'] = buckets
+        return snapshot
+
+
+class MetricsRegistry:
+    """Named counters and histograms
+
+    Asking for an existing name returns the same metric, so modules can
+    declare the metrics they update at import time.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str = '') -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str = '') -> Histogram:
+        return self._get(Histogram, name, help_text)
+
+    def all(self) -> List:
+        with self._lock:
+            return [self.metrics[name] for name in sorted(self.metrics)]
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.all():
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            snapshot = metric.snapshot()
+            if metric.kind == 'counter':
+                lines.append(f"{metric.name} {snapshot['value']}")
+                continue
+            for bound, cumulative in snapshot['buckets'].items():
+                lines.append(f'{metric.name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric.name}_bucket{{le="+Inf"}} {snapshot["count"]}')
+            lines.append(f"{metric.name}_sum {snapshot['sum']!r}")
+            lines.append(f"{metric.name}_count {snapshot['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> str:
+        """One JSON line holding a timestamped snapshot of every metric"""
+        return json.dumps({'time': time.time(),
+                           'metrics': [metric.snapshot() for metric in self.all()]})
+
+    def dump(self, path: str, fmt: str = 'prometheus'):
+        """Write the metrics to a local file
+
+        The Prometheus file is replaced atomically so a textfile collector
+        never reads half of it; JSON lines are appended.
+        """
+        try:
+            if fmt == 'jsonl':
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(self.to_json() + '\n')
+            else:
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.to_prometheus())
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, help_text: str = '') -> Counter:
+    """Counter in the app-wide registry"""
+    return REGISTRY.counter(name, help_text)
+
+
+def histogram(name: str, help_text: str = '') -> Histogram:
+    """Histogram in the app-wide registry"""
+    return REGISTRY.histogram(name, help_text)
+
@@ -0,0 +1,136 @@
+"""
+Near-duplicate detection for Clipboard History Manager
+SimHash fingerprints of normalized text, looked up through band buckets
+"""
+
+import hashlib
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+BITS = 64
+# Longer captures only get exact duplicate detection, so two long texts
+# are never merged on the strength of a prefix
+MAX_LENGTH = 65536
+# Fewest differing bits allowed: similarity 0.75 already means 16 bands
+# of four bits, and looser thresholds would put everything in a bucket
+MAX_DISTANCE = 16
+
+_TOKEN = re.compile(r'\w+|[^\w\s]+')
+# Per bit position, a translation table mapping each byte value to that bit
+_BIT_TABLES = [bytes(value >> bit & 1 for value in range(256)) for bit in range(8)]
+
+
+def normalize(content: str) -> str:
+    """Collapse runs of whitespace and strip the ends"""
+    return ' '.join(content.split())
+
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash of token pairs (single tokens for a one-token text)
+
+    Each bit is set when more feature hashes have it set than not. Pairs
+    rather than single tokens keep texts that merely share vocabulary
+    apart. The hashes are stable across processes, as fingerprints are
+    stored with the items.
+    """
+    if len(tokens) > 1:
+        features = [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+    else:
+        features = tokens
+    if not features:
+        return 0
+    hashes = b''.join(hashlib.blake2b(feature.encode('utf-8', 'surrogatepass'),
+                                      digest_size=8).digest() for feature in features)
+    fingerprint = 0
+    # Count set bits column by column: byte i of every hash, then each bit
+    for byte in range(8):
+        column = hashes[byte::8]
+        for bit, table in enumerate(_BIT_TABLES):
+            if 2 * column.translate(table).count(1) > len(features):
+                fingerprint |= 1 << (byte * 8 + bit)
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """Finds items whose SimHash is within ``max_distance`` bits of a new one
+
+    The fingerprint is split into ``max_distance + 1`` bands. Two
+    fingerprints that differ in at most that many bits agree on at least
+    one whole band, so looking up each band's value finds every match
+    while only comparing against items that share a bucket.
+
+    Captures with fewer than ``min_tokens`` words must match exactly after
+    normalization: one changed token in a short URL or number is a
+    different item, not a variant of it.
+    """
+
+    def __init__(self, threshold: float = 0.9, min_tokens: int = 8):
+        self.threshold = threshold
+        self.max_distance = min(MAX_DISTANCE, int(BITS * (1 - threshold)))
+        self.min_tokens = min_tokens
+        count = self.max_distance + 1
+        edges = [BITS * band // count for band in range(count + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self.buckets: List[Dict[int, Set[int]]] = [{} for _ in self.bands]
+        self.fingerprints: Dict[int, int] = {}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> Optional['NearDuplicateIndex']:
+        """The configured index, or None while near-duplicate mode is off"""
+        config = config or {}
+        if not config.get('enabled'):
+            return None
+        return cls(config.get('threshold', 0.9), config.get('min_tokens', 8))
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def fingerprint(self, content: str) -> Optional[Tuple[int, bool]]:
+        """SimHash of content and whether it is long enough for a fuzzy match
+
+        None for content too long to fingerprint.
+        """
+        if len(content) > MAX_LENGTH:
+            return None
+        words = content.split()
+        tokens = _TOKEN.findall(' '.join(words))
+        return simhash(tokens), len(words) >= self.min_tokens
+
+    def _band_values(self, fingerprint: int):
+        for (start, mask), buckets in zip(self.bands, self.buckets):
+            yield fingerprint >> start & mask, buckets
+
+    def add(self, item_id: int, fingerprint: int):
+        self.remove(item_id)
+        self.fingerprints[item_id] = fingerprint
+        for value, buckets in self._band_values(fingerprint):
+            buckets.setdefault(value, set()).add(item_id)
+
+    def remove(self, item_id: int):
+        fingerprint = self.fingerprints.pop(item_id, None)
+        if fingerprint is None:
+            return
+        for value, buckets in self._band_values(fingerprint):
+            bucket = buckets.get(value)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del buckets[value]
+
+    def clear(self):
+        self.fingerprints.clear()
+        for buckets in self.buckets:
+            buckets.clear()
+
+    def find(self, fingerprint: int, fuzzy: bool = True) -> List[int]:
+        """IDs of indexed items near ``fingerprint`` (equal to it unless fuzzy)"""
+        if not fuzzy:
+            start, mask = self.bands[0]
+            candidates = self.buckets[0].get(fingerprint >> start & mask, ())
+            return [item_id for item_id in candidates
+                    if self.fingerprints[item_id] == fingerprint]
+        candidates = set()
+        for value, buckets in self._band_values(fingerprint):
+            candidates.update(buckets.get(value, ()))
+        return [item_id for item_id in candidates
+                if bin(self.fingerprints[item_id] ^ fingerprint).count('1') <= self.max_distance]
@@ -0,0 +1,136 @@
+"""
+Retention limits for Clipboard History Manager
+Caps on item count, total size, age and the size of a single item;
+pinned items are never evicted
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+SECONDS_PER_DAY = 86400
+
+
+def item_size(item: Dict) -> int:
+    """Size of an item's content in bytes
+
+    Items written before sizes were recorded and still packed count with
+    their compressed size, which is all that is known without unpacking.
+    """
+    size = item.get('size')
+    if size is not None:
+        return size
+    content = item.get('content')
+    if content is not None:
+        return len(content.encode('utf-8', 'surrogatepass'))
+    packed = item.get('packed')
+    return len(packed.data) if packed is not None else 0
+
+
+class RetentionPolicy:
+    """Limits on what the history keeps; 0 turns a limit off
+
+    ``max_age`` is in seconds. ``max_bytes`` counts every item, pinned
+    ones included, but only unpinned items are evicted to meet it.
+    """
+
+    def __init__(self, max_items: int = 50, max_bytes: int = 0, max_age: float = 0,
+                 max_item_bytes: int = 0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_item_bytes = max_item_bytes
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'RetentionPolicy':
+        """max_history plus the config's retention section"""
+        retention = config.get('retention', {})
+        return cls(max_items=config.get('max_history', 50),
+                   max_bytes=retention.get('max_bytes', 0),
+                   max_age=retention.get('max_age_days', 0) * SECONDS_PER_DAY,
+                   max_item_bytes=retention.get('max_item_bytes', 0))
+
+    def accepts(self, size: int) -> bool:
+        """Whether a capture of ``size`` bytes may be kept at all"""
+        return not self.max_item_bytes or size <= self.max_item_bytes
+
+
+class EvictionOrder:
+    """Unpinned items oldest first, plus the size of every item
+
+    The oldest unpinned item is always at the head, so finding the next
+    item to evict, adding, touching and removing are all O(1). Pinned
+    items are sized but left out of the order.
+    """
+
+    def __init__(self):
+        # Item ID -> item, oldest first
+        self._order: 'OrderedDict[int, Dict]' = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._order)
+
+    def add(self, item: Dict, oldest: bool = False):
+        """Track an item that just became the newest (or, loading, the oldest)"""
+        item_id = item['id']
+        size = item_size(item)
+        self.total_bytes += size - self._sizes.get(item_id, 0)
+        self._sizes[item_id] = size
+        if not item.get('pinned'):
+            self._order[item_id] = item
+            self._order.move_to_end(item_id, last=not oldest)
+
+    def remove(self, item_id: int) -> int:
+        """Stop tracking an item; returns its size"""
+        self._order.pop(item_id, None)
+        size = self._sizes.pop(item_id, 0)
+        self.total_bytes -= size
+        return size
+
+    def touch(self, item_id: int):
+        """An item moved to the top of the history"""
+        if item_id in self._order:
+            self._order.move_to_end(item_id)
+
+    def pin(self, item_id: int):
+        self._order.pop(item_id, None)
+
+    def rebuild(self, items: Iterable[Dict]):
+        """Rebuild the order from every item, oldest first
+
+        Unpinning puts an item back in the middle of the order, which an
+        ordered dict can't do in place; it is rare enough to pay O(n).
+        """
+        self._order = OrderedDict((item['id'], item) for item in items
+                                  if not item.get('pinned'))
+
+    def clear(self):
+        self._order.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    def oldest(self) -> Optional[Dict]:
+        """The unpinned item that would be evicted next"""
+        return next(iter(self._order.values()), None)
+
+    def next_victim(self, count: int, policy: RetentionPolicy,
+                    now: Optional[datetime] = None) -> Optional[Tuple[Dict, str]]:
+        """The item to evict and why ('count', 'bytes' or 'age'), or None
+
+        ``count`` is how many items the history holds, pinned ones included.
+        """
+        item = self.oldest()
+        if item is None:
+            return None
+        if policy.max_items and count > policy.max_items:
+            return item, 'count'
+        if policy.max_bytes and self.total_bytes > policy.max_bytes:
+            return item, 'bytes'
+        if policy.max_age:
+            timestamp = item.get('timestamp')
+            if isinstance(timestamp, datetime) and \
+                    (now or datetime.now()) - timestamp > timedelta(seconds=policy.max_age):
+                return item, 'age'
+        return None
@@ -0,0 +1,295 @@
+"""
+Search indexes for Clipboard History Manager
+Keeps history searchable per keystroke without rescanning every item
+"""
+
+import heapq
+from itertools import compress
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Fuzzy match scoring, loosely after fzf
+SCORE_MATCH = 16
+BONUS_CONSECUTIVE = 8
+BONUS_BOUNDARY = 8
+BONUS_FIRST_CHAR = 8
+PENALTY_GAP_START = 3
+PENALTY_GAP_EXTENSION = 1
+# Added for the newest item, falling linearly to 0 for the oldest
+BONUS_RECENCY = 12
+# Fuzzy queries score at most this many items, newest first; past it only
+# items that contain the query outright are scored
+FUZZY_MAX_SCORED = 5000
+WORD_SEPARATORS = frozenset(' \t\n/\\-_.,:;()[]{}<>\'"=@#?&|')
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the distinct three-character substrings of ``text``"""
+    return set(map(''.join, zip(text, text[1:], text[2:])))
+
+
+def char_mask(text: str) -> int:
+    """Bitmask of the characters in ``text``: one bit per letter and digit,
+    the rest folded into the upper bits
+
+    A query can only match items whose mask covers the query's mask.
+    """
+    mask = 0
+    for char in set(text):
+        if 'a' <= char <= 'z':
+            mask |= 1 << (ord(char) - 97)
+        elif '0' <= char <= '9':
+            mask |= 1 << (ord(char) - 22)
+        else:
+            mask |= 1 << (36 + ord(char) % 28)
+    return mask
+
+
+def fuzzy_score(term: str, text: str) -> Optional[int]:
+    """Score ``text`` (lowercase) as a fuzzy match for ``term`` (lowercase)
+
+    The characters of ``term`` must appear in order. The match is found
+    greedily, then tightened from its end backwards, and scored by how
+    many of its characters are consecutive or start a word, minus its
+    gaps. Returns None if ``term`` does not match.
+    """
+    # Forward pass: where the earliest complete match ends
+    end = -1
+    for char in term:
+        end = text.find(char, end + 1)
+        if end < 0:
+            return None
+    # Backward pass: the latest start that still matches up to that end
+    positions = [end]
+    for char in reversed(term[:-1]):
+        positions.append(text.rfind(char, 0, positions[-1]))
+    positions.reverse()
+    score = _score_positions(text, positions)
+    # A contiguous occurrence elsewhere can beat the tightest greedy match
+    start = text.find(term)
+    if start >= 0 and positions[0] != start:
+        score = max(score, _score_positions(text, range(start, start + len(term))))
+    return score
+
+
+def _score_positions(text: str, positions: Iterable[int]) -> int:
+    score = 0
+    previous = None
+    for position in positions:
+        score += SCORE_MATCH
+        if position == 0 or text[position - 1] in WORD_SEPARATORS:
+            score += BONUS_FIRST_CHAR if previous is None else BONUS_BOUNDARY
+        if previous is not None:
+            gap = position - previous - 1
+            if gap == 0:
+                score += BONUS_CONSECUTIVE
+            else:
+                score -= PENALTY_GAP_START + PENALTY_GAP_EXTENSION * (gap - 1)
+        previous = position
+    return score
+
+
+class TrigramIndex:
+    """Incremental trigram index for case-insensitive substring search
+
+    Each item's lowercase text is computed once when it is added. A query
+    of three or more characters intersects the posting lists of its
+    trigrams, smallest first, and only the surviving candidates are
+    verified with a real substring test. Items longer than
+    ``max_indexed_length`` are kept out of the posting lists (their
+    trigram sets would dominate memory) and are always verified directly.
+
+    Items registered with ``add_unindexed`` keep no text in the index at
+    all; ``loader(key)`` is called to fetch their lowercase text when a
+    query needs to verify them.
+
+    Every item also gets a ``char_mask`` so fuzzy queries can skip items
+    that lack one of the query's characters without looking at the text.
+
+    A search thread may query the index while its owner keeps changing
+    it: ``candidates`` only combines whole sets and ``fuzzy_search``
+    (given a ``load``) only looks single keys up, each one operation
+    under the GIL, and neither iterates the dicts.
+    """
+
+    def __init__(self, max_indexed_length: int = 65536,
+                 loader: Optional[Callable[[Hashable], str]] = None):
+        self.max_indexed_length = max_indexed_length
+        self.loader = loader
+        self.texts: Dict[Hashable, Optional[str]] = {}
+        self.postings: Dict[str, Set[Hashable]] = {}
+        self.unindexed: Set[Hashable] = set()
+        # Unindexed items get their mask on the first fuzzy query
+        self.masks: Dict[Hashable, Optional[int]] = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, key: Hashable, text: str):
+        """Index ``text`` under ``key``, replacing any previous entry"""
+        if key in self.texts:
+            self.remove(key)
+        lowered = text.lower()
+        self.texts[key] = lowered
+        self.masks[key] = char_mask(lowered)
+        if len(lowered) > self.max_indexed_length:
+            self.unindexed.add(key)
+            return
+        for gram in trigrams(lowered):
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = {key}
+            else:
+                posting.add(key)
+
+    def add_unindexed(self, key: Hashable):
+        """Track ``key`` without keeping its text; ``loader`` supplies it"""
+        if key in self.texts:
+            self.remove(key)
+        self.texts[key] = None
+        self.masks[key] = None
+        self.unindexed.add(key)
+
+    def remove(self, key: Hashable):
+        """Drop ``key`` from the index if present"""
+        if key not in self.texts:
+            return
+        lowered = self.texts.pop(key)
+        del self.masks[key]
+        if key in self.unindexed:
+            self.unindexed.discard(key)
+            return
+        for gram in trigrams(lowered):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self.postings[gram]
+
+    def clear(self):
+        self.texts.clear()
+        self.postings.clear()
+        self.unindexed.clear()
+        self.masks.clear()
+
+    def lowered(self, key: Hashable) -> str:
+        """Return the lowercase text of an item, loading it if not cached"""
+        text = self.texts[key]
+        if text is None:
+            text = self.loader(key) if self.loader else ''
+        return text
+
+    def search(self, term: str) -> Set[Hashable]:
+        """Return the keys of all items containing ``term``, ignoring case"""
+        term = term.lower()
+        if not term:
+            return set(self.texts)
+        candidates = self.candidates(term)
+        if candidates is None:
+            return {key for key, text in self.texts.items()
+                    if term in (text if text is not None else self.lowered(key))}
+        return {key for key in candidates if term in self.lowered(key)}
+
+    def candidates(self, term: str) -> Optional[Set[Hashable]]:
+        """Keys that may contain lowercase ``term`` and need verifying
+
+        None means every item is a candidate (queries under three
+        characters have no trigrams to narrow them down).
+        """
+        if len(term) < 3:
+            return None
+        postings = []
+        for gram in trigrams(term):
+            posting = self.postings.get(gram)
+            if not posting:
+                postings = []
+                break
+            postings.append(posting)
+
+        candidates: Set[Hashable] = set()
+        if postings:
+            postings.sort(key=len)
+            candidates = postings[0]
+            for posting in postings[1:]:
+                candidates = candidates & posting
+                if not candidates:
+                    break
+        return candidates | self.unindexed
+
+    def fuzzy_search(self, term: str, keys: List[Hashable], limit: int = 200,
+                     should_stop: Optional[Callable[[], bool]] = None,
+                     load: Optional[Callable[[Hashable], str]] = None,
+                     max_scored: int = FUZZY_MAX_SCORED) -> List[Tuple[int, Hashable]]:
+        """Return the best ``limit`` fuzzy matches among ``keys``, best first
+
+        ``keys`` is ordered newest first and recency adds up to
+        ``BONUS_RECENCY`` to an item's score; ties go to the newer item.
+        Only the top ``limit`` scores are kept, on a heap. If
+        ``should_stop`` returns True (it is polled every 1024 items) the
+        search gives up and returns an empty list.
+
+        Scoring is what a query spends its time on, so only the newest
+        ``max_scored`` items that get past the masks are scored; older ones
+        are left to the trigram index and only scored if they contain
+        ``term`` outright (0 scores everything).
+
+        ``load(key)`` supplies the lowercase text of keys the index has no
+        text for, from another thread; masks it leads to are not kept.
+        Without it ``lowered`` is used and unindexed items keep their mask.
+        """
+        term = term.lower()
+        if not term:
+            return [(0, key) for key in keys[:limit]]
+        term_mask = char_mask(term)
+        count = len(keys)
+        masks, texts = self.masks, self.texts
+        keep_masks = load is None
+        load = load or self.lowered
+        heap: List[Tuple[int, int, Hashable]] = []
+
+        def consider(position: int, key: Hashable) -> bool:
+            """Score one item onto the heap; False if its mask rules it out"""
+            mask = masks.get(key)
+            text = None
+            if mask is None:
+                text = texts.get(key)
+                if text is None:
+                    text = load(key)
+                mask = char_mask(text)
+                if keep_masks:
+                    masks[key] = mask
+            if mask & term_mask != term_mask:
+                return False
+            if text is None:
+                text = texts.get(key)
+                if text is None:
+                    text = load(key)
+            score = fuzzy_score(term, text)
+            if score is not None:
+                entry = (score + BONUS_RECENCY * (count - position) // count, -position, key)
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            return True
+
+        scored = 0
+        for position, key in enumerate(keys):
+            if should_stop is not None and not position % 1024 and should_stop():
+                return []
+            if consider(position, key):
+                scored += 1
+                if scored == max_scored:
+                    break
+        else:
+            position = count
+        if position + 1 < count:
+            # Past the cap, only items the index says hold the term outright
+            outright = self.candidates(term) or set()
+            rest = compress(range(position + 1, count),
+                            map(outright.__contains__, keys[position + 1:]))
+            for checked, position in enumerate(rest):
+                if should_stop is not None and not checked % 1024 and should_stop():
+                    return []
+                consider(position, keys[position])
+        heap.sort(reverse=True)
+        return [(score, key) for score, _, key in heap]
@@ -0,0 +1,163 @@
+"""
+Background search for Clipboard History Manager
+Runs history queries off the Tk thread and hands results back in chunks
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import metrics
+from search_index import TrigramIndex
+
+# Matches handed to the UI at a time
+CHUNK_SIZE = 256
+# Items scanned between checks for cancellation and partial results
+SCAN_BATCH = 2048
+
+SEARCH_SECONDS = metrics.histogram('history_search_seconds', 'Time to filter the history')
+
+
+class SearchJob:
+    """One query over the history, safe to run on any thread
+
+    The owner thread builds the job (see ``HistoryModel.search_job``)
+    without copying anything the size of the history. ``keys`` is the
+    history order, newest first, as of then; it is shared between jobs
+    and never modified. ``index`` is the model's live search index and
+    ``load`` reads the text of packed, blob or since removed items: both
+    are only ever asked about one key at a time while the owner goes on
+    changing them. Keys in ``packed`` were still compressed when the job
+    was set up, so the index may not list them and they are always
+    checked. Jobs for stores that search on their own connection are
+    answered up front and carry ``results``. Packed items decompressed
+    while searching are left in ``unpacked`` for the owner to keep.
+    """
+
+    def __init__(self, term: str, keys: List[int], fuzzy: bool = False, limit: int = 200,
+                 index: Optional[TrigramIndex] = None,
+                 load: Optional[Callable[[int], str]] = None,
+                 packed: Optional[Set[int]] = None,
+                 results: Optional[List[int]] = None):
+        self.term = term.lower()
+        self.keys = keys
+        self.fuzzy = fuzzy
+        self.limit = limit
+        self.index = index
+        self.load = load
+        self.packed = packed or set()
+        self.results = results
+        self.unpacked: Dict[int, str] = {}
+
+    def run(self, should_stop: Callable[[], bool]) -> Iterator[List[int]]:
+        """Yield matching keys in chunks, in display order"""
+        if self.results is not None:
+            matches = self.results
+        elif self.fuzzy:
+            matches = [key for _, key in
+                       self.index.fuzzy_search(self.term, self.keys, self.limit, should_stop,
+                                               self.load)]
+        else:
+            yield from self._scan(should_stop)
+            return
+        for start in range(0, len(matches), CHUNK_SIZE):
+            if should_stop():
+                return
+            yield matches[start:start + CHUNK_SIZE]
+
+    def _scan(self, should_stop: Callable[[], bool]) -> Iterator[List[int]]:
+        """Substring matches, newest first, sent as soon as a batch has any"""
+        term, index, load, packed = self.term, self.index, self.load, self.packed
+        # Intersecting posting lists can take a while, so not on the owner thread
+        candidates = index.candidates(term)
+        unindexed, texts = index.unindexed, index.texts
+        chunk: List[int] = []
+        for start in range(0, len(self.keys), SCAN_BATCH):
+            if should_stop():
+                return
+            for key in self.keys[start:start + SCAN_BATCH]:
+                if candidates is not None and key not in candidates and \
+                        key not in unindexed and key not in packed:
+                    continue
+                text = texts.get(key)
+                if text is None:
+                    text = load(key)
+                if term in text:
+                    chunk.append(key)
+                    if len(chunk) >= CHUNK_SIZE:
+                        yield chunk
+                        chunk = []
+            if chunk:
+                yield chunk
+                chunk = []
+
+
+class SearchWorker:
+    """Daemon thread running one ``SearchJob`` at a time
+
+    Submitting a job supersedes every earlier one: a running job stops
+    at its next check and queued ones are skipped. Results go onto a
+    queue that the owner drains with ``poll``, so nothing touches Tk
+    from the worker thread.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._jobs: 'queue.Queue[Optional[Tuple[int, SearchJob]]]' = queue.Queue()
+        self._results: 'queue.Queue[Tuple[int, Optional[List[int]]]]' = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job: SearchJob) -> int:
+        """Queue ``job``, cancelling any earlier one; returns its generation"""
+        self.generation += 1
+        self._jobs.put((self.generation, job))
+        return self.generation
+
+    def cancel(self):
+        """Stop the running job and drop its undelivered results"""
+        self.generation += 1
+
+    def poll(self) -> Tuple[List[List[int]], bool]:
+        """Return the current job's chunks delivered so far and whether it is done"""
+        chunks, done = [], False
+        while True:
+            try:
+                generation, chunk = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            if chunk is None:
+                done = True
+            else:
+                chunks.append(chunk)
+        return chunks, done
+
+    def stop(self):
+        self.cancel()
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            entry = self._jobs.get()
+            if entry is None:
+                return
+            generation, job = entry
+            if generation != self.generation:
+                continue
+
+            def superseded() -> bool:
+                return generation != self.generation
+
+            start = time.perf_counter()
+            try:
+                for chunk in job.run(superseded):
+                    self._results.put((generation, chunk))
+            except Exception as e:
+                print(f"Error searching history: {e}")
+            if not superseded():
+                SEARCH_SECONDS.observe(time.perf_counter() - start)
+            self._results.put((generation, None))
@@ -0,0 +1,87 @@
+"""
+Settings dialog for Clipboard History Manager
+Imported on first use so it stays off the startup path
+"""
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from retention import RetentionPolicy
+
+
+class SettingsDialog:
+    """Modal window for editing retention limits and poll intervals"""
+
+    def __init__(self, app):
+        self.app = app
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Settings")
+        self.window.geometry("400x360")
+        self.window.transient(app.root)
+        self.window.grab_set()
+
+        # Settings content
+        ttk.Label(self.window, text="Settings", font=("Arial", 14, "bold")).pack(pady=10)
+
+        # Max history setting
+        self.history_var = self.add_field("Max History Items:", app.max_history)
+
+        # Retention limits (0 = no limit)
+        retention = app.config['retention']
+        self.max_mb_var = self.add_field("Max History Size (MB, 0 = no limit):",
+                                         retention['max_bytes'] // (1024 * 1024))
+        self.max_days_var = self.add_field("Keep Items For (days, 0 = forever):",
+                                           retention['max_age_days'])
+
+        # Poll interval settings
+        self.min_interval_var = self.add_field("Min Poll Interval (seconds):",
+                                               app.poll_interval_min)
+        self.max_interval_var = self.add_field("Max Poll Interval (seconds):",
+                                               app.poll_interval_max)
+
+        # Save button
+        ttk.Button(self.window, text="Save", command=self.save).pack(pady=20)
+
+    def add_field(self, label: str, value) -> tk.StringVar:
+        """Add a labelled entry row and return its variable"""
+        frame = ttk.Frame(self.window)
+        frame.pack(fill=tk.X, padx=20, pady=5)
+        ttk.Label(frame, text=label).pack(side=tk.LEFT)
+        var = tk.StringVar(value=str(value))
+        ttk.Entry(frame, textvariable=var, width=10).pack(side=tk.RIGHT)
+        return var
+
+    def save(self):
+        app = self.app
+        try:
+            new_max = int(self.history_var.get())
+            new_max_mb = int(self.max_mb_var.get())
+            new_max_days = float(self.max_days_var.get())
+            new_min_interval = float(self.min_interval_var.get())
+            new_max_interval = float(self.max_interval_var.get())
+
+            if new_max_interval < new_min_interval:
+                messagebox.showerror("Error", "Max poll interval must not be below the minimum")
+            elif new_max > 0 and new_min_interval > 0 and new_max_mb >= 0 and new_max_days >= 0:
+                app.max_history = new_max
+                app.config['max_history'] = new_max
+                app.config['retention'].update(max_bytes=new_max_mb * 1024 * 1024,
+                                               max_age_days=new_max_days)
+                app.poll_interval_min = new_min_interval
+                app.poll_interval_max = new_max_interval
+                if hasattr(app.clipboard_backend, 'scheduler'):
+                    app.clipboard_backend.scheduler.configure(new_min_interval,
+                                                              new_max_interval)
+
+                # Evict whatever the new limits no longer allow
+                app.model.set_retention(RetentionPolicy.from_config(app.config))
+                # Pick up content types edited in config.json meanwhile
+                relabelled = app.reload_content_types()
+
+                self.window.destroy()
+                app.update_status(f"Settings saved, {relabelled} items relabelled"
+                                  if relabelled else "Settings saved")
+            else:
+                messagebox.showerror("Error", "Values must be positive numbers")
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid numbers")
@@ -0,0 +1,189 @@
+"""
+Compressed snapshot format for Clipboard History Manager
+Stores items in pages, newest first, with each item's content compressed
+separately, so content is only decompressed when it is needed
+"""
+
+import io
+import json
+import re
+import struct
+import zlib
+from collections import Counter
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b'CHMZ'
+FORMAT_VERSION = 2
+# Format version, info header length, dictionary length
+_PREFIX = struct.Struct('<BII')
+# Page metadata length, page content length
+_PAGE = struct.Struct('<II')
+PAGE_SIZE = 256
+
+CODECS = ('zlib', 'lzma')
+# Raw LZMA2 streams skip the per-item container header; lzma itself is
+# only imported when that codec is in use
+_LZMA2_PRESET = 6
+
+_WORD = re.compile(r'\S+\s?')
+_SEPARATOR = re.compile(r'[/.:=?&_-]')
+
+
+class PackedContent:
+    """Compressed content of one item, decompressed on demand"""
+
+    __slots__ = ('data', 'codec', 'zdict')
+
+    def __init__(self, data: bytes, codec: Optional[str], zdict: bytes = b''):
+        # codec None means the bytes are stored uncompressed
+        self.data = data
+        self.codec = codec
+        self.zdict = zdict
+
+    def unpack(self) -> str:
+        if self.codec is None:
+            data = self.data
+        elif self.codec == 'lzma':
+            import lzma
+            data = lzma.decompress(self.data, format=lzma.FORMAT_RAW,
+                                   filters=[{'id': lzma.FILTER_LZMA2, 'preset': _LZMA2_PRESET}])
+        elif self.zdict:
+            decompressor = zlib.decompressobj(zdict=self.zdict)
+            data = decompressor.decompress(self.data) + decompressor.flush()
+        else:
+            data = zlib.decompress(self.data)
+        return data.decode('utf-8', 'surrogatepass')
+
+
+def pack(content: str, codec: str, zdict: bytes = b'') -> PackedContent:
+    """Compress content, keeping it raw when compression doesn't pay off"""
+    data = content.encode('utf-8', 'surrogatepass')
+    if codec == 'lzma':
+        import lzma
+        packed = lzma.compress(data, format=lzma.FORMAT_RAW,
+                               filters=[{'id': lzma.FILTER_LZMA2, 'preset': _LZMA2_PRESET}])
+    elif zdict:
+        compressor = zlib.compressobj(9, zdict=zdict)
+        packed = compressor.compress(data) + compressor.flush()
+    else:
+        packed = zlib.compress(data, 9)
+    if len(packed) >= len(data):
+        return PackedContent(data, None)
+    return PackedContent(packed, codec, zdict)
+
+
+def train_zdict(samples: List[str], size: int = 32768) -> bytes:
+    """Build a preset dictionary from fragments that recur across samples
+
+    Fragments are whole lines, words and the prefixes of words up to a
+    separator (so URLs and paths share their common leading parts). zlib
+    can only refer back to the dictionary, so it is filled with the
+    fragments that would save the most bytes (items containing them times
+    their length), with the most valuable placed last where matches are
+    cheapest.
+    """
+    counts = Counter()
+    for sample in samples:
+        fragments = set(sample.splitlines(keepends=True))
+        for word in _WORD.findall(sample):
+            fragments.add(word)
+            fragments.update(word[:match.end()] for match in _SEPARATOR.finditer(word))
+        counts.update(fragment for fragment in fragments if len(fragment) >= 4)
+    ranked = sorted((fragment for fragment, count in counts.items() if count > 1),
+                    key=lambda fragment: counts[fragment] * len(fragment), reverse=True)
+    chosen, total = [], 0
+    for fragment in ranked:
+        encoded = fragment.encode('utf-8', 'surrogatepass')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+def is_packed_snapshot(prefix: bytes) -> bool:
+    return prefix.startswith(MAGIC)
+
+
+def _encode_page(items: List[Dict], codec: str, zdict: bytes) -> bytes:
+    metadata, chunks, offset = [], [], 0
+    for item in items:
+        packed = item.get('packed')
+        if packed is None or (packed.codec is not None
+                              and (packed.codec, packed.zdict) != (codec, zdict)):
+            content = packed.unpack() if packed is not None else item.get('content')
+            packed = pack(content, codec, zdict) if content is not None else None
+        entry = {key: value for key, value in item.items() if key not in ('content', 'packed')}
+        if packed is not None:
+            entry['packed'] = [offset, len(packed.data), packed.codec is not None]
+            chunks.append(packed.data)
+            offset += len(packed.data)
+        metadata.append(entry)
+    header = zlib.compress(json.dumps(metadata, ensure_ascii=False).encode('utf-8'))
+    return b''.join([_PAGE.pack(len(header), offset), header] + chunks)
+
+
+def dump(items: List[Dict], seq: int, version: int, codec: str,
+         zdict: bytes = b'', page_size: int = PAGE_SIZE, next_id: int = 1) -> bytes:
+    """Encode JSON-safe items, newest first; 'packed' entries may hold PackedContent
+
+    Items are written in self-contained pages of ``page_size`` so a
+    reader can show the newest page before decoding the rest. Content
+    that is already packed with the same codec and dictionary is copied
+    as is instead of being decompressed and compressed again.
+    """
+    info = zlib.compress(json.dumps(
+        {'version': version, 'seq': seq, 'codec': codec, 'count': len(items),
+         'next_id': next_id}).encode('utf-8'))
+    parts = [MAGIC, _PREFIX.pack(FORMAT_VERSION, len(info), len(zdict)), info, zdict]
+    for start in range(0, len(items), page_size):
+        parts.append(_encode_page(items[start:start + page_size], codec, zdict))
+    return b''.join(parts)
+
+
+def _decode_items(items: List[Dict], data: bytes, codec: str, zdict: bytes) -> List[Dict]:
+    for item in items:
+        location = item.pop('packed', None)
+        if location is not None:
+            offset, length, compressed = location
+            item['packed'] = PackedContent(data[offset:offset + length],
+                                           codec if compressed else None,
+                                           zdict if compressed else b'')
+    return items
+
+
+class SnapshotReader:
+    """Reads a packed snapshot from an open binary file, one page at a time
+
+    Item content is left compressed in a PackedContent under 'packed'.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        prefix = f.read(len(MAGIC) + _PREFIX.size)
+        if not is_packed_snapshot(prefix):
+            raise ValueError("Not a packed snapshot")
+        self.format_version, info_length, zdict_length = _PREFIX.unpack_from(prefix, len(MAGIC))
+        if self.format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.format_version}")
+        self.info = json.loads(zlib.decompress(f.read(info_length)).decode('utf-8'))
+        self.zdict = f.read(zdict_length)
+        self.seq = self.info.get('seq', 0)
+        self.codec = self.info.get('codec', 'zlib')
+
+    def pages(self) -> Iterator[List[Dict]]:
+        """Yield lists of items, newest first"""
+        while True:
+            page_prefix = self.f.read(_PAGE.size)
+            if len(page_prefix) < _PAGE.size:
+                return
+            header_length, data_length = _PAGE.unpack(page_prefix)
+            items = json.loads(zlib.decompress(self.f.read(header_length)).decode('utf-8'))
+            yield _decode_items(items, self.f.read(data_length), self.codec, self.zdict)
+
+
+def load(data: bytes) -> Tuple[List[Dict], int, bytes]:
+    """Decode a whole packed snapshot into items, its sequence number and dictionary"""
+    reader = SnapshotReader(io.BytesIO(data))
+    items = [item for page in reader.pages() for item in page]
+    return items, reader.seq, reader.zdict
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Tests for config.json loading
+"""
+
+import json
+
+from app_config import DEFAULT_CONFIG, load_config
+
+
+def test_old_poll_interval_becomes_the_minimum(tmp_path):
+    """A config from before adaptive polling keeps its interval as the floor"""
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'poll_interval': 2.0, 'storage': {'backend': 'sqlite'}}))
+    config = load_config(str(path))
+    assert (config['poll_interval_min'], config['poll_interval_max']) == (2.0, 10.0)
+    assert 'poll_interval' not in config
+    assert config['storage']['backend'] == 'sqlite'
+    assert config['storage']['history_file'] == DEFAULT_CONFIG['storage']['history_file']
+
+    path.write_text(json.dumps({'poll_interval': 30, 'poll_interval_min': 0.5}))
+    config = load_config(str(path))
+    assert (config['poll_interval_min'], config['poll_interval_max']) == (0.5, 10.0)
+
+    path.write_text(json.dumps({'poll_interval': 30}))
+    config = load_config(str(path))
+    assert (config['poll_interval_min'], config['poll_interval_max']) == (30, 30)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the content type classifier
+"""
+
+import json
+
+from classifier import BUILTIN_TYPES, ContentClassifier
+
+
+def test_builtin_types():
+    """Each built-in detector recognises its kind of content"""
+    classifier = ContentClassifier.from_config()
+    assert classifier.classify("https://example.com/a") == 'URL'
+    assert classifier.classify("someone@example.org") == 'Email'
+    assert classifier.classify("#ff8800") == 'Color'
+    assert classifier.classify("rgba(0, 0, 0, 0.5)") == 'Color'
+    assert classifier.classify("12345") == 'Number'
+    assert classifier.classify("/usr/local/bin/python3\n") == 'Path'
+    assert classifier.classify("C:\\Users\\me\\notes.txt") == 'Path'
+    assert classifier.classify('{"a": [1, 2]}') == 'JSON'
+    assert classifier.classify('{not json}') == 'Text'
+    assert classifier.classify("def main():\n    pass") == 'Code'
+    assert classifier.classify("one\ntwo\nthree\nfour") == 'Multi-line'
+    assert classifier.classify("just some words") == 'Text'
+
+
+def test_code_needs_code_shaped_statements():
+    """Keywords and semicolons in prose don't make it code"""
+    classifier = ContentClassifier.from_config()
+    for prose in ("let me know when you are free", "using the new tool today",
+                  "package arrived at the door", "Thanks; see you soon;", "var", "func",
+                  "public speaking (again) went well", "import duties apply from monday"):
+        assert classifier.classify(prose) == 'Text', prose
+    for code in ("let total = 0;", "using System;", "package com.example;", "import os",
+                 "func (s *Server) Start() error {", "x = compute(1);",
+                 "public static void main(String[] args) {", "#include <stdio.h>"):
+        assert classifier.classify(code) == 'Code', code
+
+
+def test_paths_need_path_shaped_segments():
+    """A leading slash followed by prose is not a path"""
+    classifier = ContentClassifier.from_config()
+    assert classifier.classify("/ and then some") == 'Text'
+    assert classifier.classify("/etc is where config lives") == 'Text'
+    assert classifier.classify("/Users/me/My Documents/notes.txt") == 'Path'
+    assert classifier.classify("C:\\Program Files\\App\\app.exe") == 'Path'
+
+
+def test_long_content_is_not_forced_to_text():
+    """Content over 100 characters still reaches the later detectors"""
+    classifier = ContentClassifier.from_config()
+    lines = "\n".join(f"line {i} of a long note with plenty of words" for i in range(6))
+    assert len(lines) > 100
+    assert classifier.classify(lines) == 'Multi-line'
+    big = json.dumps({'values': list(range(5000))})
+    assert len(big) > 4096
+    assert classifier.classify(big) == 'JSON'
+
+
+def test_config_overrides_and_priority():
+    """config.json can relabel, disable, add and reorder detectors"""
+    classifier = ContentClassifier.from_config({
+        'number': {'enabled': False},
+        'ticket': {'label': 'Ticket', 'priority': 5, 'patterns': ['^[A-Z]+-\\d+$']},
+        'text': {'label': 'Plain', 'patterns': ['.*']},
+    })
+    assert classifier.classify("PROJ-42") == 'Ticket'
+    assert classifier.classify("12345") == 'Plain'
+    assert [d.key for d in classifier.detectors][:2] == ['ticket', 'url']
+
+
+def test_cached_results_survive_config_changes():
+    """Only new or edited detectors read the content of a cached digest"""
+    old = ContentClassifier.from_config()
+    assert old.classify("hello", 'd1') == 'Text'
+
+    reads = []
+
+    def load():
+        reads.append(1)
+        return "hello"
+
+    new = ContentClassifier.from_config()
+    new.cache = old.cache
+    assert new.classify(load, 'd1') == 'Text'
+    assert reads == []
+
+    edited = ContentClassifier.from_config({'greeting': {'label': 'Greeting',
+                                                          'patterns': ['^hello$']}})
+    edited.cache = old.cache
+    assert edited.classify(load, 'd1') == 'Greeting'
+    assert reads == [1]
+    assert len(BUILTIN_TYPES) + 1 == len(edited.detectors)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the command-line interface
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from history_model import HistoryModel
+from history_storage import open_blob_store, open_store
+
+import cli
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """A packed snapshot with newer journal records, one item in a blob"""
+    storage = {'history_file': str(tmp_path / 'history.json'), 'compression': 'zlib',
+               'blob_dir': str(tmp_path / 'blobs'), 'blob_threshold': 1024}
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'storage': storage,
+                                'daemon': {'socket': str(tmp_path / 'none.sock')}}))
+    model = HistoryModel(open_store(storage), 50, open_blob_store(storage))
+    model.load()
+    for content in ("https://example.com", "hello world", "x" * 5000):
+        model.add(content)
+    model.close()
+    model = HistoryModel(open_store(storage), 50, open_blob_store(storage))
+    model.load()
+    model.add("newest note")
+    model.store.close()
+    return str(path)
+
+
+def run(capsys, config_path, *args):
+    code = cli.main(['--config', config_path, *args])
+    return code, capsys.readouterr().out
+
+
+def test_list_and_get(capsys, config_path):
+    """Positions count from the newest item and work with get"""
+    code, out = run(capsys, config_path, 'list', '-n', '2')
+    lines = out.splitlines()
+    assert code == 0 and len(lines) == 2
+    assert lines[0].startswith('1\t') and lines[0].endswith('newest note')
+    assert lines[1].split('\t')[-1] == 'x' * 77 + '...'
+
+    assert run(capsys, config_path, 'get', '2')[1] == 'x' * 5000
+    assert run(capsys, config_path, 'get', '3')[1] == 'hello world'
+    assert run(capsys, config_path, 'get', '9')[0] == 1
+
+
+def test_json_search_and_stats(capsys, config_path):
+    """--json writes one object per line"""
+    code, out = run(capsys, config_path, 'search', 'WORLD', '--json')
+    found = [json.loads(line) for line in out.splitlines()]
+    assert [(item['position'], item['preview']) for item in found] == [(3, 'hello world')]
+
+    code, out = run(capsys, config_path, 'search', 'hlo wrld', '--fuzzy', '--json')
+    assert json.loads(out.splitlines()[0])['preview'] == 'hello world'
+
+    code, out = run(capsys, config_path, 'stats', '--json')
+    stats = json.loads(out)
+    assert stats['items'] == 4
+    assert stats['types'] == {'Text': 3, 'URL': 1}
+
+
+def test_queries_do_not_import_tk(config_path):
+    """The entry point answers queries without loading tkinter"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = ("import runpy, sys\n"
+              f"sys.argv = ['clipboard_manager.py', '--config', {config_path!r}, 'list']\n"
+              "try:\n"
+              "    runpy.run_path('clipboard_manager.py', run_name='__main__')\n"
+              "except SystemExit:\n"
+              "    pass\n"
+              "assert 'tkinter' not in sys.modules\n")
+    result = subprocess.run([sys.executable, '-c', script], cwd=here,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[0].endswith('newest note')
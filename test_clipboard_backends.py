@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for clipboard change detection backends
+The X11 test needs an X server, e.g. run under: xvfb-run python -m pytest
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from clipboard_backends import (AdaptivePollScheduler, PollingBackend, X11Backend,
+                                create_backend)
+
+
+def test_polling_backend_reports_and_stops():
+    """The poller reports only changes and its thread is gone after stop()"""
+    reads = iter(["first", "first", "second"])
+    seen = []
+    done = threading.Event()
+
+    def on_change(text):
+        seen.append(text)
+        if len(seen) == 2:
+            done.set()
+
+    backend = PollingBackend(0.001, 0.001, paste=lambda: next(reads, "second"))
+    backend.start(on_change)
+    assert done.wait(2)
+    backend.stop()
+    assert not backend.running
+    assert seen == ["first", "second"]
+
+
+def test_adaptive_scheduler_backs_off_and_bursts():
+    scheduler = AdaptivePollScheduler(0.25, 4.0, backoff=2.0)
+    idle = [scheduler.next_interval(False) for _ in range(6)]
+    assert idle == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+    assert scheduler.next_interval(True) == 0.25
+    assert scheduler.next_interval(False) == 0.5
+
+
+def test_restart_keeps_single_poller():
+    """Starting again replaces the previous watcher thread"""
+    backend = PollingBackend(0.01, 0.01, paste=lambda: "x")
+    backend.start(lambda text: None)
+    first_thread = backend._thread
+    backend.start(lambda text: None)
+    assert not first_thread.is_alive()
+    backend.stop()
+
+
+def test_create_backend_falls_back_to_polling(monkeypatch):
+    monkeypatch.delenv('DISPLAY', raising=False)
+    backend = create_backend({'poll_interval_min': 0.5, 'poll_interval_max': 2.0})
+    assert isinstance(backend, PollingBackend)
+    assert backend.scheduler.max_interval == 2.0
+
+
+@pytest.mark.skipif(not os.environ.get('DISPLAY'), reason="needs an X server")
+def test_x11_backend_sees_new_owner():
+    """Taking CLIPBOARD ownership in another client triggers a read"""
+    tk = pytest.importorskip('tkinter')
+    try:
+        backend = X11Backend()
+    except OSError as e:
+        pytest.skip(str(e))
+
+    seen = []
+    backend.start(seen.append)
+    root = tk.Tk()
+    root.withdraw()
+    root.clipboard_clear()
+    root.clipboard_append("copied under xvfb")
+    deadline = time.time() + 5
+    # Tk has to keep running its event loop to answer the conversion
+    while "copied under xvfb" not in seen and time.time() < deadline:
+        root.update()
+        time.sleep(0.01)
+    backend.stop()
+    root.destroy()
+    assert "copied under xvfb" in seen
+
+
+@pytest.mark.skipif(not os.environ.get('DISPLAY'), reason="needs an X server")
+def test_x11_backend_keeps_owner_change_during_read():
+    """An owner change that lands while a conversion is pending is still reported"""
+    tk = pytest.importorskip('tkinter')
+    entered, release = threading.Event(), threading.Event()
+
+    class GatedBackend(X11Backend):
+        gate = False
+
+        def _read_clipboard(self, display, window):
+            if self.gate:
+                self.gate = False
+                entered.set()
+                release.wait(5)
+            return super()._read_clipboard(display, window)
+
+    try:
+        backend = GatedBackend()
+    except OSError as e:
+        pytest.skip(str(e))
+
+    def pump_until(condition, seconds=5.0):
+        deadline = time.time() + seconds
+        while not condition() and time.time() < deadline:
+            root.update()
+            time.sleep(0.01)
+
+    seen = []
+    backend.start(seen.append)
+    root = tk.Tk()
+    root.withdraw()
+    root.clipboard_clear()
+    root.clipboard_append("first")
+    pump_until(lambda: "first" in seen)
+
+    backend.gate = True
+    root.clipboard_clear()
+    root.clipboard_append("second")
+    pump_until(entered.is_set)
+    # This change reaches the watcher before the reply to its conversion
+    root.clipboard_clear()
+    root.clipboard_append("third")
+    pump_until(lambda: False, seconds=0.2)
+    release.set()
+    pump_until(lambda: seen.count("third") >= 2)
+    backend.stop()
+    root.destroy()
+    assert seen.count("third") >= 2
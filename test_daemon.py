@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for the headless daemon and its socket API
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from app_config import load_config
+from history_model import HistoryModel
+from history_storage import open_blob_store, open_store
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A daemon without clipboard capture serving three stored items"""
+    from daemon import ClipboardDaemon
+
+    config = load_config(str(tmp_path / 'missing.json'))
+    config['storage'].update(history_file=str(tmp_path / 'history.json'),
+                             blob_dir=str(tmp_path / 'blobs'))
+    config['daemon']['socket'] = str(tmp_path / 'daemon.sock')
+    model = HistoryModel(open_store(config['storage']), 50, open_blob_store(config['storage']))
+    model.load()
+    for content in ("https://example.com", "hello world", "12345"):
+        model.add(content)
+    model.close()
+
+    daemon = ClipboardDaemon(config, capture=False)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(daemon.run(),))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(daemon.path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield daemon
+    loop.call_soon_threadsafe(daemon.stop)
+    thread.join(5)
+    loop.close()
+
+
+def test_list_search_get_delete(daemon):
+    """Queries see the stored history; deletes are persisted"""
+    from daemon import DaemonClient
+
+    client = DaemonClient(daemon.path)
+    try:
+        items = client.request('list')
+        assert [item['preview'] for item in items] == ["12345", "hello world",
+                                                       "https://example.com"]
+        assert [item['type'] for item in items] == ['Number', 'Text', 'URL']
+        assert client.request('list', offset=1, limit=1)[0]['preview'] == "hello world"
+        assert [item['position'] for item in items] == [1, 2, 3]
+
+        found = client.request('search', query='WORLD')
+        assert [item['preview'] for item in found] == ["hello world"]
+        assert found[0]['position'] == 2
+        stats = client.request('stats')
+        assert stats['items'] == 3 and stats['types'] == {'Number': 1, 'Text': 1, 'URL': 1}
+        assert client.request('search', query='hlo wld', fuzzy=True)[0]['id'] == found[0]['id']
+
+        assert client.request('get', item=found[0]['id'])['content'] == "hello world"
+        assert client.request('delete', item=found[0]['id']) == {'deleted': True}
+        with pytest.raises(RuntimeError):
+            client.request('get', item=found[0]['id'])
+        with pytest.raises(RuntimeError):
+            client.request('nope')
+    finally:
+        client.close()
+
+
+def test_subscribers_get_new_items(daemon):
+    """Captures reported by the backend are pushed to subscribers"""
+    from daemon import DaemonClient
+
+    subscriber = DaemonClient(daemon.path)
+    # The daemon registers a subscriber before answering, so nothing is
+    # missed once the request returns
+    subscribed = threading.Event()
+    request = subscriber.request
+
+    def request_then_signal(cmd, **params):
+        result = request(cmd, **params)
+        subscribed.set()
+        return result
+
+    subscriber.request = request_then_signal
+    try:
+        events = subscriber.events()
+        received = []
+        reader = threading.Thread(target=lambda: received.extend([next(events), next(events)]))
+        reader.start()
+        assert subscribed.wait(5)
+        # As the clipboard backend would, from another thread
+        daemon.on_clipboard("freshly copied")
+        daemon.on_clipboard("hello world")
+        reader.join(5)
+        assert [(event['event'], event['item']['preview']) for event in received] == [
+            ('add', "freshly copied"), ('touch', "hello world")]
+    finally:
+        subscriber.close()
+
+
+def test_config_reload_relabels_history(daemon, tmp_path):
+    """Content types edited in the config file apply on reload (SIGHUP)"""
+    from daemon import DaemonClient
+
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'content_types': {
+        'greeting': {'label': 'Greeting', 'priority': 5, 'patterns': ['^hello']}}}))
+    daemon.config_path = str(path)
+    # Signal handlers can only be installed on the main thread
+    daemon.loop.call_soon_threadsafe(daemon.reload_config)
+    client = DaemonClient(daemon.path)
+    try:
+        assert [item['type'] for item in client.request('list')] == ['Number', 'Greeting', 'URL']
+    finally:
+        client.close()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for history file change notification
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+from file_watch import InotifyWatcher, StatWatcher, create_watcher
+
+
+def watchers():
+    yield StatWatcher
+    if sys.platform.startswith('linux'):
+        yield InotifyWatcher
+
+
+@pytest.mark.parametrize('watcher_class', list(watchers()))
+def test_writes_and_replacements_are_reported(tmp_path, watcher_class):
+    """Appending to a watched file and replacing it both wake the watcher"""
+    path = tmp_path / 'history.journal'
+    path.write_text('')
+    if watcher_class is StatWatcher:
+        watcher = StatWatcher([str(path)], interval=0.01)
+    else:
+        watcher = InotifyWatcher([str(path)])
+    changed = threading.Event()
+    watcher.start(changed.set)
+    try:
+        # Give the watcher a moment to take its first look
+        changed.wait(0.1)
+        changed.clear()
+        with open(path, 'a') as f:
+            f.write('{"op": "clear"}\n')
+        assert changed.wait(5)
+
+        changed.clear()
+        (tmp_path / 'other.txt').write_text('unrelated')
+        tmp = tmp_path / 'history.journal.tmp'
+        tmp.write_text('')
+        os.replace(tmp, path)
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
+
+
+def test_create_watcher_picks_a_working_watcher(tmp_path):
+    watcher = create_watcher([str(tmp_path / 'history.json')], interval=0.5)
+    expected = 'inotify' if sys.platform.startswith('linux') else 'stat'
+    assert watcher.name == expected
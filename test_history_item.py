@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact history item record
+"""
+
+from datetime import datetime
+
+import pytest
+
+from history_item import HistoryItem
+from history_storage import serialize_item
+
+
+def test_reads_and_writes_like_a_dict():
+    item = HistoryItem({'id': 3, 'type': 'Text', 'timestamp': '2024-01-15T10:30:05',
+                        'time_display': 'ignored', 'content': 'hello', 'future': 1})
+    assert item['timestamp'] == datetime(2024, 1, 15, 10, 30, 5)
+    assert item['time_display'] == '10:30:05'
+    assert 'packed' not in item and item.get('blob') is None
+    with pytest.raises(KeyError):
+        item['preview']
+
+    item['pinned'] = True
+    assert item.pop('pinned') is True and 'pinned' not in item
+    assert item.pop('pinned', None) is None
+    del item['content']
+    assert 'content' not in item
+    # Keys without a slot are kept too
+    assert item['future'] == 1
+
+
+def test_types_are_shared_and_timestamps_compact():
+    first = HistoryItem({'type': ''.join(['Te', 'xt']), 'timestamp': datetime.now()})
+    second = HistoryItem(type=''.join(['Te', 'xt']))
+    assert first['type'] is second['type']
+    assert not hasattr(first, '__dict__')
+    assert isinstance(first._time, float)
+
+
+def test_serializes_like_the_old_dicts():
+    item = HistoryItem(id=1, type='URL', timestamp='2024-01-15T10:30:05', use_count=2,
+                       digest='abc', content='https://example.com')
+    assert serialize_item(item) == {
+        'id': 1, 'digest': 'abc', 'type': 'URL', 'use_count': 2,
+        'content': 'https://example.com', 'timestamp': '2024-01-15T10:30:05'}
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Tests for the Tk-independent history model
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from datetime import timedelta
+
+from classifier import ContentClassifier
+from history_model import EVICTIONS, HistoryModel
+from history_storage import BlobStore, JournalStore, SqliteStore
+from near_duplicates import NearDuplicateIndex
+from retention import RetentionPolicy
+
+
+def make_model(tmp_path, max_history=50):
+    model = HistoryModel(JournalStore(str(tmp_path / 'history.json')), max_history)
+    model.load()
+    return model
+
+
+def test_captures_apply_on_owner_thread(tmp_path):
+    """Other threads only queue captures; the owner applies them"""
+    model = make_model(tmp_path)
+    events = []
+    model.subscribe(lambda event, item: events.append((event, threading.get_ident())))
+
+    worker = threading.Thread(target=lambda: [model.post_capture(f"item {i}") for i in range(5)])
+    worker.start()
+    worker.join()
+    assert len(model) == 0
+
+    assert model.process_pending() == 5
+    assert len(model) == 5
+    assert {thread for _, thread in events} == {threading.get_ident()}
+
+
+def test_duplicate_moves_to_front(tmp_path):
+    model = make_model(tmp_path)
+    first = model.add("first")
+    model.add("second")
+    events = []
+    model.subscribe(lambda event, item: events.append((event, item['content'])))
+
+    assert model.add("first") is first
+    assert first['use_count'] == 2
+    assert [item['content'] for item in model.items()] == ["first", "second"]
+    assert events == [('touch', 'first')]
+
+
+def test_trim_and_delete_notify(tmp_path):
+    model = make_model(tmp_path, max_history=2)
+    events = []
+    model.subscribe(lambda event, item: events.append((event, item and item['content'])))
+    for content in ("a", "b", "c"):
+        model.add(content)
+    assert [item['content'] for item in model.items()] == ["c", "b"]
+    assert ('delete', 'a') in events
+
+    model.delete(model.items()[0]['id'])
+    assert model.filter_keys() == [model.items()[0]['id']]
+    model.clear()
+    assert events[-1] == ('clear', None)
+
+
+def test_retention_limits_spare_pinned_items(tmp_path):
+    """Count, byte and age limits evict the oldest unpinned items, and it sticks"""
+    path = str(tmp_path / 'history.json')
+    retention = RetentionPolicy(max_items=3, max_bytes=1000, max_item_bytes=600)
+    model = HistoryModel(JournalStore(path), retention=retention)
+    model.load()
+    keep = model.add("keep me")
+    model.pin(keep['id'])
+    for content in ("a", "b", "c"):
+        model.add(content)
+    assert [item['content'] for item in model.items()] == ["c", "b", "keep me"]
+
+    assert model.add("x" * 601) is None
+    model.add("y" * 600)
+    model.add("z" * 400)
+    # "z" pushes "c" out by count, then "y" by size
+    assert [model.content(item)[:1] for item in model.items()] == ["z", "k"]
+    assert model.eviction.total_bytes == 407
+
+    # Old enough to expire, except the pinned one
+    for item in model.items():
+        item['timestamp'] -= timedelta(days=3)
+    model.set_retention(RetentionPolicy(max_items=3, max_age=2 * 86400))
+    assert [item['content'] for item in model.items()] == ["keep me"]
+    assert EVICTIONS['age'].value >= 1
+
+    reloaded = HistoryModel(JournalStore(path), 50)
+    reloaded.load()
+    assert [(item['content'], item['pinned']) for item in reloaded.items()] == \
+        [("keep me", True)]
+    # Unpinned, it has long expired
+    model.pin(keep['id'], False)
+    assert len(model) == 0
+
+
+def test_pins_reach_other_processes_and_survive_their_trims(tmp_path):
+    """Pinned items count towards max_history but are never the ones evicted"""
+    first, second = make_model(tmp_path, 3), make_model(tmp_path, 3)
+    events = []
+    second.subscribe(lambda event, item: events.append((event, item and item['content'])))
+    oldest = first.add("oldest")
+    first.pin(oldest['id'])
+    first.add("a")
+    first.add("b")
+    second.sync()
+    assert [item['content'] for item in second.items()] == ["b", "a", "oldest"]
+
+    second.add("c")
+    first.sync()
+    assert [item['content'] for item in first.items()] == ["c", "b", "oldest"]
+    assert ('pin', 'oldest') in events
+
+
+def test_near_duplicates_collapse_into_newest_version(tmp_path):
+    """Edited copies replace older ones, keeping their use counts and pins"""
+    path = str(tmp_path / 'history.json')
+    model = HistoryModel(JournalStore(path), near_duplicates=NearDuplicateIndex())
+    model.load()
+    text = ("SELECT id, name FROM users WHERE created_at > '2024-01-01' "
+            "AND active = 1 ORDER BY name LIMIT 50")
+    first = model.add(text)
+    model.pin(first['id'])
+    model.add("ticket 1")
+    events = []
+    model.subscribe(lambda event, item: events.append((event, item['id'])))
+
+    newest = model.add(text.replace("50", "100").replace(" AND", "\n   AND"))
+    assert model.add("ticket 2")['content'] == "ticket 2"
+    assert [item['id'] for item in model.items()] == [4, 3, 2]
+    assert (newest['use_count'], newest['pinned']) == (2, True)
+    assert events[:2] == [('delete', 1), ('add', 3)]
+
+    reloaded = HistoryModel(JournalStore(path), near_duplicates=NearDuplicateIndex())
+    reloaded.load()
+    assert [item['id'] for item in reloaded.items()] == [4, 3, 2]
+    assert reloaded.add(text)['use_count'] == 3
+    assert len(reloaded) == 3
+
+
+def test_set_classifier_relabels_items(tmp_path):
+    """Switching classifiers relabels existing items and reports the changes"""
+    model = make_model(tmp_path)
+    ticket = model.add("PROJ-42")
+    number = model.add("12345")
+    assert (ticket['type'], number['type']) == ('Text', 'Number')
+    events = []
+    model.subscribe(lambda event, item: events.append((event, item['content'])))
+
+    changed = model.set_classifier(ContentClassifier.from_config(
+        {'ticket': {'label': 'Ticket', 'priority': 5, 'patterns': ['^[A-Z]+-\\d+$']}}))
+    assert changed == [ticket]
+    assert events == [('type', "PROJ-42")]
+    assert ticket['type'] == 'Ticket'
+    assert model.add("ABC-1")['type'] == 'Ticket'
+
+
+def test_filter_keys_and_reload(tmp_path):
+    model = make_model(tmp_path)
+    for content in ("Hello World", "goodbye", "hello again"):
+        model.add(content)
+    matches = [model.get(key)['content'] for key in model.filter_keys("HELLO")]
+    assert matches == ["hello again", "Hello World"]
+
+    reloaded = make_model(tmp_path)
+    assert [item['content'] for item in reloaded.items()] == [
+        "hello again", "goodbye", "Hello World"]
+    assert reloaded.add("new")['id'] == 4
+
+
+def test_deleted_ids_are_not_reused(tmp_path):
+    """Deleting the newest item and restarting doesn't hand its ID out again"""
+    path = str(tmp_path / 'history.json')
+    stores = [lambda: JournalStore(path), lambda: JournalStore(path, compression='zlib'),
+              lambda: SqliteStore(str(tmp_path / 'history.db'), import_path=None)]
+    for number, open_store in enumerate(stores):
+        model = HistoryModel(open_store())
+        model.load()
+        newest = model.add(f"store {number} newest")
+        model.delete(newest['id'])
+        model.save()
+        model.close()
+        # As if later compactions had trimmed its add record away
+        if os.path.exists(str(tmp_path / 'history.journal')):
+            os.remove(str(tmp_path / 'history.journal'))
+
+        reloaded = HistoryModel(open_store())
+        reloaded.load()
+        assert reloaded.add(f"store {number} next")['id'] == newest['id'] + 1
+        reloaded.close()
+
+
+def test_filter_keys_keep_recency_order(tmp_path):
+    """Few or many matches, touched, loaded and synced items come back newest first"""
+    def expected(model, term):
+        return [key for key in model.filter_keys() if term in model.get(key)['content']]
+
+    model = make_model(tmp_path, 100)
+    for i in range(40):
+        model.add(f"item {i}" + (" rare" if i % 10 == 0 else ""))
+    model.add("item 10 rare")
+    reloaded = make_model(tmp_path, 100)
+    reloaded.add("item 0 rare")
+    reloaded.add("new rare")
+    model.sync()
+    for each in (model, reloaded):
+        assert each.filter_keys("rare") == expected(each, "rare")
+        assert each.filter_keys("rare")[:2] == [41, 1]
+        assert each.filter_keys("item") == expected(each, "item")
+        assert each.filter_keys("no such text") == []
+
+
+def test_fuzzy_keys_rank_matches(tmp_path):
+    """Fuzzy search ranks tight matches first and caps the result count"""
+    model = make_model(tmp_path)
+    for content in ("deploy the app", "d e p l o y", "nothing", "deploy.yaml"):
+        model.add(content)
+    ranked = [model.get(key)['content'] for key in model.fuzzy_keys("deploy")]
+    assert ranked[:2] == ["deploy.yaml", "deploy the app"]
+    assert ranked[-1] == "d e p l o y"
+    assert len(model.fuzzy_keys("deploy", limit=1)) == 1
+    assert len(model.fuzzy_keys("")) == 4
+
+
+def test_large_items_live_in_blob_store(tmp_path):
+    """Large content is kept on disk, searchable and survives a reload"""
+    blobs = BlobStore(str(tmp_path / 'blobs'), threshold=100, grace_period=0)
+    big = 'x' * 500 + ' needle'
+    open_stores = (lambda: JournalStore(str(tmp_path / 'history.json')),
+                   lambda: SqliteStore(str(tmp_path / 'history.db'), import_path=None))
+    for open_store in open_stores:
+        model = HistoryModel(open_store(), blobs=blobs)
+        model.load()
+        item = model.add(big)
+        model.add('small')
+        assert 'content' not in item and item['size'] == len(big)
+        assert model.content(item) == big
+        assert model.filter_keys('NEEDLE') == [item['id']]
+        model.close()
+
+        model = HistoryModel(open_store(), blobs=blobs)
+        model.load()
+        assert [model.content(item) for item in model.items()] == ['small', big]
+        model.delete(model.items()[1]['id'])
+        model.close()
+        assert not list((tmp_path / 'blobs').rglob('*/*'))
+
+
+def test_closing_keeps_blobs_another_process_added(tmp_path):
+    """A closing instance reads other processes' items before collecting blobs"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = (
+        "import sys\n"
+        "from history_model import HistoryModel\n"
+        "from history_storage import BlobStore, JournalStore\n"
+        "model = HistoryModel(JournalStore(sys.argv[1]),\n"
+        "                     blobs=BlobStore(sys.argv[2], threshold=100))\n"
+        "model.load()\n"
+        "model.add('y' * 5000)\n"
+        "model.close()\n")
+    path, blob_dir = str(tmp_path / 'history.json'), str(tmp_path / 'blobs')
+    # No grace period: only catching up keeps the other process's blob
+    model = HistoryModel(JournalStore(path), blobs=BlobStore(blob_dir, 100, grace_period=0))
+    model.load()
+    model.add('x' * 5000)
+    writer = subprocess.run([sys.executable, '-c', script, path, blob_dir], cwd=here)
+    assert writer.returncode == 0
+    model.close()
+
+    model = HistoryModel(JournalStore(path), blobs=BlobStore(blob_dir, 100))
+    model.load()
+    assert [model.content(item) for item in model.items()] == ['y' * 5000, 'x' * 5000]
+
+
+def test_packed_items_expand_on_demand(tmp_path):
+    """Items from a compressed snapshot stay packed until read or searched"""
+    path = str(tmp_path / 'history.json')
+    model = HistoryModel(JournalStore(path, compression='zlib'))
+    model.load()
+    for i in range(5):
+        model.add(f"entry {i}")
+    model.close()
+
+    model = HistoryModel(JournalStore(path, compression='zlib'))
+    model.load()
+    newest = model.items()[0]
+    assert len(model.packed_ids) == 5
+    assert model.preview(newest) == 'entry 4'
+    assert len(model.packed_ids) == 4
+    assert model.filter_keys('ENTRY 1') == [model.items()[3]['id']]
+    assert not model.packed_ids
+
+
+def test_background_load_streams_pages(tmp_path):
+    """Stored pages merge newest first and captures wait for the rest"""
+    path = str(tmp_path / 'history.json')
+    model = HistoryModel(JournalStore(path, compression='zlib'), max_history=1000)
+    model.load()
+    for i in range(600):
+        model.add(f"entry {i}")
+    model.close()
+
+    model = HistoryModel(JournalStore(path, compression='zlib'), max_history=1000)
+    loaded = []
+    model.subscribe(lambda event, item: loaded.append(item['id']) if event == 'load' else None)
+    model.start_loading(page_size=256)
+    model.post_capture("new while loading")
+    while not len(model):
+        model.process_pending(limit=200)
+    assert len(model) == 256 and model.inbox.qsize() == 1
+    assert [model.preview(item) for item in model.items()[:2]] == ['entry 599', 'entry 598']
+
+    model.process_pending()
+    assert len(model) == 601 and not model.loading
+    assert model.preview(model.items()[0]) == "new while loading"
+    assert model.items()[0]['id'] == 601
+    assert loaded == [item['id'] for item in model.items()[1:]]
+
+
+def test_clear_cancels_loading(tmp_path):
+    """Pages still queued when the history is cleared are dropped"""
+    path = str(tmp_path / 'history.json')
+    model = HistoryModel(JournalStore(path, compression='zlib'), max_history=1000)
+    model.load()
+    for i in range(600):
+        model.add(f"entry {i}")
+    model.close()
+
+    model = HistoryModel(JournalStore(path, compression='zlib'), max_history=1000)
+    model.start_loading(page_size=256, background=False)
+    model.process_pending(limit=1)
+    assert len(model) == 256
+    model.clear()
+    model.process_pending()
+    assert len(model) == 0 and not model.loading
+
+
+def test_models_sharing_a_store_stay_in_step(tmp_path):
+    """Changes made by one process reach the other as ordinary events"""
+    first, second = make_model(tmp_path), make_model(tmp_path)
+    events = []
+    second.subscribe(lambda event, item: events.append((event, item and item['content'])))
+
+    one, two = first.add("one"), first.add("two")
+    assert second.sync() == 2
+    assert [(item['id'], item['content']) for item in second.items()] == [(2, "two"), (1, "one")]
+
+    three = second.add("three")
+    assert three['id'] == 3
+    assert first.add("one") is one and one['use_count'] == 2
+    assert [item['content'] for item in first.items()] == ["one", "three", "two"]
+    second.sync()
+    assert [item['content'] for item in second.items()] == ["one", "three", "two"]
+    assert second.get(1)['use_count'] == 2
+
+    second.delete(two['id'])
+    first.sync()
+    assert first.filter_keys("two") == []
+    first.clear()
+    second.sync()
+    assert len(second) == 0
+    assert events == [('add', 'one'), ('add', 'two'), ('add', 'three'), ('touch', 'one'),
+                      ('delete', 'two'), ('clear', None)]
+
+
+def test_model_reloads_after_missing_a_compaction(tmp_path):
+    """A model too far behind replaces its history with the stored one"""
+    first, second = make_model(tmp_path, 500), make_model(tmp_path, 500)
+    for i in range(150):
+        first.add(f"item {i}")
+    first.save()
+    assert second.sync() == 150
+    assert second.filter_keys() == first.filter_keys()
+
+
+def test_concurrent_processes_share_one_history(tmp_path):
+    """Two processes capturing at once lose nothing and never reuse an ID"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = (
+        "import sys\n"
+        "from history_model import HistoryModel\n"
+        "from history_storage import JournalStore\n"
+        "model = HistoryModel(JournalStore(sys.argv[1], compact_threshold=40), 1000)\n"
+        "model.load()\n"
+        "for i in range(150):\n"
+        "    model.add(f'{sys.argv[2]} {i}')\n"
+        "model.add('shared text')\n"
+        "model.close()\n")
+    path = str(tmp_path / 'history.json')
+    writers = [subprocess.Popen([sys.executable, '-c', script, path, name], cwd=here)
+               for name in ('left', 'right')]
+    assert [writer.wait(60) for writer in writers] == [0, 0]
+
+    model = HistoryModel(JournalStore(path), 1000)
+    model.load()
+    contents = [item['content'] for item in model.items()]
+    assert len(contents) == 301
+    assert contents.count('shared text') == 1
+    assert len({item['id'] for item in model.items()}) == 301
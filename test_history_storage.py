@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Tests for the history storage engines (no clipboard or display needed)
+"""
+
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from history_storage import (BlobStore, JournalStore, SqliteStore, assign_ids, content_digest,
+                             serialize_item, set_pinned)
+import snapshot_format
+from snapshot_format import pack, train_zdict
+
+
+_ids = itertools.count(1)
+
+
+def make_item(content):
+    return {'id': next(_ids), 'content': content, 'type': 'Text',
+            'timestamp': '2024-01-15T10:00:00', 'time_display': '10:00:00'}
+
+
+def test_journal_replay(tmp_path):
+    """Adds, deletes and trims survive a reload without a snapshot"""
+    path = str(tmp_path / 'history.json')
+    store = JournalStore(path)
+    first, second, third = make_item('one'), make_item('two'), make_item('three')
+    for item in (first, second, third):
+        store.append_add(item)
+    store.append_delete(second)
+    store.append_trim(1)
+
+    items = JournalStore(path).load()
+    assert [item['content'] for item in items] == ['three']
+
+
+def test_compaction_folds_journal(tmp_path):
+    """Compaction writes a snapshot; the journal keeps nothing left to replay"""
+    path = str(tmp_path / 'history.json')
+    store = JournalStore(path)
+    history = []
+    for content in ('a', 'b', 'c'):
+        item = make_item(content)
+        history.insert(0, item)
+        store.append_add(item)
+    store.compact(history)
+
+    assert store.journal_records == 0
+    reloaded = JournalStore(path)
+    assert [item['content'] for item in reloaded.load()] == ['c', 'b', 'a']
+    assert reloaded.journal_records == 0
+    store.append_clear()
+    store.append_add(make_item('d'))
+    assert [item['content'] for item in JournalStore(path).load()] == ['d']
+
+
+def test_background_compaction_serializes_off_the_caller(tmp_path):
+    """Items are serialized on the compaction thread, with pins as of its seq"""
+    started, go = threading.Event(), threading.Event()
+
+    class GatedItem(dict):
+        def copy(self):
+            started.set()
+            go.wait(5)
+            return dict(self)
+
+    path = str(tmp_path / 'history.json')
+    store = JournalStore(path)
+    a, b, c = make_item('a'), make_item('b'), make_item('c')
+    for item in (a, b, c):
+        store.append_add(item)
+    store.compact_in_background([GatedItem(c), b, a])
+    started.wait(5)
+    # Meanwhile "d" pushes "a" out, then "b" is pinned
+    store.append_add(make_item('d'))
+    store.append_trim(3)
+    set_pinned(b, True)
+    store.append_pin(b)
+    go.set()
+    store._compact_thread.join()
+
+    items = JournalStore(path).load()
+    assert [(item['content'], bool(item.get('pinned'))) for item in items] == \
+        [('d', False), ('c', False), ('b', True)]
+
+
+def test_compaction_waits_for_a_journal_in_proportion(tmp_path):
+    """A bigger snapshot waits for a longer journal before it is rewritten"""
+    store = JournalStore(str(tmp_path / 'history.json'), compact_threshold=2)
+    store.compact([make_item(str(i)) for i in range(40)])
+    for i in range(9):
+        store.append_add(make_item(f"new {i}"))
+    assert not store.needs_compaction()
+    store.append_add(make_item("tenth"))
+    assert store.needs_compaction()
+
+
+def test_crash_recovery(tmp_path):
+    """A torn journal line and an untrimmed journal are both tolerated"""
+    path = str(tmp_path / 'history.json')
+    store = JournalStore(path)
+    item = make_item('kept')
+    store.append_add(item)
+    # Simulate a crash after the snapshot was replaced but before the
+    # journal was trimmed, followed by a half-written record
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 2, 'seq': store.seq, 'items': [item]}, f)
+    with open(store.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "item": {"cont')
+
+    items = JournalStore(path).load()
+    assert [item['content'] for item in items] == ['kept']
+
+
+def test_legacy_snapshot(tmp_path):
+    """Plain-list files written by older versions still load and get IDs"""
+    path = tmp_path / 'history.json'
+    old_items = [make_item('newer'), make_item('older')]
+    for item in old_items:
+        del item['id']
+    path.write_text(json.dumps(old_items), encoding='utf-8')
+    items = JournalStore(str(path)).load()
+    assert items[1]['content'] == 'older'
+    assert assign_ids(items)
+    assert [item['id'] for item in items] == [2, 1]
+
+
+def test_sqlite_store_search_and_trim(tmp_path):
+    """The SQLite store answers substring queries from its FTS index"""
+    store = SqliteStore(str(tmp_path / 'history.db'), import_path=None)
+    for content in ('Hello World', 'https://example.com', 'hello again'):
+        store.append_add(make_item(content))
+    assert [item['content'] for item in store.load()] == [
+        'hello again', 'https://example.com', 'Hello World']
+
+    keys = store.search('HELLO')
+    by_key = {item['id']: item['content'] for item in store.load()}
+    assert [by_key[key] for key in keys] == ['hello again', 'Hello World']
+    assert store.search('he') is None
+
+    store.append_trim(1)
+    assert [item['content'] for item in store.load()] == ['hello again']
+    assert store.search('world') == []
+
+    # Trims only count and remove unpinned items
+    pinned = make_item('pinned')
+    store.append_add(pinned)
+    pinned['pinned'] = True
+    store.append_pin(pinned)
+    store.append_add(make_item('newest'))
+    store.append_trim(1)
+    assert [(item['content'], item.get('pinned')) for item in store.load()] == [
+        ('newest', None), ('pinned', True)]
+    store.close()
+
+
+def test_sqlite_migrates_json_once(tmp_path):
+    """An existing JSON history is imported on first open only"""
+    json_path = str(tmp_path / 'history.json')
+    journal = JournalStore(json_path)
+    for content in ('older', 'newer'):
+        journal.append_add(make_item(content))
+
+    db_path = str(tmp_path / 'history.db')
+    store = SqliteStore(db_path, import_path=json_path)
+    assert [item['content'] for item in store.load()] == ['newer', 'older']
+    store.append_clear()
+    store.close()
+
+    store = SqliteStore(db_path, import_path=json_path)
+    assert store.load() == []
+    store.close()
+
+
+def test_sqlite_read_only_open_leaves_database_alone(tmp_path):
+    """A read-only store neither creates the schema nor imports the JSON history again"""
+    db_path = str(tmp_path / 'history.db')
+    store = SqliteStore(db_path, import_path=None)
+    store.append_add(make_item('hello world'))
+    store.close()
+    with open(db_path, 'rb') as f:
+        before = f.read()
+
+    store = SqliteStore(db_path, import_path=str(tmp_path / 'missing.json'), read_only=True)
+    assert [item['content'] for item in store.load()] == ['hello world']
+    assert len(store.search('world')) == 1
+    with pytest.raises(sqlite3.OperationalError):
+        store.append_clear()
+    store.close()
+    with open(db_path, 'rb') as f:
+        assert f.read() == before
+
+
+def test_journal_touch_moves_to_front(tmp_path):
+    """A repeated copy moves the item to the top and keeps its use count"""
+    path = str(tmp_path / 'history.json')
+    store = JournalStore(path)
+    first, second = make_item('first'), make_item('second')
+    store.append_add(first)
+    store.append_add(second)
+    first['timestamp'] = '2024-01-15T11:00:00'
+    first['use_count'] = 2
+    store.append_touch(first)
+
+    items = JournalStore(path).load()
+    assert [item['content'] for item in items] == ['first', 'second']
+    assert items[0]['use_count'] == 2
+    assert items[0]['timestamp'] == '2024-01-15T11:00:00'
+
+
+def test_blob_store_dedupe_eviction_and_collect(tmp_path):
+    """Blobs are shared per digest, cached within budget and collected"""
+    blobs = BlobStore(str(tmp_path / 'blobs'), threshold=10, memory_budget=30)
+    first, second = 'a' * 20, 'b' * 20
+    assert not blobs.should_store('short')
+    assert blobs.should_store(first)
+    for content in (first, first, second):
+        blobs.put(content_digest(content), content)
+    assert len(list((tmp_path / 'blobs').rglob('*/*'))) == 2
+    assert blobs.evictions == 1 and blobs.cached_bytes == 20
+
+    assert blobs.get(content_digest(first), cache=False) == first
+    assert blobs.evictions == 1
+    # Unreferenced but recently written: another process may be using it
+    blobs.collect({content_digest(second)})
+    assert os.path.exists(blobs.path(content_digest(first)))
+    old = time.time() - blobs.grace_period - 1
+    os.utime(blobs.path(content_digest(first)), (old, old))
+    blobs.collect({content_digest(second)})
+    assert not os.path.exists(blobs.path(content_digest(first)))
+    assert blobs.get(content_digest(second)) == second
+
+
+def test_packed_snapshot_round_trip(tmp_path):
+    """Compressed snapshots load lazily and are copied without recompressing"""
+    path = str(tmp_path / 'history.json')
+    packed_path = str(tmp_path / 'history.chmz')
+    history = [make_item(f"import os\nprint('snippet {i}')\n" * 3) for i in range(20)]
+    JournalStore(path).compact(history)
+    for codec in ('zlib', 'lzma'):
+        # The JSON history moves to a packed snapshot on the next compaction
+        store = JournalStore(path, compression=codec)
+        assert [serialize_item(item)['content'] for item in store.load()] == \
+            [item['content'] for item in history]
+        store.compact(history)
+        assert not os.path.exists(path)
+        with open(packed_path, 'rb') as f:
+            assert f.read(4) == b'CHMZ'
+
+        items = JournalStore(path, compression=codec).load()
+        assert all('content' not in item for item in items)
+        assert [serialize_item(item)['content'] for item in items] == \
+            [item['content'] for item in history]
+
+        # Unchanged items keep their compressed bytes across compactions
+        packed = items[0]['packed']
+        store = JournalStore(path, compression=codec)
+        store.compact(store.load())
+        assert JournalStore(path, compression=codec).load()[0]['packed'].data == packed.data
+
+    # Switching back to JSON expands everything again
+    store = JournalStore(path)
+    store.compact(store.load())
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['items'][0]['content'] == history[0]['content']
+    assert not os.path.exists(packed_path)
+
+
+def test_other_snapshot_formats_are_rejected():
+    """Only the current packed layout is read"""
+    data = snapshot_format.dump([make_item('one')], 1, 1, 'zlib')
+    assert snapshot_format.load(data)[0][0]['packed'].unpack() == 'one'
+    header = len(snapshot_format.MAGIC)
+    for version in (snapshot_format.FORMAT_VERSION - 1, snapshot_format.FORMAT_VERSION + 1):
+        with pytest.raises(ValueError):
+            snapshot_format.load(data[:header] + bytes([version]) + data[header + 1:])
+
+
+def test_trained_dictionary_helps_small_items():
+    """A dictionary built from recurring fragments shrinks small items"""
+    samples = [f"https://example.com/issues/{i} status: resolved" for i in range(50)]
+    zdict = train_zdict(samples)
+    assert b'status:' in zdict
+    sample = 'https://example.com/issues/999 status: resolved'
+    assert len(pack(sample, 'zlib', zdict).data) < len(pack(sample, 'zlib').data)
+    assert pack(sample, 'zlib', zdict).unpack() == sample
+
+
+def test_load_pages_streams_packed_snapshot(tmp_path):
+    """Packed snapshots are read page by page, journal changes applied on the way"""
+    path = str(tmp_path / 'history.json')
+    store = JournalStore(path, compression='zlib')
+    history = [make_item(f"item {i}") for i in range(600)]
+    store.compact(history)
+
+    pages = list(JournalStore(path, compression='zlib').load_pages())
+    assert [len(page) for page in pages] == [256, 256, 88]
+    assert pages[0][0]['id'] == history[0]['id']
+
+    store.append_delete(history[0])
+    pages = list(JournalStore(path, compression='zlib').load_pages(500))
+    assert [len(page) for page in pages] == [255, 256, 88]
+    assert pages[0][0]['id'] == history[1]['id']
+
+    # Moving a snapshot item to the top needs the whole snapshot
+    store.append_touch(history[5])
+    pages = list(JournalStore(path, compression='zlib').load_pages(500))
+    assert [len(page) for page in pages] == [500, 99]
+    assert pages[0][0]['id'] == history[5]['id']
+
+
+def test_streamed_journal_replay_matches_full_load(tmp_path):
+    """Adds, deletes, pins, trims and clears over a packed snapshot stream like a full load"""
+    rng = random.Random(7)
+    for round_number in range(30):
+        path = str(tmp_path / f'history{round_number}.json')
+        store = JournalStore(path, compression='zlib')
+        history = [make_item(f"item {round_number} {i}") for i in range(rng.randint(0, 700))]
+        for item in rng.sample(history, len(history) // 20):
+            item['pinned'] = True
+        store.compact(history)
+        added = []
+        for _ in range(rng.randint(1, 60)):
+            op = rng.random()
+            if op < 0.5:
+                added.insert(0, make_item(f"new {rng.random()}"))
+                store.append_add(added[0])
+            elif op < 0.7 and (history or added):
+                store.append_delete(rng.choice(history + added))
+            elif op < 0.8 and added:
+                store.append_touch(rng.choice(added))
+            elif op < 0.85 and added:
+                item = rng.choice(added)
+                set_pinned(item, not item.get('pinned'))
+                store.append_pin(item)
+            elif op < 0.98:
+                store.append_trim(rng.randint(0, 650))
+            else:
+                store.append_clear()
+        expected = [item['id'] for item in JournalStore(path, compression='zlib').load()]
+        streamed = [item['id'] for page in JournalStore(path, compression='zlib').load_pages(100)
+                    for item in page]
+        assert streamed == expected
+
+
+def test_sqlite_load_pages(tmp_path):
+    """SQLite pages walk positions downwards, newest first"""
+    store = SqliteStore(str(tmp_path / 'history.db'), import_path=None)
+    for content in ('a', 'b', 'c', 'd', 'e'):
+        store.append_add(make_item(content))
+    assert [[item['content'] for item in page] for page in store.load_pages(2)] == \
+        [['e', 'd'], ['c', 'b'], ['a']]
+    store.close()
+
+
+def test_shared_journal_numbers_and_hands_over_changes(tmp_path):
+    """Two stores on the same files get unique seqs and see each other's records"""
+    path = str(tmp_path / 'history.json')
+    first, second = JournalStore(path), JournalStore(path)
+    first.load()
+    second.load()
+    first.append_add(make_item('a'))
+    second.append_add(make_item('b'))
+    first.append_add(make_item('c'))
+
+    assert [record['item']['content'] for record in second.read_changes()] == ['a', 'c']
+    assert [record['item']['content'] for record in first.read_changes()] == ['b']
+    assert first.read_changes() == []
+    assert [record['seq'] for record in first._read_journal()] == [1, 2, 3]
+
+
+def test_reader_behind_a_compaction_is_told_to_reload(tmp_path):
+    """Changes folded into a snapshot before they were read can't be replayed"""
+    path = str(tmp_path / 'history.json')
+    writer, reader = JournalStore(path), JournalStore(path)
+    writer.load()
+    reader.load()
+    history = []
+    for i in range(5):
+        item = make_item(f'item {i}')
+        history.insert(0, item)
+        writer.append_add(item)
+    writer.compact(history)
+    assert len(reader.read_changes()) == 5
+
+    for i in range(150):
+        item = make_item(f'more {i}')
+        history.insert(0, item)
+        writer.append_add(item)
+    writer.compact(history)
+    assert reader.read_changes() is None
+    assert [item['content'] for item in reader.load()][:2] == ['more 149', 'more 148']
+    assert reader.read_changes() == []
+
+
+def test_older_snapshot_never_replaces_a_newer_one(tmp_path):
+    """A process compacting a stale history doesn't undo another's snapshot"""
+    path = str(tmp_path / 'history.json')
+    stale, current = JournalStore(path), JournalStore(path)
+    stale.load()
+    current.load()
+    current.append_add(make_item('x'))
+    current.compact(current.load())
+    stale.compact([])
+    assert [item['content'] for item in JournalStore(path).load()] == ['x']
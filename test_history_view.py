@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the virtualized history list
+These need a display, e.g. run under: xvfb-run python -m pytest
+"""
+
+import os
+import random
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get('DISPLAY'), reason="needs a display")
+
+COLUMNS = [('Item', 200, 100)]
+
+
+@pytest.fixture
+def root():
+    tk = pytest.importorskip('tkinter')
+    root = tk.Tk()
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+def make_view(root, keys, offset=0, visible_rows=5):
+    from history_view import VirtualHistoryList
+    view = VirtualHistoryList(root, COLUMNS, lambda key: (f"item {key}",))
+    view.visible_rows = visible_rows
+    view.set_keys(keys, offset)
+    return view
+
+
+def assert_matches_rebuild(root, view):
+    """The incremental row map and window equal a view built from scratch"""
+    keys = [view.key_at(index) for index in range(len(view))]
+    for key in keys:
+        view._stored_index(key)
+    if keys:
+        rows = {key: row - view._base for key, row in view._rows.items()}
+        assert rows == {key: index for index, key in enumerate(reversed(keys))}
+    fresh = make_view(root, keys, view.offset, view.visible_rows)
+    assert view.offset == fresh.offset
+    assert view.tree.get_children() == fresh.tree.get_children()
+    fresh.tree.destroy()
+
+
+def test_single_operations_match_rebuild(root):
+    """Insert at top, remove from either side, extend at the bottom, move the selection"""
+    view = make_view(root, list(range(20, 0, -1)))
+    assert_matches_rebuild(root, view)
+
+    view.insert_top(21)
+    assert view.key_at(0) == 21
+    assert_matches_rebuild(root, view)
+
+    # Near the bottom the older keys shift, near the top the newer ones
+    view.remove(2)
+    assert_matches_rebuild(root, view)
+    view.remove(20)
+    assert_matches_rebuild(root, view)
+
+    view.extend_bottom([0, -1, -2])
+    assert view.key_at(len(view) - 1) == -2
+    assert_matches_rebuild(root, view)
+
+    view._move_selection(1)
+    assert view.selected_key == 21
+    view._move_selection(view.visible_rows)
+    assert view.selected_key == view.key_at(view.visible_rows)
+    assert view.offset == 1
+    assert_matches_rebuild(root, view)
+
+    # New items keep the scrolled window in place
+    view.insert_top(22)
+    assert view.offset == 2
+    assert_matches_rebuild(root, view)
+    view.remove(view.selected_key)
+    assert view.selected_key is None
+    assert_matches_rebuild(root, view)
+
+
+def test_random_operations_match_rebuild(root):
+    """Any mix of updates keeps the row map consistent"""
+    rng = random.Random(3)
+    view = make_view(root, list(range(30, 0, -1)))
+    next_key = 31
+    lowest_key = 0
+    for _ in range(300):
+        op = rng.random()
+        if op < 0.35:
+            view.insert_top(next_key)
+            next_key += 1
+        elif op < 0.45:
+            count = rng.randint(1, 4)
+            view.extend_bottom(list(range(lowest_key, lowest_key - count, -1)))
+            lowest_key -= count
+        elif op < 0.8 and len(view):
+            view.remove(view.key_at(rng.randrange(len(view))))
+        else:
+            view._move_selection(rng.choice([-5, -1, 1, 5]))
+        assert_matches_rebuild(root, view)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the runtime metrics
+"""
+
+import json
+
+from metrics import MetricsRegistry
+
+
+def test_histogram_buckets_and_quantiles():
+    """Observations land in cumulative buckets and quantiles stay within them"""
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency_seconds')
+    for _ in range(90):
+        latency.observe(0.0002)
+    for _ in range(10):
+        latency.observe(0.2)
+
+    snapshot = latency.snapshot()
+    assert snapshot['count'] == 100
+    assert snapshot['buckets']['0.00025'] == 90
+    assert snapshot['buckets']['0.25'] == 100
+    assert 0.0001 < latency.quantile(0.5) <= 0.00025
+    assert 0.1 < latency.quantile(0.99) <= 0.2
+    assert registry.histogram('latency_seconds') is latency
+
+
+def test_timer_and_exports(tmp_path):
+    """Timed blocks are recorded and both file formats can be read back"""
+    registry = MetricsRegistry()
+    reads = registry.counter('reads_total', 'Clipboard reads')
+    with registry.histogram('read_seconds').time():
+        reads.inc()
+    reads.inc(2)
+
+    prometheus = tmp_path / 'metrics.prom'
+    registry.dump(str(prometheus))
+    text = prometheus.read_text()
+    assert '# HELP reads_total Clipboard reads' in text
+    assert 'reads_total 3' in text
+    assert 'read_seconds_bucket{le="+Inf"} 1' in text
+    assert 'read_seconds_count 1' in text
+
+    jsonl = tmp_path / 'metrics.jsonl'
+    registry.dump(str(jsonl), 'jsonl')
+    registry.dump(str(jsonl), 'jsonl')
+    lines = jsonl.read_text().splitlines()
+    assert len(lines) == 2
+    values = {metric['name']: metric for metric in json.loads(lines[-1])['metrics']}
+    assert values['reads_total']['value'] == 3
+    assert values['read_seconds']['count'] == 1
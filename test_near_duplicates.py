@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for near-duplicate fingerprints and their index
+"""
+
+from near_duplicates import MAX_LENGTH, NearDuplicateIndex, normalize
+
+PARAGRAPH = ("The deploy script copies the build to the staging host, restarts "
+             "the service and waits for the health check before it reports success.")
+
+
+def test_whitespace_variants_share_a_fingerprint():
+    index = NearDuplicateIndex()
+    assert normalize("  a\tb\n\nc ") == "a b c"
+    reflowed = PARAGRAPH.replace(", ", ",\n    ").replace(" the ", "  the ")
+    assert index.fingerprint(reflowed) == index.fingerprint(PARAGRAPH)
+    assert index.fingerprint("x" * (MAX_LENGTH + 1)) is None
+
+
+def test_small_edits_are_found_through_the_bands():
+    index = NearDuplicateIndex(threshold=0.9)
+    assert index.max_distance == 6 and len(index.bands) == 7
+    index.add(1, index.fingerprint(PARAGRAPH)[0])
+    index.add(2, index.fingerprint("Completely unrelated notes about lunch plans "
+                                   "for the team offsite next Thursday afternoon.")[0])
+
+    edited, fuzzy = index.fingerprint(PARAGRAPH.replace("staging", "production"))
+    assert fuzzy and index.find(edited) == [1]
+    index.remove(1)
+    assert index.find(edited) == [] and len(index) == 1
+    assert not any(1 in bucket for buckets in index.buckets for bucket in buckets.values())
+
+
+def test_short_texts_only_match_exactly():
+    index = NearDuplicateIndex(min_tokens=8)
+    url, fuzzy = index.fingerprint("https://example.com/items/1")
+    assert not fuzzy
+    index.add(1, url)
+    assert index.find(index.fingerprint(" https://example.com/items/1\n")[0], False) == [1]
+    assert index.find(index.fingerprint("https://example.com/items/2")[0], False) == []
+
+
+def test_from_config():
+    assert NearDuplicateIndex.from_config(None) is None
+    assert NearDuplicateIndex.from_config({'enabled': False}) is None
+    index = NearDuplicateIndex.from_config({'enabled': True, 'threshold': 0.5, 'min_tokens': 3})
+    # Loose thresholds are clamped so buckets stay selective
+    assert index.max_distance == 16 and index.min_tokens == 3
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for retention limits and the eviction order
+"""
+
+from datetime import datetime, timedelta
+
+from retention import EvictionOrder, RetentionPolicy, item_size
+from snapshot_format import pack
+
+
+def make_item(item_id, size=10, age_days=0, pinned=False):
+    item = {'id': item_id, 'size': size,
+            'timestamp': datetime(2024, 1, 15) - timedelta(days=age_days)}
+    if pinned:
+        item['pinned'] = True
+    return item
+
+
+def test_item_size_without_a_recorded_size():
+    assert item_size({'content': 'héllo'}) == 6
+    packed = pack('x' * 1000, 'zlib')
+    assert item_size({'packed': packed}) == len(packed.data)
+
+
+def test_policy_from_config():
+    policy = RetentionPolicy.from_config({'max_history': 10,
+                                          'retention': {'max_age_days': 2,
+                                                        'max_item_bytes': 100}})
+    assert (policy.max_items, policy.max_bytes, policy.max_age) == (10, 0, 2 * 86400)
+    assert policy.accepts(100) and not policy.accepts(101)
+    assert RetentionPolicy().accepts(10 ** 12)
+
+
+def test_eviction_follows_limits_and_skips_pinned():
+    """The oldest unpinned item goes first, for whichever limit is exceeded"""
+    order = EvictionOrder()
+    items = [make_item(1, age_days=9), make_item(2, pinned=True, age_days=8),
+             make_item(3, size=500, age_days=7), make_item(4)]
+    for item in items:
+        order.add(item)
+    assert order.total_bytes == 530 and len(order) == 3
+
+    now = datetime(2024, 1, 15)
+    assert order.next_victim(4, RetentionPolicy(max_items=10), now) is None
+    assert order.next_victim(4, RetentionPolicy(max_items=3), now) == (items[0], 'count')
+    assert order.next_victim(4, RetentionPolicy(max_items=0, max_bytes=100), now) == \
+        (items[0], 'bytes')
+    assert order.next_victim(4, RetentionPolicy(max_age=7.5 * 86400), now) == (items[0], 'age')
+
+    order.touch(1)
+    assert order.oldest() is items[2]
+    assert order.remove(3) == 500
+    assert order.oldest() is items[3] and order.total_bytes == 30
+
+    # Unpinning puts the item back in history order
+    del items[1]['pinned']
+    order.rebuild([items[1], items[3], items[0]])
+    assert order.oldest() is items[1]
+
+
+def test_items_loaded_later_are_older():
+    order = EvictionOrder()
+    order.add(make_item(5))
+    order.add(make_item(4), oldest=True)
+    assert order.oldest()['id'] == 4
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory search indexes
+"""
+
+from search_index import TrigramIndex, char_mask, fuzzy_score
+
+
+def test_trigram_substring_search():
+    """Queries match case-insensitively anywhere in the content"""
+    index = TrigramIndex()
+    index.add(1, "Hello World")
+    index.add(2, "https://example.com/hello")
+    index.add(3, "Nothing to see")
+
+    assert index.search("HELLO") == {1, 2}
+    assert index.search("lo wo") == {1}
+    assert index.search("o") == {1, 2, 3}
+    assert index.search("missing") == set()
+    assert index.search("") == {1, 2, 3}
+
+
+def test_trigram_incremental_updates():
+    """Removed and replaced items no longer match old queries"""
+    index = TrigramIndex()
+    index.add("a", "alpha beta")
+    index.add("b", "beta gamma")
+    index.remove("a")
+    assert index.search("beta") == {"b"}
+    assert "alp" not in index.postings
+
+    index.add("b", "delta")
+    assert index.search("beta") == set()
+    assert index.search("delta") == {"b"}
+
+
+def test_trigram_unindexed_large_items():
+    """Items above the size cap are still found by direct verification"""
+    index = TrigramIndex(max_indexed_length=10)
+    index.add(1, "x" * 50 + "needle")
+    index.add(2, "short")
+    assert index.search("needle") == {1}
+    assert index.search("short") == {2}
+    assert index.postings.keys() == {"sho", "hor", "ort"}
+
+
+def test_fuzzy_score_prefers_contiguous_and_word_starts():
+    """Consecutive and word-boundary hits outscore scattered ones"""
+    assert fuzzy_score("cfg", "no match here") is None
+    contiguous = fuzzy_score("conf", "edit conf file")
+    boundaries = fuzzy_score("conf", "copy of notes file")
+    scattered = fuzzy_score("conf", "xcxoxnxf")
+    assert contiguous > boundaries > scattered
+    # The greedy match on the first 'c' must not hide a later exact hit
+    assert fuzzy_score("abc", "a_b_c abc") == fuzzy_score("abc", "abc")
+
+
+def test_fuzzy_search_ranks_and_limits():
+    """Results are ranked by score, ties go to newer items, and only the top k come back"""
+    index = TrigramIndex()
+    texts = {1: "config.json", 2: "my big config file", 3: "c o n f", 4: "unrelated", 5: "conf"}
+    for key, text in texts.items():
+        index.add(key, text)
+    keys = [5, 4, 3, 2, 1]  # newest first
+
+    ranked = [key for _, key in index.fuzzy_search("conf", keys)]
+    assert ranked[0] == 5 and set(ranked) == {1, 2, 3, 5}
+    assert ranked.index(1) < ranked.index(3)
+    assert [key for _, key in index.fuzzy_search("conf", keys, limit=2)] == ranked[:2]
+    assert index.masks[4] & char_mask("conf") != char_mask("conf")
+
+
+def test_fuzzy_search_caps_scored_items():
+    """Past the newest max_scored items only outright matches are scored"""
+    index = TrigramIndex()
+    texts = {1: "config", 2: "c-o-n-f", 3: "c o n f", 4: "conf.d", 5: "unrelated"}
+    for key, text in texts.items():
+        index.add(key, text)
+    keys = [5, 4, 3, 2, 1]
+
+    capped = [key for _, key in index.fuzzy_search("conf", keys, max_scored=2)]
+    assert set(capped) == {4, 3, 1}
+    assert set(key for _, key in index.fuzzy_search("conf", keys, max_scored=0)) == {1, 2, 3, 4}
+    # Too short for the index to narrow down, so nothing past the cap
+    assert [key for _, key in index.fuzzy_search("cf", keys, max_scored=1)] == [4]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for background search
+"""
+
+import threading
+import time
+
+from history_model import HistoryModel
+from history_storage import JournalStore
+from search_worker import CHUNK_SIZE, SearchJob, SearchWorker
+
+
+def wait_for_results(worker, timeout=5.0):
+    """Collect chunks until the current job reports it is done"""
+    chunks, deadline = [], time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        delivered, done = worker.poll()
+        chunks.extend(delivered)
+        if done:
+            return chunks
+        time.sleep(0.001)
+    raise AssertionError("search did not finish")
+
+
+def test_results_stream_in_chunks(tmp_path):
+    """Matches arrive newest first in chunks of at most CHUNK_SIZE"""
+    model = HistoryModel(JournalStore(str(tmp_path / 'history.json')), max_history=1000)
+    model.load()
+    for i in range(600):
+        model.add(f"{'even' if i % 2 == 0 else 'odd'} item {i}")
+    worker = SearchWorker()
+    try:
+        worker.submit(model.search_job("EVEN"))
+        chunks = wait_for_results(worker)
+    finally:
+        worker.stop()
+    assert all(0 < len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    keys = [key for chunk in chunks for key in chunk]
+    assert keys == model.filter_keys("even")
+    assert len(keys) == 300
+
+
+def test_packed_items_are_searched_and_kept(tmp_path):
+    """Packed items are decompressed by the job and kept by the owner afterwards"""
+    path = str(tmp_path / 'history.json')
+    model = HistoryModel(JournalStore(path, compression='zlib'))
+    model.load()
+    for i in range(5):
+        model.add(f"entry {i}")
+    model.close()
+
+    model = HistoryModel(JournalStore(path, compression='zlib'))
+    model.load()
+    job = model.search_job("entry 3", fuzzy=True)
+    assert len(model.packed_ids) == 5
+    matches = [key for chunk in job.run(lambda: False) for key in chunk]
+    assert model.content(model.get(matches[0])) == 'entry 3'
+
+    model = HistoryModel(JournalStore(path, compression='zlib'))
+    model.load()
+    job = model.search_job("entry 3")
+    matches = [key for chunk in job.run(lambda: False) for key in chunk]
+    assert len(job.unpacked) == 5 and len(model.packed_ids) == 5
+    model.keep_unpacked(job.unpacked)
+    assert not model.packed_ids
+    assert model.filter_keys("entry 3") == matches
+
+
+def test_new_query_cancels_the_running_one():
+    """A submitted job stops the one before it and only its results are delivered"""
+    started, release = threading.Event(), threading.Event()
+
+    class SlowJob(SearchJob):
+        def run(self, should_stop):
+            started.set()
+            release.wait()
+            if not should_stop():
+                yield [1]
+
+    worker = SearchWorker()
+    try:
+        worker.submit(SlowJob('old', []))
+        assert started.wait(5)
+        worker.submit(SearchJob('new', [], results=[2, 3]))
+        release.set()
+        assert wait_for_results(worker) == [[2, 3]]
+    finally:
+        worker.stop()
+
+
+def test_jobs_share_state_and_survive_later_changes(tmp_path):
+    """Keystrokes copy nothing, and changes made while a job runs don't break it"""
+    path = str(tmp_path / 'history.json')
+    model = HistoryModel(JournalStore(path, compression='zlib'), max_history=1000)
+    model.load()
+    for i in range(300):
+        model.add(f"note {i}")
+    model.close()
+
+    model = HistoryModel(JournalStore(path, compression='zlib'), max_history=1000)
+    model.load()
+    first, second = model.search_job("note 1"), model.search_job("note 12", fuzzy=True)
+    assert first.keys is second.keys and first.index is model.search_index
+
+    # Packed items unpacked by the owner (for display) meanwhile are still found
+    for key in model.filter_keys()[:50]:
+        model.preview(model.get(key))
+    removed = model.filter_keys()[-1]
+    model.delete(removed)
+    model.add("note 1 added later")
+    matches = [key for chunk in first.run(lambda: False) for key in chunk]
+    assert matches == [key for key in model.filter_keys("note 1") if key in first.keys]
+    assert removed not in matches
+    assert [key for chunk in second.run(lambda: False) for key in chunk] == \
+        model.fuzzy_keys("note 12")